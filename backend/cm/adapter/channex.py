@@ -2,8 +2,10 @@ from datetime import datetime
 
 from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.urls import reverse
 
+from backend.pms.availability import get_availability, invalidate_availability
 from backend.pms.models import (
     Booking,
     BookingRoom,
@@ -12,7 +14,8 @@ from backend.pms.models import (
     RatePlanRestrictions,
     RoomType,
 )
-from backend.rms.tasks import handle_occupancy_based_trigger
+from backend.pms.tasks import schedule_room_assignment
+from backend.rms.tasks import schedule_occupancy_based_trigger
 from backend.utils.currency import get_currency_min_frac_size, is_valid_currency
 from backend.utils.format import convert_to_obj
 
@@ -25,6 +28,7 @@ from ..models import (
     CMRoomTypeConnector,
 )
 from ..serializers import CMHotelConnectorSerializer
+from ..tasks import schedule_availability_push
 
 
 class ChannexException(Exception):
@@ -272,6 +276,20 @@ class ChannexAdapter:
             booking_room_obj.booking_id = booking_room_obj.booking_obj.id
         BookingRoom.objects.bulk_create(new_booking_rooms)
 
+        # Bulk creates don't send signals
+        invalidate_availability(self.cm_hotel_connector.pms.id)
+        schedule_availability_push(self.cm_hotel_connector.pms.id)
+
+        # Assign rooms to the booking rooms
+        if new_booking_rooms:
+            schedule_room_assignment(
+                hotel_id=self.cm_hotel_connector.pms.id,
+                dates=(
+                    min(room_obj.dates[0] for room_obj in new_booking_rooms),
+                    max(room_obj.dates[1] for room_obj in new_booking_rooms),
+                ),
+            )
+
     def get_prep_rate_plan_restrictions(
         self, new_rate_plan_restrictions: list[RatePlanRestrictions]
     ):
@@ -298,10 +316,60 @@ class ChannexAdapter:
     def save_rate_plan_restrictions(
         self, new_rate_plan_restrictions: list[RatePlanRestrictions]
     ):
+        """
+        Push restrictions once the current transaction is committed, the rates
+        of a recalculation that is rolled back never reach the channels.
+        """
         rate_plan_restrictions = self.get_prep_rate_plan_restrictions(
             new_rate_plan_restrictions
         )
-        self.client.update_rate_plan_restrictions(rate_plan_restrictions)
+        transaction.on_commit(
+            lambda: self.client.update_rate_plan_restrictions(rate_plan_restrictions)
+        )
+
+    def get_prep_availability(self, availability: dict) -> list[dict]:
+        """
+        Get the values of the rooms left of the mapped room types, see
+        build_availability. Consecutive dates with the same rooms left are
+        sent as a single range, overbooked room types have none left. Room
+        types without rooms are skipped, e.g. the ones of a hotel imported from
+        the channel manager whose rooms aren't configured yet, pushing them
+        would close them on every channel.
+        """
+        room_type_id_map = dict(
+            CMRoomTypeConnector.objects.filter(
+                pms__hotel__channel_manager_connector=self.cm_hotel_connector
+            ).values_list("pms__uuid", "cm_id")
+        )
+        cm_hotel_id = str(self.cm_hotel_connector.cm_id)
+        dates = availability["dates"]
+
+        values = []
+        for room_type in availability["room_types"]:
+            cm_room_type_id = room_type_id_map.get(room_type["uuid"])
+            if cm_room_type_id is None or room_type["rooms"] == 0:
+                continue
+            rooms_left = [max(value, 0) for value in room_type["availability"]]
+            start = 0
+            for i in range(1, len(rooms_left) + 1):
+                if i == len(rooms_left) or rooms_left[i] != rooms_left[start]:
+                    values.append(
+                        {
+                            "property_id": cm_hotel_id,
+                            "room_type_id": str(cm_room_type_id),
+                            "date_from": dates[start].strftime("%Y-%m-%d"),
+                            "date_to": dates[i - 1].strftime("%Y-%m-%d"),
+                            "availability": rooms_left[start],
+                        }
+                    )
+                    start = i
+        return values
+
+    def save_availability(self):
+        availability, _ = get_availability(self.cm_hotel_connector.pms)
+        values = self.get_prep_availability(availability)
+        if values:
+            self.client.update_availability(values)
 
     def save_booking_webhook(self):
         """
@@ -371,7 +439,7 @@ class ChannexAdapter:
         BookingRoom.objects.bulk_create(booking_rooms)
 
         # Trigger occupancy update
-        handle_occupancy_based_trigger.delay(
+        schedule_occupancy_based_trigger(
             hotel_id=self.cm_hotel_connector.pms.id,
             room_types=list(affected_room_types),
             dates=(
@@ -380,6 +448,15 @@ class ChannexAdapter:
             ),
         )
 
+        # Assign rooms to the booking rooms
+        schedule_room_assignment(
+            hotel_id=self.cm_hotel_connector.pms.id,
+            dates=(
+                revision_data["attributes"]["arrival_date"],
+                revision_data["attributes"]["departure_date"],
+            ),
+        )
+
     def _save_modified_booking_revision(self, booking_cm_id, revision_cm_id):
         # Get revision data
         revision_data = self.client.get_booking_revision(revision_cm_id)
@@ -456,7 +533,7 @@ class ChannexAdapter:
         )
 
         # Trigger occupancy update
-        handle_occupancy_based_trigger.delay(
+        schedule_occupancy_based_trigger(
             hotel_id=self.cm_hotel_connector.pms.id,
             room_types=list(affected_room_types),
             dates=(
@@ -465,6 +542,15 @@ class ChannexAdapter:
             ),
         )
 
+        # Assign rooms to the new booking rooms
+        schedule_room_assignment(
+            hotel_id=self.cm_hotel_connector.pms.id,
+            dates=(
+                revision_data["attributes"]["arrival_date"],
+                revision_data["attributes"]["departure_date"],
+            ),
+        )
+
     def _save_cancelled_booking_revision(self, booking_cm_id, revision_cm_id):
         # Get revision data
         revision_data = self.client.get_booking_revision(revision_cm_id)
@@ -491,7 +577,7 @@ class ChannexAdapter:
         affected_room_types = booking_rooms.values_list("room_type__id", flat=True)
 
         # Trigger occupancy update
-        handle_occupancy_based_trigger.delay(
+        schedule_occupancy_based_trigger(
             hotel_id=self.cm_hotel_connector.pms.id,
             room_types=list(affected_room_types),
             dates=(
@@ -521,6 +607,7 @@ class ChannexAdapter:
                 revision_cm_id=data["payload"]["booking_revision_id"],
             )
         elif event == "booking":
-            pass
+            return
         else:
             raise ValidationError("Unknown event type")
+        schedule_availability_push(self.cm_hotel_connector.pms.id)
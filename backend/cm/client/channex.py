@@ -335,6 +335,12 @@ class ChannexClient:
             raise ChannexClientAPIError(response.json(), response.status_code)
         return response.json().get("data")
 
+    def update_availability(self, data: Iterator[dict]):
+        response = self._post("availability", data={"values": data})
+        if response.status_code != 200:
+            raise ChannexClientAPIError(response.json(), response.status_code)
+        return response.json().get("data")
+
     def list_bookings(
         self,
         property_id,
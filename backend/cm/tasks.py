@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import mail_admins
 from django.db import transaction
 
@@ -32,3 +34,32 @@ def setup_hotel_from_cm(channel_manager, cm_id, cm_api_key):
             subject="Hotel migrated from CM successfully",
             message=f"Hotel {cm_hotel_connector.pms.name} has been migrated from CM successfully",
         )
+
+
+def get_availability_push_key(hotel_id: int) -> str:
+    return f"cm:availability_push:{hotel_id}:scheduled"
+
+
+def schedule_availability_push(hotel_id: int):
+    """
+    Push the availability of a hotel to its channel manager once the current
+    transaction is committed and CM_AVAILABILITY_PUSH_DELAY seconds passed.
+    The pushes scheduled in the meantime, e.g. during a burst of bookings,
+    are coalesced into this one.
+    """
+
+    def schedule():
+        delay = settings.CM_AVAILABILITY_PUSH_DELAY
+        if cache.add(get_availability_push_key(hotel_id), True, timeout=delay + 60):
+            push_availability.apply_async(args=(hotel_id,), countdown=delay)
+
+    transaction.on_commit(schedule)
+
+
+@app.task
+def push_availability(hotel_id: int):
+    # The bookings coming in from now on schedule another push
+    cache.delete(get_availability_push_key(hotel_id))
+    cm_hotel_connector = CMHotelConnector.objects.filter(pms=hotel_id).first()
+    if cm_hotel_connector is not None:
+        cm_hotel_connector.adapter.save_availability()
@@ -344,7 +344,9 @@ def test_save_all_upcoming_bookings(db, mocked_channex_validation, mocker):
     # assert new_booking_room.dates.upper == datetime.date(2020, 1, 5)
 
 
-def test_get_prep_rate_plan_restrictions(db, mocked_channex_validation, mocker):
+def test_get_prep_rate_plan_restrictions(
+    db, mocked_channex_validation, django_capture_on_commit_callbacks, mocker
+):
     hotel_id = str(uuid.uuid4())
     rate_plan_id = str(uuid.uuid4())
     room_type_id = str(uuid.uuid4())
@@ -426,18 +428,128 @@ def test_get_prep_rate_plan_restrictions(db, mocked_channex_validation, mocker):
     ]
 
     # save_rate_plan_restrictions
-    mocker.patch(
+    update_rate_plan_restrictions = mocker.patch(
         "backend.cm.client.channex.ChannexClient.update_rate_plan_restrictions",
         return_value=mocker.Mock(
             status_code=200,
         ),
     )
-    cm_hotel_connector.adapter.save_rate_plan_restrictions(
-        new_rate_plan_restrictions=[
-            RatePlanRestrictions(
-                rate_plan=CMRatePlanConnector.objects.get(cm_id=rate_plan_id).pms,
-                date=datetime.date(2020, 1, 1),
-                rate=100,
+    with django_capture_on_commit_callbacks(execute=True):
+        cm_hotel_connector.adapter.save_rate_plan_restrictions(
+            new_rate_plan_restrictions=[
+                RatePlanRestrictions(
+                    rate_plan=CMRatePlanConnector.objects.get(cm_id=rate_plan_id).pms,
+                    date=datetime.date(2020, 1, 1),
+                    rate=100,
+                )
+            ]
+        )
+        # Not pushed before the restrictions are committed
+        update_rate_plan_restrictions.assert_not_called()
+    update_rate_plan_restrictions.assert_called_once()
+
+
+def test_save_availability(
+    mocked_channex_validation,
+    cm_hotel_connector_factory,
+    cm_room_type_connector_factory,
+    room_type_factory,
+    mocker,
+):
+    cm_hotel_connector = cm_hotel_connector_factory(channex=True)
+    cm_room_type_connector = cm_room_type_connector_factory(
+        cm_hotel_connector=cm_hotel_connector, pms__hotel=cm_hotel_connector.pms
+    )
+    # Not mapped
+    room_type_factory(hotel=cm_hotel_connector.pms)
+    dates = [datetime.date(2020, 1, 1) + datetime.timedelta(days=i) for i in range(4)]
+    availability = {
+        "dates": dates,
+        "room_types": [
+            {
+                "uuid": room_type.uuid,
+                "name": room_type.name,
+                "rooms": 2,
+                "availability": [2, 2, 1, -1],
+            }
+            for room_type in cm_hotel_connector.pms.room_types.order_by("id")
+        ],
+    }
+    mocker.patch(
+        "backend.cm.adapter.channex.get_availability",
+        return_value=(availability, '"etag"'),
+    )
+    update_availability = mocker.patch(
+        "backend.cm.client.channex.ChannexClient.update_availability"
+    )
+    cm_hotel_connector.adapter.save_availability()
+
+    cm_ids = (str(cm_hotel_connector.cm_id), str(cm_room_type_connector.cm_id))
+    update_availability.assert_called_once_with(
+        [
+            {
+                "property_id": cm_ids[0],
+                "room_type_id": cm_ids[1],
+                "date_from": date_from,
+                "date_to": date_to,
+                "availability": rooms_left,
+            }
+            for date_from, date_to, rooms_left in (
+                ("2020-01-01", "2020-01-02", 2),
+                ("2020-01-03", "2020-01-03", 1),
+                # Overbooked
+                ("2020-01-04", "2020-01-04", 0),
             )
         ]
     )
+
+
+def test_save_availability_without_rooms(
+    mocked_channex_validation,
+    cm_hotel_connector_factory,
+    cm_room_type_connector_factory,
+    mocker,
+):
+    cm_hotel_connector = cm_hotel_connector_factory(channex=True)
+    cm_room_type_connectors = cm_room_type_connector_factory.create_batch(
+        2, cm_hotel_connector=cm_hotel_connector, pms__hotel=cm_hotel_connector.pms
+    )
+    availability = {
+        "dates": [datetime.date(2020, 1, 1)],
+        "room_types": [
+            {
+                "uuid": cm_room_type_connector.pms.uuid,
+                "name": cm_room_type_connector.pms.name,
+                "rooms": rooms,
+                "availability": [rooms - 1],
+            }
+            for cm_room_type_connector, rooms in zip(cm_room_type_connectors, (0, 2))
+        ],
+    }
+    mocker.patch(
+        "backend.cm.adapter.channex.get_availability",
+        return_value=(availability, '"etag"'),
+    )
+    update_availability = mocker.patch(
+        "backend.cm.client.channex.ChannexClient.update_availability"
+    )
+
+    # The room type without rooms isn't closed
+    cm_hotel_connector.adapter.save_availability()
+    update_availability.assert_called_once_with(
+        [
+            {
+                "property_id": str(cm_hotel_connector.cm_id),
+                "room_type_id": str(cm_room_type_connectors[1].cm_id),
+                "date_from": "2020-01-01",
+                "date_to": "2020-01-01",
+                "availability": 1,
+            }
+        ]
+    )
+
+    # Nor is the hotel, before any of its rooms are configured
+    update_availability.reset_mock()
+    availability["room_types"] = availability["room_types"][:1]
+    cm_hotel_connector.adapter.save_availability()
+    update_availability.assert_not_called()
@@ -36,6 +36,7 @@ def test_setup_hotel_api_view(
     get_api_client,
     mocked_channex_setup_hotel,
     settings,
+    django_capture_on_commit_callbacks,
 ):
     settings.CELERY_TASK_ALWAYS_EAGER = True
     url = reverse("cm:hotel-setup")
@@ -71,6 +72,7 @@ def test_cm_booking_webhook_trigger_integration(
     get_api_client,
     mocked_channex_setup_hotel,
     settings,
+    django_capture_on_commit_callbacks,
 ):
     settings.CELERY_TASK_ALWAYS_EAGER = True
     url = reverse("cm:hotel-setup")
@@ -101,6 +103,9 @@ def test_cm_booking_webhook_trigger_integration(
         "backend.rms.adapter.DynamicPricingAdapter.calculate_and_update_rates",
         return_value=[],
     )
+    mocked_update_availability = mocker.patch(
+        "backend.cm.client.channex.ChannexClient.update_availability"
+    )
 
     # Setup the client
     url = reverse("cm:webhook-booking")
@@ -133,31 +138,32 @@ def test_cm_booking_webhook_trigger_integration(
             "type": "booking_revision",
         },
     )
-    response = client.post(
-        url,
-        data={
-            "event": "booking_new",
-            "payload": {
-                "amount": "1240000",
-                "arrival_date": "2023-05-17",
-                "booking_id": booking_cm_id,
-                "booking_revision_id": revision_cm_id,
-                "booking_unique_id": "BDC-3611227021",
-                "channel_id": "4f152895-b5c3-4c27-bc02-a99dc0f01072",
-                "count_of_nights": 2,
-                "count_of_rooms": 1,
-                "currency": "VND",
-                "customer_name": "Test Test",
-                "live_feed_event_id": "cbadb500-151b-45a6-a44b-9b685e8bd802",
-                "ota_code": "3611227021",
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            url,
+            data={
+                "event": "booking_new",
+                "payload": {
+                    "amount": "1240000",
+                    "arrival_date": "2023-05-17",
+                    "booking_id": booking_cm_id,
+                    "booking_revision_id": revision_cm_id,
+                    "booking_unique_id": "BDC-3611227021",
+                    "channel_id": "4f152895-b5c3-4c27-bc02-a99dc0f01072",
+                    "count_of_nights": 2,
+                    "count_of_rooms": 1,
+                    "currency": "VND",
+                    "customer_name": "Test Test",
+                    "live_feed_event_id": "cbadb500-151b-45a6-a44b-9b685e8bd802",
+                    "ota_code": "3611227021",
+                    "property_id": data["hotel_id"],
+                },
                 "property_id": data["hotel_id"],
+                "timestamp": "2023-05-15T19:42:35.858695Z",
+                "user_id": None,
             },
-            "property_id": data["hotel_id"],
-            "timestamp": "2023-05-15T19:42:35.858695Z",
-            "user_id": None,
-        },
-        format="json",
-    )
+            format="json",
+        )
     assert response.status_code == status.HTTP_200_OK
     cm_booking_connector = CMBookingConnector.objects.get(
         cm_id=booking_cm_id,
@@ -166,6 +172,8 @@ def test_cm_booking_webhook_trigger_integration(
     assert cm_booking_connector.pms.status == Booking.StatusChoices.NEW
     assert cm_booking_connector.pms.booking_rooms.count() == 1
     assert mocked_calculate_rates.call_count == 1
+    # The rooms of the imported hotel aren't configured, it isn't closed
+    assert mocked_update_availability.call_count == 0
 
     # Update booking with new revision (status modified)
     revision_cm_id = str(uuid.uuid4())
@@ -192,31 +200,32 @@ def test_cm_booking_webhook_trigger_integration(
             "type": "booking_revision",
         },
     )
-    response = client.post(
-        url,
-        data={
-            "event": "booking_modification",
-            "payload": {
-                "amount": "1240000",
-                "arrival_date": "2023-05-18",
-                "booking_id": booking_cm_id,
-                "booking_revision_id": revision_cm_id,
-                "booking_unique_id": "BDC-3611227021",
-                "channel_id": "4f152895-b5c3-4c27-bc02-a99dc0f01072",
-                "count_of_nights": 2,
-                "count_of_rooms": 1,
-                "currency": "VND",
-                "customer_name": "Test Test",
-                "live_feed_event_id": "cbadb500-151b-45a6-a44b-9b685e8bd802",
-                "ota_code": "3611227021",
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            url,
+            data={
+                "event": "booking_modification",
+                "payload": {
+                    "amount": "1240000",
+                    "arrival_date": "2023-05-18",
+                    "booking_id": booking_cm_id,
+                    "booking_revision_id": revision_cm_id,
+                    "booking_unique_id": "BDC-3611227021",
+                    "channel_id": "4f152895-b5c3-4c27-bc02-a99dc0f01072",
+                    "count_of_nights": 2,
+                    "count_of_rooms": 1,
+                    "currency": "VND",
+                    "customer_name": "Test Test",
+                    "live_feed_event_id": "cbadb500-151b-45a6-a44b-9b685e8bd802",
+                    "ota_code": "3611227021",
+                    "property_id": data["hotel_id"],
+                },
                 "property_id": data["hotel_id"],
+                "timestamp": "2023-05-15T19:42:35.858695Z",
+                "user_id": None,
             },
-            "property_id": data["hotel_id"],
-            "timestamp": "2023-05-15T19:42:35.858695Z",
-            "user_id": None,
-        },
-        format="json",
-    )
+            format="json",
+        )
     assert response.status_code == status.HTTP_200_OK
     assert mocked_calculate_rates.call_count == 2
 
@@ -245,30 +254,31 @@ def test_cm_booking_webhook_trigger_integration(
             "type": "booking_revision",
         },
     )
-    response = client.post(
-        url,
-        data={
-            "event": "booking_cancellation",
-            "payload": {
-                "amount": "1240000",
-                "arrival_date": "2023-05-18",
-                "booking_id": booking_cm_id,
-                "booking_revision_id": revision_cm_id,
-                "booking_unique_id": "BDC-3611227021",
-                "channel_id": "4f152895-b5c3-4c27-bc02-a99dc0f01072",
-                "count_of_nights": 2,
-                "count_of_rooms": 1,
-                "currency": "VND",
-                "customer_name": "Test Test",
-                "live_feed_event_id": "cbadb500-151b-45a6-a44b-9b685e8bd802",
-                "ota_code": "3611227021",
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            url,
+            data={
+                "event": "booking_cancellation",
+                "payload": {
+                    "amount": "1240000",
+                    "arrival_date": "2023-05-18",
+                    "booking_id": booking_cm_id,
+                    "booking_revision_id": revision_cm_id,
+                    "booking_unique_id": "BDC-3611227021",
+                    "channel_id": "4f152895-b5c3-4c27-bc02-a99dc0f01072",
+                    "count_of_nights": 2,
+                    "count_of_rooms": 1,
+                    "currency": "VND",
+                    "customer_name": "Test Test",
+                    "live_feed_event_id": "cbadb500-151b-45a6-a44b-9b685e8bd802",
+                    "ota_code": "3611227021",
+                    "property_id": data["hotel_id"],
+                },
                 "property_id": data["hotel_id"],
+                "timestamp": "2023-05-15T19:42:35.858695Z",
+                "user_id": None,
             },
-            "property_id": data["hotel_id"],
-            "timestamp": "2023-05-15T19:42:35.858695Z",
-            "user_id": None,
-        },
-        format="json",
-    )
+            format="json",
+        )
     assert response.status_code == status.HTTP_200_OK
     assert mocked_calculate_rates.call_count == 3
@@ -1,46 +1,112 @@
 from datetime import date as date_class
 from datetime import timedelta
 
-from django.db.models import Q
+from django.db import connection
 
 
 class HotelAdapter:
     def __init__(self, hotel):
         self.hotel = hotel
 
-    @staticmethod
-    def daterange(start_date, end_date):
-        for n in range(int((end_date - start_date).days)):
-            yield start_date + timedelta(days=n)
-
-    def get_room_type_inventory_map(
+    def get_room_type_occupancies(
         self, room_types: list[int], dates: tuple[date_class, date_class]
-    ):
-        from .models import Booking, BookingRoom
+    ) -> dict[int, list[int]]:
+        """
+        Get the number of booked rooms of each room type for each night of a
+        range of dates from their daily occupancies, a range scan of the
+        (room_type, date) index per room type.
+
+        Args:
+            room_types (list[int]): The room type ids.
+            dates (tuple[date_class, date_class]): The first and last dates,
+                included.
+
+        Returns:
+            dict[int, list[int]]: The number of booked rooms of each room type
+                for each date, indexed by its offset from the first date.
+        """
+        from .models import RoomTypeDailyOccupancy
 
-        booked_room_type = BookingRoom.objects.filter(
-            ~Q(booking__status=Booking.StatusChoices.CANCELLED),
-            dates__overlap=dates,
+        days = (dates[1] - dates[0]).days + 1
+        room_type_occupancies = {room_type: [0] * days for room_type in room_types}
+        if not room_type_occupancies or days <= 0:
+            return room_type_occupancies
+
+        for room_type, date, booked_count in RoomTypeDailyOccupancy.objects.filter(
             room_type__in=room_types,
             room_type__hotel=self.hotel,
-        ).values("room_type", "dates")
-
-        # Initialize room type inventory map
-        room_type_inventory_map = {}
-        for room_type in room_types:
-            room_type_inventory_map[room_type] = {}
-            for date in self.daterange(dates[0], dates[1] + timedelta(days=1)):
-                room_type_inventory_map[room_type][date] = 0
-
-        # Update room type inventory map
-        for booking_room in booked_room_type:
-            lower = booking_room["dates"].lower
-            upper = booking_room["dates"].upper
-            for date in self.daterange(lower, upper):
-                room_type_map = room_type_inventory_map[booking_room["room_type"]]
-                try:
-                    room_type_map[date] += 1
-                except KeyError:
-                    room_type_map[date] = 1
-
-        return room_type_inventory_map
+            date__range=dates,
+        ).values_list("room_type_id", "date", "booked_count"):
+            room_type_occupancies[room_type][(date - dates[0]).days] = booked_count
+        return room_type_occupancies
+
+    def count_room_type_occupancies(
+        self, room_types: list[int], dates: tuple[date_class, date_class]
+    ) -> dict[int, list[int]]:
+        """
+        Like get_room_type_occupancies, but counted from the bookings. The
+        nights of the stays are expanded into day offsets with generate_series
+        and counted by Postgres, only the non-zero counts are sent back.
+
+        Args:
+            room_types (list[int]): The room type ids.
+            dates (tuple[date_class, date_class]): The first and last dates,
+                included.
+
+        Returns:
+            dict[int, list[int]]: The number of booked rooms of each room type
+                for each date, indexed by its offset from the first date.
+        """
+        from .models import Booking, BookingRoom, RoomType
+
+        days = (dates[1] - dates[0]).days + 1
+        room_type_occupancies = {room_type: [0] * days for room_type in room_types}
+        if not room_type_occupancies or days <= 0:
+            return room_type_occupancies
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT booking_room.room_type_id, night, count(*)
+                FROM {BookingRoom._meta.db_table} booking_room
+                JOIN {Booking._meta.db_table} booking
+                    ON booking.id = booking_room.booking_id
+                JOIN {RoomType._meta.db_table} room_type
+                    ON room_type.id = booking_room.room_type_id
+                CROSS JOIN LATERAL generate_series(
+                    greatest(lower(booking_room.dates) - %(start)s, 0),
+                    least(upper(booking_room.dates) - 1, %(end)s) - %(start)s
+                ) night
+                WHERE booking_room.dates && daterange(%(start)s, %(end)s, '[]')
+                    AND booking_room.room_type_id = ANY(%(room_types)s)
+                    AND room_type.hotel_id = %(hotel)s
+                    AND booking.status != %(cancelled)s
+                GROUP BY 1, 2
+                """,
+                {
+                    "start": dates[0],
+                    "end": dates[1],
+                    "room_types": list(room_type_occupancies),
+                    "hotel": self.hotel.id,
+                    "cancelled": Booking.StatusChoices.CANCELLED,
+                },
+            )
+            for room_type, offset, count in cursor.fetchall():
+                room_type_occupancies[room_type][offset] = count
+        return room_type_occupancies
+
+    def get_room_type_inventory_map(
+        self, room_types: list[int], dates: tuple[date_class, date_class]
+    ) -> dict[int, dict[date_class, int]]:
+        """
+        Like get_room_type_occupancies, but keyed by date.
+        """
+        return {
+            room_type: {
+                dates[0] + timedelta(days=offset): count
+                for offset, count in enumerate(occupancies)
+            }
+            for room_type, occupancies in self.get_room_type_occupancies(
+                room_types, dates
+            ).items()
+        }
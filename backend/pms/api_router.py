@@ -1,7 +1,9 @@
 from django.conf import settings
+from django.urls import path
 from rest_framework.routers import DefaultRouter, SimpleRouter
 
 from .views import (
+    AvailabilityAPIView,
     HotelEmployeeModelViewSet,
     HotelModelViewSet,
     RatePlanModelViewSet,
@@ -43,3 +45,10 @@ router.register(
 
 app_name = "pms"
 urlpatterns = router.urls
+urlpatterns += [
+    path(
+        "availability/<uuid:uuid>/",
+        AvailabilityAPIView.as_view(),
+        name="availability",
+    ),
+]
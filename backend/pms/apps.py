@@ -7,4 +7,5 @@ class PmsConfig(AppConfig):
     verbose_name = _("Property Management System")
 
     def ready(self):
+        import backend.pms.pg_triggers  # noqa F401
         import backend.pms.signals  # noqa F401
@@ -0,0 +1,453 @@
+import bisect
+import heapq
+import itertools
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from backend.utils.db import bulk_update_from_values
+
+from .models import Booking, BookingRoom, Hotel, Room
+
+logger = logging.getLogger(__name__)
+
+"""
+Rooms are assigned to the stays of each room type by interval partitioning.
+The stays are swept by arrival date. Each one takes the free room whose gap
+before its next pinned stay is the shortest one fitting the stay, so rooms
+without pinned stays go last. Without pinned stays, a stay is only left
+unassigned when all the rooms of its room type are taken that night. Rooms
+move between a heap of the busy ones, by the date they are freed, and the
+free ones, by the end of their gap.
+"""
+
+
+class FreeRooms:
+    """
+    The free rooms by the end of their gap, out of a known set of gap ends.
+    A Fenwick tree counts the rooms of each gap end, so that the shortest gap
+    fitting a stay is found in O(log n).
+    """
+
+    def __init__(self, gap_ends: list[date]):
+        self.gap_ends = gap_ends
+        self.buckets = [[] for _ in gap_ends]
+        self.counts = [0] * (len(gap_ends) + 1)
+        # The bucket of each free room, rooms stay in the buckets they left
+        # until they are popped
+        self.rooms = {}
+
+    def update(self, i: int, delta: int):
+        i += 1
+        while i < len(self.counts):
+            self.counts[i] += delta
+            i += i & -i
+
+    def count_before(self, i: int) -> int:
+        count = 0
+        while i > 0:
+            count += self.counts[i]
+            i -= i & -i
+        return count
+
+    def add(self, room: int, gap_end: date):
+        i = bisect.bisect_left(self.gap_ends, gap_end)
+        self.buckets[i].append(room)
+        self.rooms[room] = i
+        self.update(i, 1)
+
+    def remove(self, room: int):
+        self.update(self.rooms.pop(room), -1)
+
+    def get_gap_end(self, room: int) -> date | None:
+        i = self.rooms.get(room)
+        return None if i is None else self.gap_ends[i]
+
+    def pop_fitting(self, departure: date) -> int | None:
+        """
+        Remove and return a room whose gap is the shortest one ending on or
+        after the departure date, if any.
+        """
+        # Descend the tree to the first bucket with more rooms before it
+        rank = self.count_before(bisect.bisect_left(self.gap_ends, departure))
+        i = 0
+        step = 1 << (len(self.counts) - 1).bit_length()
+        while step:
+            if i + step < len(self.counts) and self.counts[i + step] <= rank:
+                i += step
+                rank -= self.counts[i]
+            step >>= 1
+        if i == len(self.gap_ends):
+            return None
+        bucket = self.buckets[i]
+        while True:
+            room = bucket.pop()
+            if self.rooms.get(room) == i:
+                self.remove(room)
+                return room
+
+
+def assign_stays(
+    rooms: Iterable[int],
+    stays: list[tuple[int, date, date]],
+    pinned_stays: Iterable[tuple[int, date, date]] = (),
+) -> dict[int, int | None]:
+    """
+    Assign the rooms of a room type to stays without overlapping the stays
+    already in the rooms, in O(n log n).
+
+    Args:
+        rooms (Iterable[int]): The room ids.
+        stays (list[tuple[int, date, date]]): The id, arrival and departure
+            dates of the stays to assign.
+        pinned_stays (Iterable[tuple[int, date, date]]): The room, arrival and
+            departure dates of the stays whose room is kept.
+
+    Returns:
+        dict[int, int | None]: The room of each stay, None when no room is
+            free for the whole stay.
+    """
+    # The pinned stays of each room, the next one last
+    pinned = {room: [] for room in rooms}
+    for room, arrival, departure in pinned_stays:
+        if room in pinned:
+            pinned[room].append((arrival, departure))
+    for room_pinned_stays in pinned.values():
+        room_pinned_stays.sort(reverse=True)
+
+    busy = []
+    free = FreeRooms(
+        sorted(
+            {arrival for room_pinned in pinned.values() for arrival, _ in room_pinned}
+            | {date.max}
+        )
+    )
+    # The free rooms by the end of their gap, to take them out once it ends
+    closing = []
+
+    def release(room: int, at: date):
+        room_pinned_stays = pinned[room]
+        while room_pinned_stays and room_pinned_stays[-1][1] <= at:
+            room_pinned_stays.pop()
+        if room_pinned_stays and room_pinned_stays[-1][0] <= at:
+            heapq.heappush(busy, (room_pinned_stays.pop()[1], room))
+        elif room_pinned_stays:
+            free.add(room, room_pinned_stays[-1][0])
+            heapq.heappush(closing, (room_pinned_stays[-1][0], room))
+        else:
+            free.add(room, date.max)
+
+    for room in pinned:
+        release(room, date.min)
+
+    assignments = {}
+    for stay, arrival, departure in sorted(stays, key=lambda stay: stay[1:]):
+        while True:
+            if busy and busy[0][0] <= arrival:
+                busy_until, room = heapq.heappop(busy)
+                release(room, busy_until)
+            elif closing and closing[0][0] <= arrival:
+                gap_end, room = heapq.heappop(closing)
+                if free.get_gap_end(room) == gap_end:
+                    free.remove(room)
+                    release(room, gap_end)
+            else:
+                break
+
+        room = assignments[stay] = free.pop_fitting(departure)
+        if room is not None:
+            heapq.heappush(busy, (departure, room))
+    return assignments
+
+
+def drop_conflicting_stays(
+    assignments: dict[int, int | None],
+    stays: list[tuple[int, date, date]],
+    pinned_stays: Iterable[tuple[int, date, date]] = (),
+) -> dict[int, int | None]:
+    """
+    Unassign the stays overlapping a pinned stay or an earlier stay of their
+    room, e.g. in a solution of the optapy solver that isn't feasible.
+    """
+    room_stays = defaultdict(list)
+    room_pinned_arrivals = defaultdict(list)
+    for room, arrival, departure in pinned_stays:
+        # Pinned stays sort before the assigned ones arriving the same day
+        room_stays[room].append((arrival, 0, departure, None))
+        room_pinned_arrivals[room].append(arrival)
+    for stay, arrival, departure in stays:
+        if assignments.get(stay) is not None:
+            room_stays[assignments[stay]].append((arrival, 1, departure, stay))
+
+    assignments = dict(assignments)
+    for room, intervals in room_stays.items():
+        intervals.sort()
+        pinned_arrivals = sorted(room_pinned_arrivals[room])
+        occupied_until = date.min
+        for arrival, _, departure, stay in intervals:
+            if stay is None:
+                occupied_until = max(occupied_until, departure)
+                continue
+            # The next pinned stay arrives after this one
+            i = bisect.bisect_right(pinned_arrivals, arrival)
+            if arrival < occupied_until or (
+                i < len(pinned_arrivals) and pinned_arrivals[i] < departure
+            ):
+                assignments[stay] = None
+            else:
+                occupied_until = departure
+    return assignments
+
+
+def solve_stays(
+    rooms: dict[int, int],
+    stays: list[tuple[int, date, date]],
+    pinned_stays: list[tuple[int, date, date]],
+    assignments: dict[int, int | None],
+    time_budget: int = 500,
+) -> dict[int, int | None]:
+    """
+    Assign the rooms of a room type to stays with the optapy solver, seeded
+    with some assignments. The JVM is started by the first call of the
+    process, see get_solver_factory.
+
+    Args:
+        rooms (dict[int, int]): The numbers of the rooms by id.
+        stays (list[tuple[int, date, date]]): See assign_stays.
+        pinned_stays (list[tuple[int, date, date]]): See assign_stays.
+        assignments (dict[int, int | None]): The rooms the stays start from.
+        time_budget (int): The milliseconds the solver may run for.
+
+    Returns:
+        dict[int, int | None]: The room of each stay, None when it overlaps
+            another stay of the room in the best solution found.
+    """
+    from .optapy.solver import Solver
+
+    solver = Solver(time_budget)
+    solution = solver.solve(
+        solver.build_problem(rooms, stays, pinned_stays, assignments)
+    )
+    return drop_conflicting_stays(
+        {
+            booking.id: booking.room.id if booking.room is not None else None
+            for booking in solution.booking_list
+            if not booking.pinned
+        },
+        stays,
+        pinned_stays,
+    )
+
+
+def get_overbooked_stays(
+    room_count: int,
+    stays: list[tuple[int, date, date]],
+    pinned_stays: list[tuple[int, date, date]],
+) -> set[int]:
+    """
+    Get the stays staying a night with more stays than rooms.
+    """
+    if not stays:
+        return set()
+    first_date = min(arrival for _, arrival, _ in [*stays, *pinned_stays])
+    last_date = max(departure for _, _, departure in [*stays, *pinned_stays])
+    counts = [0] * ((last_date - first_date).days + 1)
+    for _, arrival, departure in [*stays, *pinned_stays]:
+        counts[(arrival - first_date).days] += 1
+        counts[(departure - first_date).days] -= 1
+    counts = list(itertools.accumulate(counts))
+    overbooked = set()
+    for stay, arrival, departure in stays:
+        start = (arrival - first_date).days
+        end = (departure - first_date).days
+        if max(counts[start:end]) > room_count:
+            overbooked.add(stay)
+    return overbooked
+
+
+def assign_room_type_stays(
+    rooms: dict[int, int],
+    stays: list[tuple[int, date, date]],
+    pinned_stays: list[tuple[int, date, date]],
+    movable_stays: list[tuple[int, int, date, date]] = (),
+    time_budget: int = 500,
+) -> dict[int, int | None]:
+    """
+    Assign the rooms of a room type to stays with assign_stays, falling back
+    to the optapy solver when it leaves stays unassigned around other stays
+    on nights with a free room. Without other stays, stays are only left
+    unassigned when their room type is overbooked.
+
+    The solver starts from the greedy assignment and may move the movable
+    stays to other rooms, a solution is only kept when all of them still
+    have a room and fewer stays are left unassigned.
+
+    Args:
+        rooms (dict[int, int]): The numbers of the rooms by id.
+        stays (list[tuple[int, date, date]]): See assign_stays.
+        pinned_stays (list[tuple[int, date, date]]): See assign_stays.
+        movable_stays (list[tuple[int, int, date, date]]): The id, room,
+            arrival and departure dates of the stays already in a room that
+            the solver may move.
+        time_budget (int): The milliseconds the solver may run for.
+
+    Returns:
+        dict[int, int | None]: The room of each stay, and of the movable
+            stays moved to another room.
+    """
+    current = {stay: room for stay, room, _, _ in movable_stays}
+    fixed_stays = [
+        *pinned_stays,
+        *((room, arrival, departure) for _, room, arrival, departure in movable_stays),
+    ]
+    assignments = assign_stays(rooms, stays, fixed_stays)
+    unassigned = {stay for stay, room in assignments.items() if room is None}
+    if (
+        not unassigned
+        or not fixed_stays
+        or unassigned <= get_overbooked_stays(len(rooms), stays, fixed_stays)
+    ):
+        return assignments
+
+    try:
+        solved = solve_stays(
+            rooms,
+            [
+                *stays,
+                *(
+                    (stay, arrival, departure)
+                    for stay, _, arrival, departure in movable_stays
+                ),
+            ],
+            pinned_stays,
+            {**assignments, **current},
+            time_budget=time_budget,
+        )
+    except Exception:
+        # E.g. no JVM, the greedy assignment is still valid
+        logger.exception("Failed to solve the room assignment")
+        return assignments
+    if any(solved.get(stay) is None for stay in current):
+        return assignments
+    if sum(solved.get(stay) is None for stay, _, _ in stays) >= len(unassigned):
+        return assignments
+    return {
+        stay: room
+        for stay, room in solved.items()
+        if stay not in current or room != current[stay]
+    }
+
+
+def assign_rooms(hotel: Hotel, dates: tuple[date, date]) -> dict[int, int | None]:
+    """
+    Assign rooms of their room type to the booking rooms of a hotel staying
+    some nights and without one, see assign_room_type_stays. The rooms of
+    the other booking rooms are kept, except for cancelled bookings, whose
+    rooms are freed, and for the ones arriving after today within the stays
+    being assigned, which the solver may move within the time budget of the
+    hotel. Only this span is solved, so a single new booking is assigned
+    without solving the whole inventory.
+
+    The booking rooms are written in bulk, the freed and moved ones first,
+    so that no statement breaks exclude_overlapping_dates_for_room in
+    between.
+
+    Args:
+        hotel (Hotel): The hotel.
+        dates (tuple[date, date]): The first and last nights, included.
+
+    Returns:
+        dict[int, int | None]: The room of each booking room without one, by
+            id, None when none of its room type is free for its whole stay,
+            and of the booking rooms moved to another room.
+    """
+    nights = (dates[0], dates[1] + timedelta(days=1))
+    cancelled = Booking.StatusChoices.CANCELLED
+    today = timezone.now().astimezone(hotel.timezone).date()
+    with transaction.atomic():
+        candidates = list(
+            BookingRoom.objects.filter(
+                booking__hotel=hotel,
+                room__isnull=True,
+                room_type__isnull=False,
+                dates__overlap=nights,
+            )
+            .exclude(booking__status=cancelled)
+            .select_for_update(of=("self",))
+            .order_by("id")
+            .values_list("id", "room_type_id", "dates")
+        )
+        if not candidates:
+            return {}
+
+        # The stays in the rooms around the candidates
+        span = (
+            min(stay.lower for _, _, stay in candidates),
+            max(stay.upper for _, _, stay in candidates),
+        )
+        occupied = (
+            BookingRoom.objects.filter(
+                room__room_type__hotel=hotel,
+                dates__overlap=span,
+            )
+            .select_for_update(of=("self",))
+            .order_by("id")
+            .values_list(
+                "id", "room_id", "room__room_type_id", "dates", "booking__status"
+            )
+        )
+        released = []
+        pinned_stays = defaultdict(list)
+        movable_stays = defaultdict(list)
+        for booking_room, room, room_type, stay, status in occupied:
+            if status == cancelled:
+                released.append(BookingRoom(id=booking_room, room=None))
+            elif stay.lower > today and span[0] <= stay.lower <= stay.upper <= span[1]:
+                # Moving it can't overlap the stays outside of the span
+                movable_stays[room_type].append(
+                    (booking_room, room, stay.lower, stay.upper)
+                )
+            else:
+                pinned_stays[room_type].append((room, stay.lower, stay.upper))
+
+        rooms = defaultdict(dict)
+        for room_type, room, number in Room.objects.filter(
+            room_type__hotel=hotel
+        ).values_list("room_type_id", "id", "number"):
+            rooms[room_type][room] = number
+        stays = defaultdict(list)
+        for booking_room, room_type, stay in candidates:
+            stays[room_type].append((booking_room, stay.lower, stay.upper))
+
+        assignments = {}
+        for room_type, room_type_stays in stays.items():
+            assignments.update(
+                assign_room_type_stays(
+                    rooms[room_type],
+                    room_type_stays,
+                    pinned_stays[room_type],
+                    movable_stays[room_type],
+                    time_budget=hotel.room_assignment_time_budget,
+                )
+            )
+
+        moved = [
+            BookingRoom(id=booking_room, room=None)
+            for room_type_stays in movable_stays.values()
+            for booking_room, *_ in room_type_stays
+            if booking_room in assignments
+        ]
+        bulk_update_from_values(released + moved, ["room"])
+        bulk_update_from_values(
+            [
+                BookingRoom(id=booking_room, room_id=room)
+                for booking_room, room in assignments.items()
+                if room is not None
+            ],
+            ["room"],
+        )
+    return assignments
@@ -0,0 +1,121 @@
+import hashlib
+import json
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from backend.utils.cache import get_or_set_locked
+
+from .models import Hotel, RoomType
+
+# Availabilities are invalidated when bookings or rooms are written, the
+# timeout only cleans up the ones of former dates and generations
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_availability_generation_key(hotel_id: int) -> str:
+    return f"pms:availability:{hotel_id}:generation"
+
+
+def get_availability_cache_key(hotel_id: int, generation: int, start_date: date):
+    return f"pms:availability:{hotel_id}:{generation}:{start_date.isoformat()}"
+
+
+def bump_availability_generation(hotel_id: int) -> int:
+    """
+    Bump the generation of the availability of a hotel, the cached
+    availabilities of the former generations can't be reached anymore.
+
+    Returns:
+        int: The new generation.
+    """
+    generation_key = get_availability_generation_key(hotel_id)
+    cache.add(generation_key, 0, timeout=None)
+    return cache.incr(generation_key)
+
+
+def invalidate_availability(hotel_id: int):
+    """
+    Invalidate the availability of a hotel once the current transaction is
+    committed, until then other transactions don't see the new bookings.
+    """
+    transaction.on_commit(lambda: bump_availability_generation(hotel_id))
+
+
+def build_availability(hotel: Hotel, start_date: date, end_date: date) -> dict:
+    """
+    Build the room type x date grid of the rooms left of a hotel, the number
+    of rooms of each room type minus its daily occupancies. Rooms left are
+    negative when a room type is overbooked.
+
+    Args:
+        hotel (Hotel): The hotel.
+        start_date (date): The first date.
+        end_date (date): The last date, included.
+
+    Returns:
+        dict: The dates and the room types with their number of rooms and
+            their rooms left, aligned with dates.
+    """
+    dates = [
+        start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)
+    ]
+    room_types = list(
+        RoomType.objects.filter(hotel=hotel)
+        .annotate(room_count=Count("rooms"))
+        .order_by("id")
+        .values_list("id", "uuid", "name", "room_count")
+    )
+    room_type_occupancies = hotel.adapter.get_room_type_occupancies(
+        [room_type_id for room_type_id, *_ in room_types], (start_date, end_date)
+    )
+    return {
+        "dates": dates,
+        "room_types": [
+            {
+                "uuid": room_type_uuid,
+                "name": room_type_name,
+                "rooms": room_count,
+                "availability": [
+                    room_count - booked_count
+                    for booked_count in room_type_occupancies[room_type_id]
+                ],
+            }
+            for room_type_id, room_type_uuid, room_type_name, room_count in room_types
+        ],
+    }
+
+
+def get_availability(hotel: Hotel) -> tuple[dict, str]:
+    """
+    Get the availability of the inventory of a hotel, from the local today,
+    from the cache or built once per generation, see invalidate_availability.
+
+    Args:
+        hotel (Hotel): The hotel.
+
+    Returns:
+        tuple[dict, str]: The availability, see build_availability, and its
+            ETag.
+    """
+    start_date = timezone.now().astimezone(hotel.timezone).date()
+    generation = cache.get(get_availability_generation_key(hotel.id), 0)
+
+    def build():
+        availability = build_availability(
+            hotel, start_date, start_date + timedelta(days=hotel.inventory_days)
+        )
+        digest = hashlib.md5(
+            json.dumps(availability, cls=DjangoJSONEncoder).encode()
+        ).hexdigest()
+        return availability, f'"{digest}"'
+
+    return get_or_set_locked(
+        get_availability_cache_key(hotel.id, generation, start_date),
+        build,
+        timeout=AVAILABILITY_CACHE_TIMEOUT,
+    )
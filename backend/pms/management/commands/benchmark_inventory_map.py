@@ -0,0 +1,129 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from backend.pms.models import Booking, BookingRoom, Hotel, RoomType
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark reading the booked rooms of each room type and date from "
+        "their daily occupancies against counting them in Postgres and "
+        "expanding the stays in Python. Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, default=5000)
+        parser.add_argument("--room-types", type=int, default=10)
+        parser.add_argument("--max-nights", type=int, default=30)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            hotel = Hotel.objects.create(name="Benchmark", inventory_days=365)
+            room_types = [
+                RoomType.objects.create(hotel=hotel, name=f"Benchmark {i}").id
+                for i in range(options["room_types"])
+            ]
+            self.create_bookings(
+                hotel,
+                room_types,
+                options["bookings"],
+                options["max_nights"],
+                options["seed"],
+            )
+            with connection.cursor() as cursor:
+                # Otherwise the planner doesn't know about the new bookings
+                cursor.execute(
+                    "ANALYZE pms_booking, pms_bookingroom, pms_roomtypedailyoccupancy"
+                )
+
+            today = timezone.now().astimezone(hotel.timezone).date()
+            dates = (today, today + timedelta(days=hotel.inventory_days))
+            self.stdout.write(
+                f"Counting {options['bookings']} bookings of up to "
+                f"{options['max_nights']} nights, {len(room_types)} room types x "
+                f"{hotel.inventory_days + 1} days"
+            )
+            results = {}
+            for name, count in (
+                ("python", self.count_in_python),
+                ("postgres", self.count_in_postgres),
+                ("daily occupancies", self.get_daily_occupancies),
+            ):
+                timings = []
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    results[name] = count(hotel, room_types, dates)
+                    timings.append(time.perf_counter() - start)
+                self.stdout.write(
+                    f"{name}: best {min(timings):.4f}s, "
+                    f"mean {sum(timings) / len(timings):.4f}s"
+                )
+            if len({str(result) for result in results.values()}) > 1:
+                self.stderr.write("The counts differ")
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def create_bookings(
+        hotel: Hotel, room_types: list[int], count: int, max_nights: int, seed: int
+    ):
+        rng = random.Random(seed)
+        today = timezone.now().astimezone(hotel.timezone).date()
+        stays = []
+        for _ in range(count):
+            # Also stays started before today
+            arrival_date = today + timedelta(days=rng.randrange(-max_nights, 365))
+            departure_date = arrival_date + timedelta(
+                days=rng.randrange(1, max_nights + 1)
+            )
+            stays.append((rng.choice(room_types), (arrival_date, departure_date)))
+        bookings = Booking.objects.bulk_create(
+            [Booking(hotel=hotel, dates=dates, raw_data={}) for _, dates in stays]
+        )
+        BookingRoom.objects.bulk_create(
+            [
+                BookingRoom(
+                    booking=booking, room_type_id=room_type, dates=dates, raw_data={}
+                )
+                for booking, (room_type, dates) in zip(bookings, stays)
+            ]
+        )
+
+    @staticmethod
+    def get_daily_occupancies(
+        hotel: Hotel, room_types: list[int], dates: tuple[date, date]
+    ) -> dict[int, list[int]]:
+        return hotel.adapter.get_room_type_occupancies(room_types, dates)
+
+    @staticmethod
+    def count_in_postgres(
+        hotel: Hotel, room_types: list[int], dates: tuple[date, date]
+    ) -> dict[int, list[int]]:
+        return hotel.adapter.count_room_type_occupancies(room_types, dates)
+
+    @staticmethod
+    def count_in_python(
+        hotel: Hotel, room_types: list[int], dates: tuple[date, date]
+    ) -> dict[int, list[int]]:
+        # Each night of each stay, like get_room_type_inventory_map used to
+        days = (dates[1] - dates[0]).days + 1
+        room_type_occupancies = {room_type: [0] * days for room_type in room_types}
+        booking_rooms = BookingRoom.objects.filter(
+            ~Q(booking__status=Booking.StatusChoices.CANCELLED),
+            dates__overlap=(dates[0], dates[1] + timedelta(days=1)),
+            room_type__in=room_types,
+            room_type__hotel=hotel,
+        ).values_list("room_type", "dates")
+        for room_type, stay in booking_rooms:
+            for n in range((stay.upper - stay.lower).days):
+                offset = (stay.lower - dates[0]).days + n
+                if 0 <= offset < days:
+                    room_type_occupancies[room_type][offset] += 1
+        return room_type_occupancies
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.pms.models import Hotel
+from backend.pms.occupancy import rebuild_room_type_occupancies
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily occupancies of the room types from the bookings, "
+        "the bookings can't be written in the meantime."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hotel",
+            dest="hotels",
+            action="append",
+            help="The uuid of a hotel to rebuild, all of them by default",
+        )
+
+    def handle(self, *args, hotels=None, **options):
+        hotel_ids = None
+        if hotels is not None:
+            hotel_ids = list(
+                Hotel.objects.filter(uuid__in=hotels).values_list("id", flat=True)
+            )
+        with transaction.atomic():
+            count = rebuild_room_type_occupancies(hotel_ids)
+        self.stdout.write(f"Rebuilt {count} daily occupancies")
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+from backend.utils.partitions import add_months, create_monthly_partitions
+
+
+def create_restriction_partitions(apps, schema_editor):
+    # The months of the existing restrictions, then created ahead by
+    # maintain_restriction_partitions
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT min(date) FROM pms_rateplanrestrictions_unpartitioned")
+        (first_date,) = cursor.fetchone()
+    start = min(first_date or timezone.now().date(), timezone.now().date())
+    end = add_months(
+        timezone.now().date(), settings.RATE_PLAN_RESTRICTIONS_PARTITIONS_AHEAD
+    )
+    months = (end.year - start.year) * 12 + end.month - start.month + 1
+    create_monthly_partitions(
+        "pms_rateplanrestrictions",
+        start,
+        months,
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pms", "0001_initial"),
+        # Its foreign key to the restrictions is replaced by rms 0006
+        ("rms", "0001_initial"),
+    ]
+
+    # Django can't create partitioned tables, the partition key must be part of
+    # the primary key and unique constraints, so uuids are only unique by date
+    # in the database. Foreign keys to the restrictions are dropped, they must
+    # now reference (id, date).
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            ALTER TABLE pms_rateplanrestrictions
+                RENAME TO pms_rateplanrestrictions_unpartitioned;
+            ALTER INDEX pms_rateplanrestrictions_pkey
+                RENAME TO pms_rateplanrestrictions_unpartitioned_pkey;
+            ALTER INDEX pms_rateplanrestrictions_uuid_key
+                RENAME TO pms_rateplanrestrictions_unpartitioned_uuid_key;
+            ALTER INDEX pms_rateplanrestrictions_rate_plan_id_date_27372123_uniq
+                RENAME TO pms_rateplanrestrictions_unpartitioned_uniq;
+            ALTER INDEX pms_rateplanrestrictions_rate_plan_id_6e5c3289
+                RENAME TO pms_rateplanrestrictions_unpartitioned_rate_plan_id;
+            ALTER SEQUENCE pms_rateplanrestrictions_id_seq
+                RENAME TO pms_rateplanrestrictions_unpartitioned_id_seq;
+
+            CREATE TABLE pms_rateplanrestrictions (
+                id bigint GENERATED BY DEFAULT AS IDENTITY,
+                uuid uuid NOT NULL,
+                date date NOT NULL,
+                rate integer NOT NULL
+                    CONSTRAINT pms_rateplanrestrictions_rate_check CHECK (rate >= 0),
+                created_at timestamp with time zone NOT NULL,
+                updated_at timestamp with time zone NOT NULL,
+                rate_plan_id bigint NOT NULL
+                    CONSTRAINT pms_rateplanrestrict_rate_plan_id_6e5c3289_fk_pms_ratep
+                    REFERENCES pms_rateplan (id) DEFERRABLE INITIALLY DEFERRED,
+                CONSTRAINT pms_rateplanrestrictions_pkey PRIMARY KEY (id, date),
+                CONSTRAINT pms_rateplanrestrictions_uuid_key UNIQUE (uuid, date),
+                CONSTRAINT pms_rateplanrestrictions_rate_plan_id_date_27372123_uniq
+                    UNIQUE (rate_plan_id, date)
+            ) PARTITION BY RANGE (date);
+            CREATE INDEX pms_rateplanrestrictions_rate_plan_id_6e5c3289
+                ON pms_rateplanrestrictions (rate_plan_id);
+            CREATE TABLE pms_rateplanrestrictions_default
+                PARTITION OF pms_rateplanrestrictions DEFAULT;
+            """,
+        ),
+        migrations.RunPython(create_restriction_partitions),
+        migrations.RunSQL(
+            sql="""
+            INSERT INTO pms_rateplanrestrictions
+                (id, uuid, date, rate, created_at, updated_at, rate_plan_id)
+            SELECT id, uuid, date, rate, created_at, updated_at, rate_plan_id
+            FROM pms_rateplanrestrictions_unpartitioned;
+            SELECT setval(
+                pg_get_serial_sequence('pms_rateplanrestrictions', 'id'),
+                last_value,
+                is_called
+            ) FROM pms_rateplanrestrictions_unpartitioned_id_seq;
+            DROP TABLE pms_rateplanrestrictions_unpartitioned CASCADE;
+            """,
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.1 on 2026-10-17 13:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pms", "0002_partition_rate_plan_restrictions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomTypeDailyOccupancy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("booked_count", models.IntegerField(default=0)),
+                (
+                    "room_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_occupancies",
+                        to="pms.roomtype",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("room_type", "date")},
+            },
+        ),
+        # Then maintained by the triggers of backend.pms.pg_triggers
+        migrations.RunSQL(
+            sql="""
+            INSERT INTO pms_roomtypedailyoccupancy (room_type_id, date, booked_count)
+            SELECT booking_room.room_type_id,
+                lower(booking_room.dates) + night,
+                count(*)
+            FROM pms_bookingroom booking_room
+            JOIN pms_booking booking ON booking.id = booking_room.booking_id
+            CROSS JOIN LATERAL generate_series(
+                0, upper(booking_room.dates) - lower(booking_room.dates) - 1
+            ) night
+            WHERE booking_room.room_type_id IS NOT NULL
+                AND booking.status != 'cancelled'
+            GROUP BY 1, 2;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-17 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pms", "0003_room_type_daily_occupancy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="hotel",
+            name="room_assignment_time_budget",
+            field=models.PositiveIntegerField(default=500),
+        ),
+    ]
@@ -16,6 +16,8 @@ class Hotel(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     name = models.CharField(max_length=255)
     inventory_days = models.SmallIntegerField(default=100)
+    # Milliseconds the room assignment solver may run for per room type
+    room_assignment_time_budget = models.PositiveIntegerField(default=500)
 
     address = models.CharField(max_length=255, null=True, blank=True)
     city = models.CharField(max_length=128, null=True, blank=True)
@@ -34,6 +36,13 @@ class Hotel(models.Model):
     def save(self, *args, **kwargs):
         if self.inventory_days < 100 or self.inventory_days > 700:
             raise ValidationError("Inventory days must be between 100 and 700")
+        if (
+            self.room_assignment_time_budget < 100
+            or self.room_assignment_time_budget > 10000
+        ):
+            raise ValidationError(
+                "Room assignment time budget must be between 100 and 10000 ms"
+            )
         super().save(*args, **kwargs)
 
 
@@ -183,3 +192,22 @@ class BookingRoom(models.Model):
         indexes = [
             models.Index(fields=["dates", "room_type"]),
         ]
+
+
+class RoomTypeDailyOccupancy(models.Model):
+    """
+    The number of booked rooms of a room type for a night, kept up to date by
+    the triggers of backend.pms.pg_triggers and rebuilt by
+    rebuild_room_type_occupancies.
+    """
+
+    room_type = models.ForeignKey(
+        RoomType,
+        on_delete=models.CASCADE,
+        related_name="daily_occupancies",
+    )
+    date = models.DateField()
+    booked_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("room_type", "date")
@@ -0,0 +1,67 @@
+from django.db import connection
+
+from .availability import invalidate_availability
+from .models import Booking, BookingRoom, Hotel, RoomType, RoomTypeDailyOccupancy
+
+
+def get_stay_nights_sql(booking_room: str) -> str:
+    """
+    Get the SQL of the nights of the stay of a booking room row, to be joined
+    laterally.
+    """
+    return (
+        f"generate_series(0, upper({booking_room}.dates) "
+        f"- lower({booking_room}.dates) - 1) night"
+    )
+
+
+def rebuild_room_type_occupancies(hotel_ids: list[int] = None) -> int:
+    """
+    Rebuild the daily occupancies of the room types from the bookings, e.g.
+    after they were written with the triggers disabled. The bookings of the
+    hotels can't be written in the meantime.
+
+    Args:
+        hotel_ids (list[int]): Only rebuild the occupancies of these hotels,
+            all of them by default.
+
+    Returns:
+        int: The number of daily occupancies.
+    """
+    occupancy_table = RoomTypeDailyOccupancy._meta.db_table
+    scope = ""
+    params = {"cancelled": Booking.StatusChoices.CANCELLED}
+    if hotel_ids is not None:
+        scope = (
+            f"AND room_type_id IN (SELECT id FROM {RoomType._meta.db_table} "
+            f"WHERE hotel_id = ANY(%(hotel_ids)s))"
+        )
+        params["hotel_ids"] = list(hotel_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"LOCK TABLE {Booking._meta.db_table}, {BookingRoom._meta.db_table} "
+            f"IN SHARE MODE"
+        )
+        cursor.execute(f"DELETE FROM {occupancy_table} WHERE true {scope}", params)
+        cursor.execute(
+            f"""
+            INSERT INTO {occupancy_table} (room_type_id, date, booked_count)
+            SELECT booking_room.room_type_id,
+                lower(booking_room.dates) + night,
+                count(*)
+            FROM {BookingRoom._meta.db_table} booking_room
+            JOIN {Booking._meta.db_table} booking
+                ON booking.id = booking_room.booking_id
+            CROSS JOIN LATERAL {get_stay_nights_sql("booking_room")}
+            WHERE booking_room.room_type_id IS NOT NULL
+                AND booking.status != %(cancelled)s {scope}
+            GROUP BY 1, 2
+            """,
+            params,
+        )
+        rowcount = cursor.rowcount
+    if hotel_ids is None:
+        hotel_ids = Hotel.objects.values_list("id", flat=True)
+    for hotel_id in hotel_ids:
+        invalidate_availability(hotel_id)
+    return rowcount
@@ -2,6 +2,7 @@ from optapy import (
     planning_entity,
     planning_entity_collection_property,
     planning_id,
+    planning_pin,
     planning_score,
     planning_solution,
     planning_variable,
@@ -28,16 +29,21 @@ class Room:
 
 @planning_entity
 class Booking:
-    def __init__(self, id, start_date, end_date, room=None):
+    def __init__(self, id, start_date, end_date, room=None, pinned=False):
         self.id = id
         self.start_date = start_date
         self.end_date = end_date
         self.room = room
+        self.pinned = pinned
 
     @planning_id
     def get_id(self):
         return self.id
 
+    @planning_pin
+    def is_pinned(self):
+        return self.pinned
+
     @planning_variable(Room, ["roomRange"])
     def get_room(self):
         return self.room
@@ -57,6 +63,7 @@ class Booking:
             f"start_date={self.start_date}, "
             f"end_date={self.end_date}, "
             f"room={self.room}, "
+            f"pinned={self.pinned}, "
             f")"
         )
 
@@ -1,35 +1,95 @@
+import functools
+from datetime import date
+
 import optapy.config
-from constraints import define_constraints
 from optapy import solver_factory_create
 from optapy.types import Duration  # noqa: F821
 
+from .constraints import define_constraints
 from .domain import Booking, Room, TimeTable
 
 
-class Solver:
-    def __init__(self, solver_config=None):
-        if solver_config is None:
-            solver_config = self.get_solver_config()
-        self.solver = solver_factory_create(solver_config).buildSolver()
-
-    def get_solver_config(self, duration: int = 30):
-        return (
-            optapy.config.solver.SolverConfig()
-            .withEntityClasses(Booking)
-            .withSolutionClass(TimeTable)
-            .withConstraintProviderClass(define_constraints)
-            .withTerminationSpentLimit(Duration.ofSeconds(duration))
+def get_solver_config(time_budget: int):
+    """
+    Get the config of solvers stopping once a solution without room conflicts
+    is found, or after the time budget in milliseconds.
+    """
+    return (
+        optapy.config.solver.SolverConfig()
+        .withEntityClasses(Booking)
+        .withSolutionClass(TimeTable)
+        .withConstraintProviderClass(define_constraints)
+        .withTerminationConfig(
+            optapy.config.solver.termination.TerminationConfig()
+            .withSpentLimit(Duration.ofMillis(time_budget))
+            .withBestScoreLimit("0hard/*soft")
         )
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def get_solver_factory(time_budget: int):
+    """
+    Get the solver factory of a time budget, built once per process. Building
+    it starts the JVM and compiles the constraints, which takes seconds, so
+    the long-lived room assignment workers only pay for it once.
+    """
+    return solver_factory_create(get_solver_config(time_budget))
+
 
-    def build_problem(self, hotel, start_date, end_date):
-        room_list = [Room(1, "Room A"), Room(2, "Room B"), Room(3, "Room C")]
+class Solver:
+    def __init__(self, time_budget: int = 500):
+        self.solver = get_solver_factory(time_budget).buildSolver()
+
+    def build_problem(
+        self,
+        rooms: dict[int, int],
+        stays: list[tuple[int, date, date]],
+        pinned_stays: list[tuple[int, date, date]],
+        assignments: dict[int, int | None] = None,
+    ) -> TimeTable:
+        """
+        Build the problem of assigning the rooms of a room type to stays, see
+        backend.pms.assignment.assign_stays. The bookings span the nights of
+        the stays as day ordinals, the last one included.
+
+        Args:
+            rooms (dict[int, int]): The numbers of the rooms by id.
+            stays (list[tuple[int, date, date]]): The id, arrival and
+                departure dates of the stays to assign.
+            pinned_stays (list[tuple[int, date, date]]): The room, arrival and
+                departure dates of the stays whose room is kept.
+            assignments (dict[int, int | None]): The rooms the stays start
+                from, the solver initializes the other ones.
+
+        Returns:
+            TimeTable: The problem.
+        """
+        if assignments is None:
+            assignments = {}
+        room_list = {room: Room(room, number) for room, number in rooms.items()}
         booking_list = [
-            Booking(1, 1, 3),
-            Booking(2, 2, 3),
-            Booking(3, 4, 6),
-            Booking(4, 1, 2),
+            Booking(
+                stay,
+                arrival.toordinal(),
+                departure.toordinal() - 1,
+                room_list.get(assignments.get(stay)),
+            )
+            for stay, arrival, departure in stays
+        ]
+        # Pinned bookings get negative ids, unlike booking rooms
+        booking_list += [
+            Booking(
+                -i,
+                arrival.toordinal(),
+                departure.toordinal() - 1,
+                room_list[room],
+                pinned=True,
+            )
+            for i, (room, arrival, departure) in enumerate(pinned_stays, start=1)
+            if room in room_list
         ]
-        return TimeTable(room_list, booking_list)
+        return TimeTable(list(room_list.values()), booking_list)
 
-    def solve(self):
-        return self.solver.solve(self.problem)
+    def solve(self, problem: TimeTable) -> TimeTable:
+        return self.solver.solve(problem)
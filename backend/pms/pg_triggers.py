@@ -0,0 +1,146 @@
+import pgtrigger
+
+from .models import Booking, BookingRoom, RoomTypeDailyOccupancy
+from .occupancy import get_stay_nights_sql
+
+"""
+The daily occupancies of the room types are counters maintained in the same
+transaction as the bookings, whichever code writes them. Booking rooms are
+counted unless their booking is cancelled. The triggers are statement level,
+so a bulk write updates each counter once. Counters are only incremented by
+upserts, decrements update the existing ones, which may have been deleted
+along with their room type.
+"""
+OCCUPANCY_TABLE = RoomTypeDailyOccupancy._meta.db_table
+BOOKING_TABLE = Booking._meta.db_table
+CANCELLED = Booking.StatusChoices.CANCELLED
+
+
+def get_increment_sql(booking_rooms: str, sign: str) -> str:
+    """
+    Get the SQL adding (sign "+") or removing (sign "-") the nights of some
+    booking rooms, a query of booking room rows, to the daily occupancies.
+    """
+    nights = f"""
+        SELECT booking_room.room_type_id,
+            lower(booking_room.dates) + night AS date,
+            count(*) AS booked_count
+        FROM ({booking_rooms}) booking_room
+        CROSS JOIN LATERAL {get_stay_nights_sql("booking_room")}
+        WHERE booking_room.room_type_id IS NOT NULL
+        GROUP BY 1, 2
+    """
+    if sign == "+":
+        return f"""
+          INSERT INTO {OCCUPANCY_TABLE} (room_type_id, date, booked_count)
+          {nights}
+          ON CONFLICT (room_type_id, date) DO UPDATE
+          SET booked_count = {OCCUPANCY_TABLE}.booked_count + EXCLUDED.booked_count;
+        """
+    return f"""
+          UPDATE {OCCUPANCY_TABLE} occupancy
+          SET booked_count = occupancy.booked_count - nights.booked_count
+          FROM ({nights}) nights
+          WHERE occupancy.room_type_id = nights.room_type_id
+            AND occupancy.date = nights.date;
+        """
+
+
+def get_booked_sql(booking_rooms: str) -> str:
+    """
+    Get the SQL of the booking rooms of a transition table whose booking is
+    not cancelled.
+    """
+    return f"""
+        SELECT booking_room.* FROM {booking_rooms} booking_room
+        LEFT JOIN {BOOKING_TABLE} booking ON booking.id = booking_room.booking_id
+        WHERE booking.status IS DISTINCT FROM '{CANCELLED}'
+    """
+
+
+def get_moved_sql(booking_rooms: str, other_booking_rooms: str) -> str:
+    """
+    Get the SQL of the booking rooms of an update transition table whose
+    booking, room type or dates changed.
+    """
+    return f"""
+        SELECT booking_room.* FROM {booking_rooms} booking_room
+        JOIN {other_booking_rooms} other USING (id)
+        WHERE (booking_room.booking_id, booking_room.room_type_id, booking_room.dates)
+            IS DISTINCT FROM (other.booking_id, other.room_type_id, other.dates)
+    """
+
+
+def get_cancelled_sql(cancelled: str, not_cancelled: str) -> str:
+    """
+    Get the SQL of the booking rooms of the bookings cancelled in a transition
+    table but not in the other one.
+    """
+    return f"""
+        SELECT booking_room.* FROM {BookingRoom._meta.db_table} booking_room
+        JOIN {cancelled} cancelled ON cancelled.id = booking_room.booking_id
+        JOIN {not_cancelled} not_cancelled
+            ON not_cancelled.id = booking_room.booking_id
+        WHERE cancelled.status = '{CANCELLED}'
+            AND not_cancelled.status != '{CANCELLED}'
+    """
+
+
+MOVED_FROM = f"({get_moved_sql('old_booking_rooms', 'new_booking_rooms')})"
+MOVED_TO = f"({get_moved_sql('new_booking_rooms', 'old_booking_rooms')})"
+
+pgtrigger.register(
+    pgtrigger.Trigger(
+        name="pms_booking_room_insert_occupancy",
+        level=pgtrigger.Statement,
+        referencing=pgtrigger.Referencing(new="new_booking_rooms"),
+        operation=pgtrigger.Insert,
+        when=pgtrigger.After,
+        func=f"""
+          {get_increment_sql(get_booked_sql("new_booking_rooms"), "+")}
+          RETURN NULL;
+        """,
+    ),
+    pgtrigger.Trigger(
+        name="pms_booking_room_delete_occupancy",
+        level=pgtrigger.Statement,
+        referencing=pgtrigger.Referencing(old="old_booking_rooms"),
+        operation=pgtrigger.Delete,
+        when=pgtrigger.After,
+        func=f"""
+          {get_increment_sql(get_booked_sql("old_booking_rooms"), "-")}
+          RETURN NULL;
+        """,
+    ),
+    # Transition tables can't be restricted to the updates of some columns,
+    # the rows whose counted columns are unchanged are skipped instead
+    pgtrigger.Trigger(
+        name="pms_booking_room_update_occupancy",
+        level=pgtrigger.Statement,
+        referencing=pgtrigger.Referencing(
+            old="old_booking_rooms", new="new_booking_rooms"
+        ),
+        operation=pgtrigger.Update,
+        when=pgtrigger.After,
+        func=f"""
+          {get_increment_sql(get_booked_sql(MOVED_FROM), "-")}
+          {get_increment_sql(get_booked_sql(MOVED_TO), "+")}
+          RETURN NULL;
+        """,
+    ),
+)(BookingRoom)
+
+pgtrigger.register(
+    pgtrigger.Trigger(
+        name="pms_booking_cancellation_occupancy",
+        level=pgtrigger.Statement,
+        referencing=pgtrigger.Referencing(old="old_bookings", new="new_bookings"),
+        operation=pgtrigger.Update,
+        when=pgtrigger.After,
+        func=f"""
+          {get_increment_sql(get_cancelled_sql("new_bookings", "old_bookings"), "-")}
+          {get_increment_sql(get_cancelled_sql("old_bookings", "new_bookings"), "+")}
+          RETURN NULL;
+        """,
+    ),
+)(Booking)
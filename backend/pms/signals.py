@@ -1,11 +1,21 @@
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db.models import Q
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
-from backend.pms.models import HotelEmployee, RatePlan, RatePlanRestrictions, Room
+from backend.pms.models import (
+    Booking,
+    BookingRoom,
+    HotelEmployee,
+    RatePlan,
+    RatePlanRestrictions,
+    Room,
+    RoomType,
+)
+
+from .availability import invalidate_availability
 
 User = get_user_model()
 
@@ -60,3 +70,35 @@ def validate_room(sender, instance: Room, **kwargs):
         & ~Q(id=instance.id)
     ).exists():
         raise ValidationError("Room number must be unique for the hotel")
+
+
+@receiver(post_save, sender=RoomType, dispatch_uid="pms:post_save_room_type")
+@receiver(post_delete, sender=RoomType, dispatch_uid="pms:post_delete_room_type")
+def invalidate_room_type_availability(sender, instance: RoomType, **kwargs):
+    invalidate_availability(instance.hotel_id)
+
+
+@receiver(post_save, sender=Room, dispatch_uid="pms:post_save_room")
+@receiver(post_delete, sender=Room, dispatch_uid="pms:post_delete_room")
+def invalidate_room_availability(sender, instance: Room, **kwargs):
+    # The room type is gone when the room is deleted along with it
+    for hotel_id in RoomType.objects.filter(id=instance.room_type_id).values_list(
+        "hotel_id", flat=True
+    ):
+        invalidate_availability(hotel_id)
+
+
+@receiver(post_save, sender=Booking, dispatch_uid="pms:post_save_booking")
+@receiver(post_delete, sender=Booking, dispatch_uid="pms:post_delete_booking")
+def invalidate_booking_availability(sender, instance: Booking, **kwargs):
+    invalidate_availability(instance.hotel_id)
+
+
+@receiver(post_save, sender=BookingRoom, dispatch_uid="pms:post_save_booking_room")
+@receiver(post_delete, sender=BookingRoom, dispatch_uid="pms:post_delete_booking_room")
+def invalidate_booking_room_availability(sender, instance: BookingRoom, **kwargs):
+    # Bulk writes don't send signals, their callers invalidate the availability
+    for hotel_id in Booking.objects.filter(id=instance.booking_id).values_list(
+        "hotel_id", flat=True
+    ):
+        invalidate_availability(hotel_id)
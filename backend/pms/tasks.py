@@ -0,0 +1,91 @@
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from backend.utils.cache import pop_pending, push_pending
+from backend.utils.db import try_advisory_xact_lock
+from config.celery_app import app
+
+from .assignment import assign_rooms
+from .models import Hotel
+
+# Advisory lock namespace of the room assignment of a hotel, unique across the
+# project, see backend.rms.locks
+HOTEL_ROOMS_LOCK_NAMESPACE = 1002
+
+
+def get_pending_room_assignments_key(hotel_id: int) -> str:
+    return f"pms:room_assignments:{hotel_id}:pending"
+
+
+def schedule_room_assignment(hotel_id: int, dates: tuple[str, str]):
+    """
+    Assign the rooms of the booking rooms of a hotel staying some nights once
+    the current transaction is committed, on the room assignment queue. The
+    assignments scheduled until the task runs are handled together.
+
+    Args:
+        hotel_id (int): The hotel id.
+        dates (tuple[str, str]): The arrival and departure dates of the new
+            booking rooms.
+    """
+
+    def schedule():
+        if push_pending(
+            get_pending_room_assignments_key(hotel_id),
+            tuple(dates),
+            schedule_timeout=60,
+        ):
+            assign_pending_hotel_rooms.apply_async(args=(hotel_id,))
+
+    transaction.on_commit(schedule)
+
+
+@app.task
+def assign_pending_hotel_rooms(hotel_id: int):
+    # Routed to the room assignment workers by CELERY_TASK_ROUTES
+    hotel = Hotel.objects.get(id=hotel_id)
+    with transaction.atomic():
+        if not try_advisory_xact_lock(HOTEL_ROOMS_LOCK_NAMESPACE, hotel_id):
+            # The assignments stay pending, they are handled along with the
+            # ones coming in meanwhile
+            assign_pending_hotel_rooms.apply_async(
+                args=(hotel_id,),
+                countdown=settings.PMS_ROOM_ASSIGNMENT_LOCK_RETRY_DELAY,
+            )
+            return
+
+        pending = pop_pending(get_pending_room_assignments_key(hotel_id))
+        if not pending:
+            return
+        if None in pending:
+            # Some were evicted, assign the whole inventory
+            start_date = timezone.now().astimezone(hotel.timezone).date()
+            end_date = start_date + timezone.timedelta(days=hotel.inventory_days)
+        else:
+            start_date = min(
+                timezone.datetime.strptime(arrival, "%Y-%m-%d").date()
+                for arrival, _ in pending
+            )
+            # The last night is the one before the departure
+            end_date = max(
+                timezone.datetime.strptime(departure, "%Y-%m-%d").date()
+                for _, departure in pending
+            ) - timezone.timedelta(days=1)
+        assign_rooms(hotel, (start_date, end_date))
+
+
+@worker_process_init.connect
+def warm_up_room_assignment_solver(**kwargs):
+    """
+    Start the JVM and build the solver factory of the default time budget in
+    each process of the room assignment workers, before their first task.
+    The JVM can't be forked, so it is started once the process is.
+    """
+    if settings.PMS_ROOM_ASSIGNMENT_WARM_UP:
+        from .optapy.solver import get_solver_factory
+
+        get_solver_factory(
+            Hotel._meta.get_field("room_assignment_time_budget").get_default()
+        )
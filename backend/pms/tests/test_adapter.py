@@ -37,3 +37,34 @@ def test_get_room_type_inventory_map(rate_plan_factory):
         room_types=[rate_plan.room_type.id],
         dates=[today, today + timezone.timedelta(days=1)],
     ) == {rate_plan.room_type.id: {today: 1, today + timezone.timedelta(days=1): 0}}
+
+
+def test_room_type_occupancies(rate_plan_factory, room_type_factory):
+    rate_plan: RatePlan = rate_plan_factory()
+    room_type = rate_plan.room_type
+    hotel = room_type.hotel
+    other_room_type = room_type_factory(hotel=hotel)
+    today = timezone.now().date()
+
+    def book(dates, status=Booking.StatusChoices.NEW):
+        booking = Booking.objects.create(
+            hotel=hotel, dates=dates, status=status, raw_data={}
+        )
+        BookingRoom.objects.create(
+            booking=booking, room_type=room_type, dates=dates, raw_data={}
+        )
+
+    # Clipped to the range
+    book([today - timezone.timedelta(days=3), today + timezone.timedelta(days=2)])
+    # Only the last date
+    book([today + timezone.timedelta(days=3), today + timezone.timedelta(days=9)])
+    book(
+        [today, today + timezone.timedelta(days=5)],
+        status=Booking.StatusChoices.CANCELLED,
+    )
+
+    room_types = [room_type.id, other_room_type.id]
+    dates = (today, today + timezone.timedelta(days=3))
+    occupancies = {room_type.id: [1, 1, 0, 1], other_room_type.id: [0, 0, 0, 0]}
+    assert hotel.adapter.count_room_type_occupancies(room_types, dates) == occupancies
+    assert hotel.adapter.get_room_type_occupancies(room_types, dates) == occupancies
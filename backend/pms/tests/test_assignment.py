@@ -0,0 +1,187 @@
+from datetime import date
+
+from django.utils import timezone
+
+from ..assignment import (
+    assign_room_type_stays,
+    assign_rooms,
+    assign_stays,
+    drop_conflicting_stays,
+)
+from ..models import Booking, BookingRoom
+
+
+def day(n: int) -> date:
+    return date(2023, 1, n)
+
+
+def test_assign_stays():
+    stays = [
+        (1, day(1), day(4)),
+        (2, day(1), day(2)),
+        (3, day(2), day(5)),
+        (4, day(3), day(4)),
+        # All rooms are taken
+        (5, day(3), day(5)),
+        (6, day(4), day(6)),
+    ]
+    assignments = assign_stays([10, 20, 30], stays)
+    assert assignments[5] is None
+    assert drop_conflicting_stays(assignments, stays) == assignments
+    assert sum(room is not None for room in assignments.values()) == 5
+
+    # Around the pinned stays
+    assignments = assign_stays(
+        [10, 20], stays[:2], pinned_stays=[(10, day(2), day(3)), (20, day(5), day(6))]
+    )
+    assert assignments == {1: 20, 2: 10}
+    # The shortest gap fitting each stay
+    assignments = assign_stays([10, 20], stays[:2], pinned_stays=[(10, day(4), day(6))])
+    assert assignments == {1: 20, 2: 10}
+
+
+def test_drop_conflicting_stays():
+    stays = [(1, day(1), day(3)), (2, day(2), day(4)), (3, day(4), day(5))]
+    assert drop_conflicting_stays({1: 10, 2: 10, 3: 10}, stays) == {
+        1: 10,
+        2: None,
+        3: 10,
+    }
+    assert drop_conflicting_stays(
+        {1: 10, 2: 20, 3: 20}, stays, pinned_stays=[(10, day(2), day(3))]
+    ) == {1: None, 2: 20, 3: 20}
+
+
+def test_assign_room_type_stays_fallback(mocker):
+    rooms = {10: 1, 11: 2}
+    stays = [(1, day(1), day(3)), (2, day(3), day(6)), (3, day(2), day(4))]
+    pinned_stays = [(10, day(4), day(5))]
+    solve_stays = mocker.patch(
+        "backend.pms.assignment.solve_stays", return_value={1: 11, 2: 11, 3: 10}
+    )
+
+    # The greedy assignment leaves no room for the second stay
+    assert assign_room_type_stays(rooms, stays, pinned_stays) == {1: 11, 2: 11, 3: 10}
+    solve_stays.assert_called_once_with(
+        rooms, stays, pinned_stays, {1: 10, 2: None, 3: 11}, time_budget=500
+    )
+
+    # Not when the room type is overbooked
+    solve_stays.reset_mock()
+    assignments = assign_room_type_stays({10: 1}, stays, pinned_stays)
+    assert assignments == {1: 10, 2: None, 3: None}
+    solve_stays.assert_not_called()
+
+    # Nor without pinned stays
+    assert assign_room_type_stays(rooms, stays, []) == {1: 11, 2: 11, 3: 10}
+    solve_stays.assert_not_called()
+
+
+def test_assign_room_type_stays_warm_start(mocker):
+    rooms = {10: 1, 11: 2}
+    stays = [(1, day(1), day(3))]
+    pinned_stays = [(11, day(1), day(2))]
+    movable_stays = [(2, 10, day(2), day(4))]
+    solve_stays = mocker.patch(
+        "backend.pms.assignment.solve_stays", return_value={1: 10, 2: 11}
+    )
+
+    # The movable stay is moved out of the way
+    assert assign_room_type_stays(
+        rooms, stays, pinned_stays, movable_stays, time_budget=200
+    ) == {1: 10, 2: 11}
+    solve_stays.assert_called_once_with(
+        rooms,
+        [(1, day(1), day(3)), (2, day(2), day(4))],
+        pinned_stays,
+        {1: None, 2: 10},
+        time_budget=200,
+    )
+
+    # Unless it loses its room
+    solve_stays.return_value = {1: 10, 2: None}
+    assert assign_room_type_stays(rooms, stays, pinned_stays, movable_stays) == {
+        1: None
+    }
+
+
+def test_assign_rooms(room_type_factory, room_factory):
+    room_type = room_type_factory()
+    hotel = room_type.hotel
+    rooms = room_factory.create_batch(2, room_type=room_type)
+    today = timezone.now().date()
+    days = [today + timezone.timedelta(days=i) for i in range(4)]
+
+    def create_booking_room(dates, room=None, status=Booking.StatusChoices.NEW):
+        booking = Booking.objects.create(
+            hotel=hotel, dates=dates, status=status, raw_data={}
+        )
+        return BookingRoom.objects.create(
+            booking=booking, room_type=room_type, dates=dates, room=room, raw_data={}
+        )
+
+    pinned = create_booking_room((days[0], days[2]), room=rooms[0])
+    cancelled = create_booking_room(
+        (days[1], days[3]), room=rooms[1], status=Booking.StatusChoices.CANCELLED
+    )
+    booking_rooms = [
+        create_booking_room((days[0], days[1])),
+        create_booking_room((days[1], days[2])),
+        create_booking_room((days[2], days[3])),
+        # Overbooked
+        create_booking_room((days[1], days[3])),
+    ]
+
+    assignments = assign_rooms(hotel, (days[0], days[2]))
+    assert assignments[booking_rooms[0].id] == rooms[1].id
+    assert assignments[booking_rooms[1].id] == rooms[1].id
+    assert assignments[booking_rooms[2].id] is not None
+    assert assignments[booking_rooms[3].id] is None
+    for booking_room in booking_rooms:
+        booking_room.refresh_from_db()
+        assert booking_room.room_id == assignments[booking_room.id]
+    pinned.refresh_from_db()
+    assert pinned.room == rooms[0]
+    cancelled.refresh_from_db()
+    assert cancelled.room is None
+
+    # Only the booking rooms without a room
+    assert assign_rooms(hotel, (days[0], days[2])) == {booking_rooms[3].id: None}
+
+
+def test_assign_rooms_warm_start(room_type_factory, room_factory, mocker):
+    room_type = room_type_factory()
+    hotel = room_type.hotel
+    rooms = room_factory.create_batch(2, room_type=room_type)
+    today = timezone.now().astimezone(hotel.timezone).date()
+    days = [today + timezone.timedelta(days=i) for i in range(6)]
+
+    def create_booking_room(dates, room=None):
+        booking = Booking.objects.create(hotel=hotel, dates=dates, raw_data={})
+        return BookingRoom.objects.create(
+            booking=booking, room_type=room_type, dates=dates, room=room, raw_data={}
+        )
+
+    first = create_booking_room((days[1], days[3]), room=rooms[0])
+    second = create_booking_room((days[3], days[5]), room=rooms[1])
+    new = create_booking_room((days[1], days[5]))
+    solve_stays = mocker.patch(
+        "backend.pms.assignment.solve_stays",
+        return_value={
+            new.id: rooms[0].id,
+            first.id: rooms[1].id,
+            second.id: rooms[1].id,
+        },
+    )
+
+    assert assign_rooms(hotel, (days[1], days[4])) == {
+        new.id: rooms[0].id,
+        first.id: rooms[1].id,
+    }
+    assert (
+        solve_stays.call_args.kwargs["time_budget"] == hotel.room_assignment_time_budget
+    )
+    # The moved stay leaves its room before the new one takes it
+    for booking_room, room in ((new, rooms[0]), (first, rooms[1]), (second, rooms[1])):
+        booking_room.refresh_from_db()
+        assert booking_room.room == room
@@ -0,0 +1,84 @@
+from django.utils import timezone
+
+from ..availability import build_availability, get_availability
+from ..models import Booking, BookingRoom
+
+
+def test_build_availability(room_type_factory, room_factory):
+    room_type = room_type_factory()
+    other_room_type = room_type_factory(hotel=room_type.hotel)
+    room_factory.create_batch(2, room_type=room_type)
+    today = timezone.now().date()
+    days = [today + timezone.timedelta(days=i) for i in range(3)]
+    booking = Booking.objects.create(
+        hotel=room_type.hotel, dates=(days[0], days[2]), raw_data={}
+    )
+    BookingRoom.objects.bulk_create(
+        [
+            BookingRoom(booking=booking, room_type=room_type, dates=dates, raw_data={})
+            for dates in ((days[0], days[2]), (days[0], days[1]))
+        ]
+        + [
+            BookingRoom(
+                booking=booking,
+                room_type=other_room_type,
+                dates=(days[1], days[2]),
+                raw_data={},
+            )
+        ]
+    )
+
+    availability = build_availability(room_type.hotel, days[0], days[2])
+    assert availability["dates"] == days
+    assert availability["room_types"] == [
+        {
+            "uuid": room_type.uuid,
+            "name": room_type.name,
+            "rooms": 2,
+            "availability": [0, 1, 2],
+        },
+        {
+            "uuid": other_room_type.uuid,
+            "name": other_room_type.name,
+            "rooms": 0,
+            # Overbooked
+            "availability": [0, -1, 0],
+        },
+    ]
+
+
+def test_get_availability(
+    room_type_factory,
+    room_factory,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        room = room_factory(room_type=room_type_factory(hotel__inventory_days=100))
+    hotel = room.room_type.hotel
+    availability, etag = get_availability(hotel)
+    assert len(availability["dates"]) == 101
+    assert availability["room_types"][0]["availability"] == [1] * 101
+
+    # Cached
+    with django_assert_num_queries(0):
+        assert get_availability(hotel) == (availability, etag)
+
+    # Invalidated when a booking is written
+    today = timezone.now().astimezone(hotel.timezone).date()
+    with django_capture_on_commit_callbacks(execute=True):
+        booking = Booking.objects.create(
+            hotel=hotel, dates=(today, today + timezone.timedelta(days=1)), raw_data={}
+        )
+        BookingRoom.objects.create(
+            booking=booking, room_type=room.room_type, dates=booking.dates, raw_data={}
+        )
+    availability, new_etag = get_availability(hotel)
+    assert new_etag != etag
+    assert availability["room_types"][0]["availability"] == [0] + [1] * 100
+
+    # And when a room is deleted
+    with django_capture_on_commit_callbacks(execute=True):
+        room.delete()
+    availability, _ = get_availability(hotel)
+    assert availability["room_types"][0]["availability"] == [-1] + [0] * 100
@@ -13,6 +13,11 @@ def test_hotel_validation(hotel_factory):
     with pytest.raises(ValidationError):
         hotel.save()
 
+    hotel.inventory_days = 100
+    hotel.room_assignment_time_budget = 10001
+    with pytest.raises(ValidationError):
+        hotel.save()
+
 
 def test_hotel_employee_model(db):
     user = User.objects.create(
@@ -0,0 +1,91 @@
+from django.core.management import call_command
+from django.utils import timezone
+
+from ..models import Booking, BookingRoom, RoomTypeDailyOccupancy
+from ..occupancy import rebuild_room_type_occupancies
+
+
+def get_occupancies(room_type) -> dict:
+    return dict(
+        RoomTypeDailyOccupancy.objects.filter(room_type=room_type)
+        .exclude(booked_count=0)
+        .values_list("date", "booked_count")
+    )
+
+
+def test_room_type_daily_occupancy_triggers(room_type_factory):
+    room_type = room_type_factory()
+    other_room_type = room_type_factory(hotel=room_type.hotel)
+    today = timezone.now().date()
+    days = [today + timezone.timedelta(days=i) for i in range(4)]
+    booking = Booking.objects.create(
+        hotel=room_type.hotel, dates=(days[0], days[2]), raw_data={}
+    )
+    booking_rooms = BookingRoom.objects.bulk_create(
+        [
+            BookingRoom(
+                booking=booking,
+                room_type=room_type,
+                dates=(days[0], days[2]),
+                raw_data={},
+            )
+            for _ in range(2)
+        ]
+    )
+    assert get_occupancies(room_type) == {days[0]: 2, days[1]: 2}
+
+    # Moved
+    booking_room = booking_rooms[0]
+    booking_room.dates = (days[1], days[3])
+    booking_room.save()
+    assert get_occupancies(room_type) == {days[0]: 1, days[1]: 2, days[2]: 1}
+    booking_room.room_type = other_room_type
+    booking_room.save()
+    assert get_occupancies(room_type) == {days[0]: 1, days[1]: 1}
+    assert get_occupancies(other_room_type) == {days[1]: 1, days[2]: 1}
+    # Not counted columns
+    BookingRoom.objects.filter(booking=booking).update(raw_data={"updated": True})
+    assert get_occupancies(room_type) == {days[0]: 1, days[1]: 1}
+
+    # Cancelled, then not anymore
+    booking.status = Booking.StatusChoices.CANCELLED
+    booking.save()
+    assert get_occupancies(room_type) == {}
+    assert get_occupancies(other_room_type) == {}
+    BookingRoom.objects.create(
+        booking=booking, room_type=room_type, dates=(days[0], days[1]), raw_data={}
+    )
+    assert get_occupancies(room_type) == {}
+    Booking.objects.filter(id=booking.id).update(status=Booking.StatusChoices.MODIFIED)
+    assert get_occupancies(room_type) == {days[0]: 2, days[1]: 1}
+
+    booking_rooms[1].delete()
+    assert get_occupancies(room_type) == {days[0]: 1}
+
+
+def test_rebuild_room_type_occupancies(room_type_factory):
+    room_type = room_type_factory()
+    today = timezone.now().date()
+    booking = Booking.objects.create(
+        hotel=room_type.hotel,
+        dates=(today, today + timezone.timedelta(days=2)),
+        raw_data={},
+    )
+    BookingRoom.objects.create(
+        booking=booking,
+        room_type=room_type,
+        dates=(today, today + timezone.timedelta(days=2)),
+        raw_data={},
+    )
+    occupancies = get_occupancies(room_type)
+    RoomTypeDailyOccupancy.objects.filter(room_type=room_type).update(booked_count=5)
+    RoomTypeDailyOccupancy.objects.create(
+        room_type=room_type, date=today - timezone.timedelta(days=1), booked_count=1
+    )
+
+    assert rebuild_room_type_occupancies([room_type.hotel_id]) == 2
+    assert get_occupancies(room_type) == occupancies
+
+    RoomTypeDailyOccupancy.objects.filter(room_type=room_type).delete()
+    call_command("rebuild_room_type_occupancies", hotels=[str(room_type.hotel.uuid)])
+    assert get_occupancies(room_type) == occupancies
@@ -0,0 +1,59 @@
+from datetime import date
+
+from celery import current_app
+
+from ..tasks import (
+    HOTEL_ROOMS_LOCK_NAMESPACE,
+    assign_pending_hotel_rooms,
+    schedule_room_assignment,
+)
+
+
+def test_schedule_room_assignment(
+    hotel_factory, django_capture_on_commit_callbacks, mocker
+):
+    hotel = hotel_factory()
+    apply_async = mocker.patch.object(assign_pending_hotel_rooms, "apply_async")
+    assign_rooms = mocker.patch("backend.pms.tasks.assign_rooms")
+
+    # A burst of bookings is assigned at once
+    with django_capture_on_commit_callbacks(execute=True):
+        schedule_room_assignment(hotel.id, ("2023-06-10", "2023-06-12"))
+        schedule_room_assignment(hotel.id, ("2023-06-01", "2023-06-11"))
+    apply_async.assert_called_once_with(args=(hotel.id,))
+
+    assign_pending_hotel_rooms(hotel.id)
+    assign_rooms.assert_called_once_with(hotel, (date(2023, 6, 1), date(2023, 6, 11)))
+
+    # Nothing is pending anymore
+    assign_pending_hotel_rooms(hotel.id)
+    assign_rooms.assert_called_once()
+
+
+def test_assign_pending_hotel_rooms_locked(
+    hotel_factory, django_capture_on_commit_callbacks, mocker
+):
+    hotel = hotel_factory()
+    apply_async = mocker.patch.object(assign_pending_hotel_rooms, "apply_async")
+    assign_rooms = mocker.patch("backend.pms.tasks.assign_rooms")
+    with django_capture_on_commit_callbacks(execute=True):
+        schedule_room_assignment(hotel.id, ("2023-06-01", "2023-06-02"))
+    apply_async.reset_mock()
+
+    # The rooms of the hotel are being assigned, the task is retried
+    try_advisory_xact_lock = mocker.patch(
+        "backend.pms.tasks.try_advisory_xact_lock", return_value=False
+    )
+    assign_pending_hotel_rooms(hotel.id)
+    try_advisory_xact_lock.assert_called_once_with(HOTEL_ROOMS_LOCK_NAMESPACE, hotel.id)
+    assign_rooms.assert_not_called()
+    apply_async.assert_called_once()
+
+    try_advisory_xact_lock.return_value = True
+    assign_pending_hotel_rooms(hotel.id)
+    assign_rooms.assert_called_once_with(hotel, (date(2023, 6, 1), date(2023, 6, 1)))
+
+
+def test_assign_pending_hotel_rooms_route():
+    route = current_app.amqp.router.route({}, assign_pending_hotel_rooms.name)
+    assert route["queue"].name == "room_assignment"
@@ -179,3 +179,24 @@ def test_room_model_view_set_manager_create(manager, get_api_client):
         },
     )
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_availability_api_view(admin, receptionist, get_api_client, room_factory):
+    room = room_factory(room_type__hotel__inventory_days=100)
+    hotel = room.room_type.hotel
+    url = reverse("pms:availability", kwargs={"uuid": hotel.uuid})
+
+    # Not the hotel of the receptionist
+    response = get_api_client(receptionist).get(url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    admin_api_client = get_api_client(admin)
+    response = admin_api_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data["dates"]) == 101
+    assert response.data["room_types"][0]["uuid"] == room.room_type.uuid
+    assert response.data["room_types"][0]["availability"] == [1] * 101
+
+    response = admin_api_client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
@@ -1,10 +1,11 @@
 from django.contrib.auth import get_user_model
 from django_filters import rest_framework as filters
-from rest_framework import response, viewsets
+from rest_framework import generics, response, status, viewsets
 from rest_framework.decorators import action
 
-from backend.users.permissions import IsAdmin, IsEmployee, IsManager
+from backend.users.permissions import IsAdmin, IsEmployee, IsManager, IsReceptionist
 
+from .availability import get_availability
 from .filters import RoomTypeFilter
 from .models import Hotel, HotelEmployee, RatePlan, Room, RoomType
 from .serializers import (
@@ -73,3 +74,30 @@ class RoomModelViewSet(viewsets.ModelViewSet):
         if self.request.user.role == User.UserRoleChoices.ADMIN:
             return Room.objects.all()
         return Room.objects.filter(hotel=self.request.user.hotel_employee.hotel)
+
+
+class AvailabilityAPIView(generics.GenericAPIView):
+    """
+    The rooms left of each room type for each date of the inventory of a
+    hotel. Clients polling it send the ETag of the availability they have in
+    If-None-Match and get a 304 until bookings or rooms change.
+    """
+
+    permission_classes = [IsManager | IsReceptionist | IsAdmin]
+    lookup_field = "uuid"
+
+    def get_queryset(self):
+        if self.request.user.role == User.UserRoleChoices.ADMIN:
+            return Hotel.objects.all()
+        return Hotel.objects.filter(id=self.request.user.hotel_employee.hotel_id)
+
+    def get(self, request, *args, **kwargs):
+        hotel = self.get_object()
+        availability, etag = get_availability(hotel)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get("If-None-Match", "")
+        if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            return response.Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers
+            )
+        return response.Response(availability, headers=headers)
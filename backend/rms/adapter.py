@@ -1,28 +1,48 @@
 import math
+from bisect import bisect_right
+from collections.abc import Iterable
 from datetime import date as date_cls
 from datetime import datetime, time, timedelta
-from zoneinfo import ZoneInfo
 
+import numpy as np
+from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Prefetch
 from django.utils import timezone
 
 from backend.pms.models import Hotel, RatePlan, RatePlanRestrictions
-
+from backend.utils.cache import get_or_set_locked
+from backend.utils.db import bulk_update_from_values, copy_from_values
+
+from .cache import (
+    PendingInvalidation,
+    adapter_invalidation_listener,
+    get_pending_invalidations,
+    local_adapter_cache,
+)
+from .codec import (
+    PAYLOAD_VERSION,
+    PayloadVersionError,
+    decode_adapter_payload,
+    encode_adapter_payload,
+)
 from .models import (
     DynamicPricingSetting,
     IntervalBaseRate,
     LeadDaysBasedRule,
     MonthBasedRule,
     OccupancyBasedTriggerRule,
+    RateHistory,
+    RateTrace,
     RMSRatePlan,
-    RMSRatePlanRestrictions,
     SeasonBasedRule,
     TimeBasedTriggerRule,
     WeekdayBasedRule,
 )
-from .utils import is_within_period
+from .rate_calendar import invalidate_rate_calendar
+from .utils import build_day_of_year_table, get_day_of_year_index
 
 
 class FactorChoices:
@@ -31,6 +51,12 @@ class FactorChoices:
 
 
 class DynamicPricingAdapter:
+    # Extra days compiled into the factor calendar on top of the inventory days
+    FACTOR_CALENDAR_MARGIN_DAYS = 7
+    # Keys of older generations are deleted when the generation is bumped, the
+    # timeout only cleans up the ones that were set concurrently
+    CACHE_TIMEOUT = 60 * 60 * 24
+
     def __init__(
         self, hotel: Hotel | str | int = None, setting: DynamicPricingSetting = None
     ):
@@ -48,8 +74,33 @@ class DynamicPricingAdapter:
             )
         else:
             raise ValidationError("Must provide either a hotel or a setting")
+        self.factor_calendar = None
+        self.generation = None
         self.load_from_cache()
 
+    @classmethod
+    def from_rules(
+        cls, setting: DynamicPricingSetting, rules: dict[str, list[dict]]
+    ) -> "DynamicPricingAdapter":
+        """
+        Build a dynamic pricing adapter from the given setting and rules
+        without reading or writing the cache, e.g. to simulate rule changes.
+
+        Args:
+            setting (DynamicPricingSetting): The setting, with its hotel.
+            rules (dict[str, list[dict]]): The rules, see load_rules.
+
+        Returns:
+            DynamicPricingAdapter: The dynamic pricing adapter.
+        """
+        adapter = cls.__new__(cls)
+        adapter.setting = setting
+        # Never shared, see get_factor_calendar
+        adapter.factor_calendar = None
+        adapter.generation = None
+        adapter.load_rules(rules)
+        return adapter
+
     def load_from_db(self):
         """
         Load the dynamic pricing adapter from the database.
@@ -58,74 +109,109 @@ class DynamicPricingAdapter:
             DynamicPricingAdapter: The dynamic pricing adapter.
         """
         self.setting = DynamicPricingSetting.objects.get(pk=self.setting.id)
-        self.timezone = self.setting.hotel.timezone
-        self.is_enabled = self.setting.is_enabled
+        setting = self.setting
+        # Querysets are lazy, the rules of disabled kinds are never queried
+        self.load_rules(
+            {
+                "interval_base_rates": IntervalBaseRate.objects.filter(setting=setting)
+                .order_by("dates")
+                .values("dates", "base_rate"),
+                "rate_plan_percentage_factors": RMSRatePlan.objects.filter(
+                    rate_plan__room_type__hotel=setting.hotel
+                ).values("rate_plan__id", "percentage_factor", "increment_factor"),
+                "lead_days_based_rules": LeadDaysBasedRule.objects.filter(
+                    setting=setting
+                )
+                .order_by("lead_days")
+                .values("percentage_factor", "increment_factor"),
+                "weekday_based_rules": WeekdayBasedRule.objects.filter(setting=setting)
+                .order_by("weekday")
+                .values("percentage_factor", "increment_factor"),
+                "month_based_rules": MonthBasedRule.objects.filter(setting=setting)
+                .order_by("month")
+                .values("percentage_factor", "increment_factor"),
+                "season_based_rules": SeasonBasedRule.objects.filter(setting=setting)
+                .order_by("name")
+                .values(
+                    "start_month",
+                    "start_day",
+                    "end_month",
+                    "end_day",
+                    "percentage_factor",
+                    "increment_factor",
+                ),
+                # order_by is used to make sure that the rules are applied
+                # will be applied in the correct order, max -> min
+                "occupancy_based_trigger_rules": OccupancyBasedTriggerRule.objects.filter(
+                    setting=setting
+                )
+                .order_by("-min_occupancy")
+                .values("min_occupancy", "increment_factor", "percentage_factor"),
+                "time_based_trigger_rules": TimeBasedTriggerRule.objects.filter(
+                    setting=setting
+                )
+                .order_by("day_ahead", "-hour", "-min_occupancy")
+                .values(
+                    "hour",
+                    "percentage_factor",
+                    "increment_factor",
+                    "min_occupancy",
+                    "day_ahead",
+                ),
+            }
+        )
+
+    def load_rules(self, rules: dict[str, Iterable[dict]]):
+        """
+        Compile the setting of the adapter and the given rules. The rules of
+        disabled kinds are not read.
+
+        Args:
+            rules (dict[str, Iterable[dict]]): The rules of each kind keyed by
+                the related name of its model (and rate_plan_percentage_factors
+                for the factors of the rate plans), in the order they apply,
+                see load_from_db for their fields.
+        """
+        setting = self.setting
+        self.timezone = setting.hotel.timezone
+        self.inventory_days = setting.hotel.inventory_days
+        self.is_enabled = setting.is_enabled
 
         # Base rate
-        self.default_base_rate = self.setting.default_base_rate
-        self.interval_base_rates = list(
-            IntervalBaseRate.objects.filter(setting=self.setting)
-            .order_by("dates")
-            .values("dates", "base_rate")
+        self.default_base_rate = setting.default_base_rate
+        self.interval_base_rate_index = self._build_interval_base_rate_index(
+            rules["interval_base_rates"]
         )
         # Rate plan percentage factors
-        rate_plan_percentage_factors = list(
-            RMSRatePlan.objects.filter(
-                rate_plan__room_type__hotel=self.setting.hotel
-            ).values("rate_plan__id", "percentage_factor", "increment_factor")
-        )
         self.rate_plan_percentage_factors = {
             factor["rate_plan__id"]: {
                 "percentage_factor": factor["percentage_factor"],
                 "increment_factor": factor["increment_factor"],
             }
-            for factor in rate_plan_percentage_factors
+            for factor in rules["rate_plan_percentage_factors"]
         }
         # Lead days based rules
-        self.is_lead_days_based = self.setting.is_lead_days_based
+        self.is_lead_days_based = setting.is_lead_days_based
         if self.is_lead_days_based:
-            self.lead_days_based_rules = list(
-                LeadDaysBasedRule.objects.filter(setting=self.setting)
-                .order_by("lead_days")
-                .values("percentage_factor", "increment_factor")
-            )
+            self.lead_days_based_rules = list(rules["lead_days_based_rules"])
         else:
             self.lead_days_based_rules = []
         # Weekday based rules
-        self.is_weekday_based = self.setting.is_weekday_based
+        self.is_weekday_based = setting.is_weekday_based
         if self.is_weekday_based:
-            self.weekday_based_rules = list(
-                WeekdayBasedRule.objects.filter(setting=self.setting)
-                .order_by("weekday")
-                .values("percentage_factor", "increment_factor")
-            )
+            self.weekday_based_rules = list(rules["weekday_based_rules"])
         else:
             self.weekday_based_rules = []
         # Month based rules
-        self.is_month_based = self.setting.is_month_based
+        self.is_month_based = setting.is_month_based
         if self.is_month_based:
-            self.month_based_rules = list(
-                MonthBasedRule.objects.filter(setting=self.setting)
-                .order_by("month")
-                .values("percentage_factor", "increment_factor")
-            )
+            self.month_based_rules = list(rules["month_based_rules"])
         else:
             self.month_based_rules = []
         # Season based rules
-        self.is_season_based = self.setting.is_season_based
+        self.is_season_based = setting.is_season_based
         if self.is_season_based:
-            season_based_rules = (
-                SeasonBasedRule.objects.filter(setting=self.setting)
-                .order_by("name")
-                .values(
-                    "start_month",
-                    "start_day",
-                    "end_month",
-                    "end_day",
-                    "percentage_factor",
-                    "increment_factor",
-                )
-            )
+            season_based_rules = list(rules["season_based_rules"])
             self.season_based_rules = list(
                 {
                     "start_date": f"{rule['start_month']}/{rule['start_day']}",
@@ -135,140 +221,409 @@ class DynamicPricingAdapter:
                 }
                 for rule in season_based_rules
             )
+            # Resolve the first matching rule of every day of the year up front
+            self.season_based_table = build_day_of_year_table(
+                [
+                    (
+                        rule["start_month"],
+                        rule["start_day"],
+                        rule["end_month"],
+                        rule["end_day"],
+                    )
+                    for rule in season_based_rules
+                ]
+            )
         else:
             self.season_based_rules = []
+            self.season_based_table = build_day_of_year_table([])
         # Availability based trigger rules
-        self.is_occupancy_based = self.setting.is_occupancy_based
+        self.is_occupancy_based = setting.is_occupancy_based
         if self.is_occupancy_based:
-            # order_by is used to make sure that the rules are applied
-            # will be applied in the correct order, max -> min
             self.occupancy_based_trigger_rules = list(
-                OccupancyBasedTriggerRule.objects.filter(setting=self.setting)
-                .order_by("-min_occupancy")
-                .values("min_occupancy", "increment_factor", "percentage_factor")
+                rules["occupancy_based_trigger_rules"]
             )
         else:
             self.occupancy_based_trigger_rules = []
+        self.occupancy_based_trigger_index = self._build_threshold_index(
+            self.occupancy_based_trigger_rules
+        )
         # Time based trigger rules
-        self.is_time_based = self.setting.is_time_based
+        self.is_time_based = setting.is_time_based
         if self.is_time_based:
-            self.time_based_trigger_rules = list(
-                TimeBasedTriggerRule.objects.filter(setting=self.setting)
-                .order_by("day_ahead", "-hour", "-min_occupancy")
-                .values(
-                    "hour",
-                    "percentage_factor",
-                    "increment_factor",
-                    "min_occupancy",
-                    "day_ahead",
-                )
-            )
+            self.time_based_trigger_rules = list(rules["time_based_trigger_rules"])
         else:
             self.time_based_trigger_rules = []
+        self.time_based_trigger_table = self._build_time_based_trigger_table(
+            self.time_based_trigger_rules
+        )
 
     @staticmethod
-    def get_cache_key(setting_id) -> str:
+    def get_cache_key(setting_id, generation: int = None) -> str:
         """
         Get the cache key for the dynamic pricing adapter.
 
+        Args:
+            setting_id (int): The dynamic pricing setting id.
+            generation (int): The generation, defaults to the current one.
+
         Returns:
             str: The cache key for the dynamic pricing adapter.
         """
-        return f"rms:adapter:{setting_id}"
+        if generation is None:
+            generation = DynamicPricingAdapter.get_generation(setting_id)
+        return f"rms:adapter:{setting_id}:{generation}:v{PAYLOAD_VERSION}"
+
+    @staticmethod
+    def get_factor_calendar_cache_key(setting_id, generation: int = None) -> str:
+        """
+        Get the cache key for the factor calendar of the dynamic pricing adapter.
+
+        Args:
+            setting_id (int): The dynamic pricing setting id.
+            generation (int): The generation, defaults to the current one.
+
+        Returns:
+            str: The cache key for the factor calendar.
+        """
+        if generation is None:
+            generation = DynamicPricingAdapter.get_generation(setting_id)
+        return f"rms:adapter:{setting_id}:{generation}:calendar"
+
+    @staticmethod
+    def get_generation_cache_key(setting_id) -> str:
+        """
+        Get the cache key for the generation of the dynamic pricing adapter.
+
+        Returns:
+            str: The cache key for the generation.
+        """
+        return f"rms:adapter:{setting_id}:generation"
+
+    @staticmethod
+    def get_generation(setting_id) -> int:
+        """
+        Get the generation of the dynamic pricing adapter, it is bumped every
+        time the cache is invalidated.
+
+        Returns:
+            int: The generation of the dynamic pricing adapter.
+        """
+        return cache.get(DynamicPricingAdapter.get_generation_cache_key(setting_id), 0)
 
     @staticmethod
     def invalidate_cache(setting_id):
         """
-        Invalidate the cache for the dynamic pricing adapter.
+        Invalidate the cache for the dynamic pricing adapter once the current
+        transaction is committed. Several invalidations of the same setting
+        within a transaction only bump the generation once.
         """
-        cache.delete(DynamicPricingAdapter.get_cache_key(setting_id))
+        if setting_id in get_pending_invalidations():
+            return
+        transaction.on_commit(
+            PendingInvalidation(setting_id, DynamicPricingAdapter.bump_generation)
+        )
 
-    def save_to_cache(self):
+    @staticmethod
+    def bump_generation(setting_id) -> int:
         """
-        Save the dynamic pricing adapter to the cache.
+        Bump the generation of the dynamic pricing adapter, which invalidates
+        it in the shared cache and in the local cache of every process.
+
+        Returns:
+            int: The new generation.
         """
-        cache.set(
-            self.get_cache_key(self.setting.id),
-            {
-                "timezone": self.timezone,
-                "is_enabled": self.is_enabled,
-                # Base rate
-                "default_base_rate": self.default_base_rate,
-                "interval_base_rates": self.interval_base_rates,
-                # Rate plan percentage factors
-                "rate_plan_percentage_factors": self.rate_plan_percentage_factors,
-                # Lead days based rules
-                "is_lead_days_based": self.is_lead_days_based,
-                "lead_days_based_rules": self.lead_days_based_rules,
-                # Weekday based rules
-                "is_weekday_based": self.is_weekday_based,
-                "weekday_based_rules": self.weekday_based_rules,
-                # Month based rules
-                "is_month_based": self.is_month_based,
-                "month_based_rules": self.month_based_rules,
-                # Season based rules
-                "is_season_based": self.is_season_based,
-                "season_based_rules": self.season_based_rules,
-                # Availability based trigger rules
-                "is_occupancy_based": self.is_occupancy_based,
-                "occupancy_based_trigger_rules": self.occupancy_based_trigger_rules,
-                # Time based trigger rules
-                "is_time_based": self.is_time_based,
-                "time_based_trigger_rules": self.time_based_trigger_rules,
-            },
-            timeout=None,
+        generation_key = DynamicPricingAdapter.get_generation_cache_key(setting_id)
+        cache.add(generation_key, 0, timeout=None)
+        generation = cache.incr(generation_key)
+        # The previous generation can't be reached anymore
+        cache.delete_many(
+            [
+                DynamicPricingAdapter.get_cache_key(setting_id, generation - 1),
+                DynamicPricingAdapter.get_factor_calendar_cache_key(
+                    setting_id, generation - 1
+                ),
+            ]
         )
+        local_adapter_cache.evict(setting_id, generation)
+        adapter_invalidation_listener.publish(setting_id, generation)
+        return generation
 
-    def load_from_cache(self):
+    def get_cache_payload(self) -> dict:
         """
-        Load the dynamic pricing adapter from the cache.
+        Get the state of the dynamic pricing adapter that is cached.
 
         Returns:
-            DynamicPricingAdapter: The dynamic pricing adapter.
+            dict: The cache payload.
         """
-        ret = cache.get(self.get_cache_key(self.setting.id))
-        if ret is None:
-            self.load_from_db()
-            self.save_to_cache()
-        else:
-            self.timezone = ret["timezone"]
-            self.is_enabled = ret["is_enabled"]
+        return {
+            "timezone": self.timezone,
+            "inventory_days": self.inventory_days,
+            "is_enabled": self.is_enabled,
             # Base rate
-            self.default_base_rate = ret["default_base_rate"]
-            self.interval_base_rates = ret["interval_base_rates"]
+            "default_base_rate": self.default_base_rate,
+            "interval_base_rate_index": self.interval_base_rate_index,
             # Rate plan percentage factors
-            self.rate_plan_percentage_factors = ret["rate_plan_percentage_factors"]
+            "rate_plan_percentage_factors": self.rate_plan_percentage_factors,
             # Lead days based rules
-            self.is_lead_days_based = ret["is_lead_days_based"]
-            self.lead_days_based_rules = ret["lead_days_based_rules"]
+            "is_lead_days_based": self.is_lead_days_based,
+            "lead_days_based_rules": self.lead_days_based_rules,
             # Weekday based rules
-            self.is_weekday_based = ret["is_weekday_based"]
-            self.weekday_based_rules = ret["weekday_based_rules"]
+            "is_weekday_based": self.is_weekday_based,
+            "weekday_based_rules": self.weekday_based_rules,
             # Month based rules
-            self.is_month_based = ret["is_month_based"]
-            self.month_based_rules = ret["month_based_rules"]
+            "is_month_based": self.is_month_based,
+            "month_based_rules": self.month_based_rules,
             # Season based rules
-            self.is_season_based = ret["is_season_based"]
-            self.season_based_rules = ret["season_based_rules"]
+            "is_season_based": self.is_season_based,
+            "season_based_rules": self.season_based_rules,
+            "season_based_table": self.season_based_table,
             # Availability based trigger rules
-            self.is_occupancy_based = ret["is_occupancy_based"]
-            self.occupancy_based_trigger_rules = ret["occupancy_based_trigger_rules"]
+            "is_occupancy_based": self.is_occupancy_based,
+            "occupancy_based_trigger_rules": self.occupancy_based_trigger_rules,
+            "occupancy_based_trigger_index": self.occupancy_based_trigger_index,
             # Time based trigger rules
-            self.is_time_based = ret["is_time_based"]
-            self.time_based_trigger_rules = ret["time_based_trigger_rules"]
+            "is_time_based": self.is_time_based,
+            "time_based_trigger_rules": self.time_based_trigger_rules,
+            "time_based_trigger_table": self.time_based_trigger_table,
+        }
+
+    def set_cache_payload(self, ret: dict):
+        """
+        Restore the state of the dynamic pricing adapter from a cache payload.
+
+        Args:
+            ret (dict): The cache payload, see get_cache_payload.
+        """
+        self.timezone = ret["timezone"]
+        self.inventory_days = ret["inventory_days"]
+        self.is_enabled = ret["is_enabled"]
+        # Base rate
+        self.default_base_rate = ret["default_base_rate"]
+        self.interval_base_rate_index = ret["interval_base_rate_index"]
+        # Rate plan percentage factors
+        self.rate_plan_percentage_factors = ret["rate_plan_percentage_factors"]
+        # Lead days based rules
+        self.is_lead_days_based = ret["is_lead_days_based"]
+        self.lead_days_based_rules = ret["lead_days_based_rules"]
+        # Weekday based rules
+        self.is_weekday_based = ret["is_weekday_based"]
+        self.weekday_based_rules = ret["weekday_based_rules"]
+        # Month based rules
+        self.is_month_based = ret["is_month_based"]
+        self.month_based_rules = ret["month_based_rules"]
+        # Season based rules
+        self.is_season_based = ret["is_season_based"]
+        self.season_based_rules = ret["season_based_rules"]
+        self.season_based_table = ret["season_based_table"]
+        # Availability based trigger rules
+        self.is_occupancy_based = ret["is_occupancy_based"]
+        self.occupancy_based_trigger_rules = ret["occupancy_based_trigger_rules"]
+        self.occupancy_based_trigger_index = ret["occupancy_based_trigger_index"]
+        # Time based trigger rules
+        self.is_time_based = ret["is_time_based"]
+        self.time_based_trigger_rules = ret["time_based_trigger_rules"]
+        self.time_based_trigger_table = ret["time_based_trigger_table"]
+
+    def save_to_cache(self, generation: int = None):
+        """
+        Save the dynamic pricing adapter to the cache.
+
+        Args:
+            generation (int): The generation it was loaded at, defaults to the
+                current one.
+        """
+        cache.set(
+            self.get_cache_key(self.setting.id, generation),
+            encode_adapter_payload(self.get_cache_payload()),
+            timeout=self.CACHE_TIMEOUT,
+        )
+
+    def load_from_cache(self):
+        """
+        Load the dynamic pricing adapter from the local cache, then from the
+        shared cache and finally from the database.
+
+        Returns:
+            DynamicPricingAdapter: The dynamic pricing adapter.
+        """
+        adapter_invalidation_listener.ensure_started()
+        setting_id = self.setting.id
+        if setting_id in get_pending_invalidations():
+            # The current transaction changed the setting, the cache is stale
+            # for it and its changes must not leak to the cache before commit
+            self.generation = None
+            self.load_from_db()
+            return
+
+        entry = local_adapter_cache.get(
+            setting_id, lambda: self.get_generation(setting_id)
+        )
+        if entry is not None:
+            self.generation, ret = entry
+            self.set_cache_payload(ret)
+            return
+
+        # Read the generation first, a payload read after an invalidation is
+        # then never stored under the previous generation
+        self.generation = self.get_generation(setting_id)
+        built = False
+
+        def build():
+            nonlocal built
+            self.load_from_db()
+            built = True
+            return encode_adapter_payload(self.get_cache_payload())
+
+        # Only one process rebuilds a missing payload, the others wait for it
+        data = get_or_set_locked(
+            self.get_cache_key(setting_id, self.generation),
+            build,
+            timeout=self.CACHE_TIMEOUT,
+        )
+        if built:
+            ret = self.get_cache_payload()
+        else:
+            try:
+                ret = decode_adapter_payload(data)
+            except PayloadVersionError:
+                self.load_from_db()
+                self.save_to_cache(self.generation)
+                ret = self.get_cache_payload()
+            self.set_cache_payload(ret)
+        local_adapter_cache.set(setting_id, self.generation, ret)
+
+    @staticmethod
+    def _build_interval_base_rate_index(interval_base_rates) -> dict:
+        """
+        Compile the interval base rates into sorted boundary lists, so a date
+        can be looked up with a binary search.
+
+        Intervals can't overlap (see exclude_overlapping_interval_base_rates),
+        so sorting them by their lower bound is enough.
+
+        Args:
+            interval_base_rates (Iterable[dict]): The "dates" and "base_rate"
+                of each interval.
+
+        Returns:
+            dict: The inclusive lower and exclusive upper date ordinals and the
+                base rate of each interval, sorted by lower bound.
+        """
+        intervals = []
+        for interval_base_rate in interval_base_rates:
+            dates = interval_base_rate["dates"]
+            if dates.isempty:
+                continue
+            # Ranges are canonicalized to [) by Postgres, None means unbounded
+            lower = dates.lower.toordinal() if dates.lower else date_cls.min.toordinal()
+            upper = dates.upper.toordinal() if dates.upper else date_cls.max.toordinal()
+            intervals.append((lower, upper, interval_base_rate["base_rate"]))
+        intervals.sort()
+        return {
+            "lowers": [interval[0] for interval in intervals],
+            "uppers": [interval[1] for interval in intervals],
+            "base_rates": [interval[2] for interval in intervals],
+        }
+
+    @staticmethod
+    def _build_threshold_index(rules: list[dict]) -> dict:
+        """
+        Compile occupancy threshold rules into a step function, so the factor
+        of an occupancy can be looked up with a binary search.
+
+        Args:
+            rules (list[dict]): The rules in the order they are applied, the
+                first rule whose min_occupancy is reached wins.
+
+        Returns:
+            dict: The ascending thresholds and the factor that applies from
+                each threshold up to the next one.
+        """
+        thresholds = []
+        factors = []
+        for threshold in sorted({rule["min_occupancy"] for rule in rules}):
+            # The winner only changes when the occupancy reaches a threshold
+            rule = next(rule for rule in rules if threshold >= rule["min_occupancy"])
+            factor = DynamicPricingAdapter._factor_to_repr(rule)
+            if factors and factors[-1] == factor:
+                continue
+            thresholds.append(threshold)
+            factors.append(factor)
+        return {"thresholds": thresholds, "factors": factors}
+
+    @staticmethod
+    def _build_time_based_trigger_table(rules: list[dict]) -> list[list[dict]]:
+        """
+        Compile the time based trigger rules into one threshold index per
+        day ahead and hour of the trigger day.
+
+        The index at [day_ahead][hour] holds the rules of day_ahead that have
+        been triggered once the local time reaches the end of that hour.
+
+        Args:
+            rules (list[dict]): The rules ordered by day_ahead, -hour and
+                -min_occupancy.
+
+        Returns:
+            list[list[dict]]: The threshold indexes, see _build_threshold_index.
+        """
+        return [
+            [
+                DynamicPricingAdapter._build_threshold_index(
+                    [
+                        rule
+                        for rule in rules
+                        if rule["day_ahead"] == day_ahead and rule["hour"] <= hour
+                    ]
+                )
+                for hour in range(24)
+            ]
+            for day_ahead in range(TimeBasedTriggerRule.MAX_DAY_AHEAD + 1)
+        ]
+
+    @staticmethod
+    def _lookup_threshold_index(index: dict, occupancy: int) -> tuple[int, int]:
+        i = bisect_right(index["thresholds"], occupancy) - 1
+        if i < 0:
+            return (0, FactorChoices.PERCENTAGE)
+        return index["factors"][i]
 
     def get_base_rate(self, date: date_cls) -> int:
-        # Get the base rate for the given date and rate plan id.
-        base_rate = self.default_base_rate
-        for interval_base_rate in self.interval_base_rates:
-            if (
-                interval_base_rate["dates"].lower
-                <= date
-                < interval_base_rate["dates"].upper
-            ):
-                base_rate = interval_base_rate["base_rate"]
-                break
-        return base_rate
+        """
+        Get the base rate for the given date.
+
+        Args:
+            date (date): The date to get the base rate for.
+
+        Returns:
+            int: The interval base rate covering the date, or the default one.
+        """
+        index = self.interval_base_rate_index
+        ordinal = date.toordinal()
+        i = bisect_right(index["lowers"], ordinal) - 1
+        if i >= 0 and ordinal < index["uppers"][i]:
+            return index["base_rates"][i]
+        return self.default_base_rate
+
+    def get_base_rate_array(self, dates: list[date_cls]) -> np.ndarray:
+        """
+        Get the base rates for the given dates as an array.
+
+        Args:
+            dates (list[date]): The dates to get the base rates for.
+
+        Returns:
+            np.ndarray: The base rate of each date.
+        """
+        index = self.interval_base_rate_index
+        ordinals = np.array([date.toordinal() for date in dates], dtype=np.int64)
+        base_rates = np.full(len(dates), self.default_base_rate, dtype=np.int64)
+        if not index["lowers"]:
+            return base_rates
+        i = np.searchsorted(index["lowers"], ordinals, side="right") - 1
+        matched = (i >= 0) & (ordinals < np.array(index["uppers"])[i])
+        base_rates[matched] = np.array(index["base_rates"])[i[matched]]
+        return base_rates
 
     @staticmethod
     def _factor_to_repr(factor: dict()) -> tuple[float | int, int]:
@@ -360,10 +715,10 @@ class DynamicPricingAdapter:
         """
         if not self.is_season_based:
             return (0, FactorChoices.PERCENTAGE)
-        for rule in self.season_based_rules:
-            if is_within_period(rule["start_date"], rule["end_date"], date):
-                return self._factor_to_repr(rule)
-        return (0, FactorChoices.PERCENTAGE)
+        rule_index = self.season_based_table[get_day_of_year_index(date)]
+        if rule_index < 0:
+            return (0, FactorChoices.PERCENTAGE)
+        return self._factor_to_repr(self.season_based_rules[rule_index])
 
     def get_occupancy_based_factor(self, occupancy: int) -> tuple[int | float, int]:
         """
@@ -379,24 +734,32 @@ class DynamicPricingAdapter:
         """
         if not self.is_occupancy_based:
             return (0, FactorChoices.PERCENTAGE)
-        for i in range(len(self.occupancy_based_trigger_rules)):
-            if occupancy >= self.occupancy_based_trigger_rules[i]["min_occupancy"]:
-                return self._factor_to_repr(self.occupancy_based_trigger_rules[i])
-        return (0, FactorChoices.PERCENTAGE)
-
-    @staticmethod
-    def _get_trigger_datetime(
-        date: date_cls,
-        day_ahead: int,
-        hour: int,
-        tzinfo: ZoneInfo,
-    ) -> datetime:
-        return datetime.combine(
-            date - timedelta(days=day_ahead),
-            time(hour),
-            tzinfo=tzinfo,
+        return self._lookup_threshold_index(
+            self.occupancy_based_trigger_index, occupancy
         )
 
+    def _get_time_based_trigger_indexes(
+        self, date: date_cls, current_datetime: datetime
+    ) -> list[dict]:
+        """
+        Get the threshold indexes of the time based rules that have been
+        triggered for the given date, in the order they are applied.
+
+        A rule triggers at its hour on the trigger day (date - day_ahead), in
+        the hotel timezone. Comparing the local date and hour of the current
+        datetime is the same as comparing it to each trigger datetime.
+        """
+        local_datetime = current_datetime.astimezone(self.timezone)
+        local_date = local_datetime.date()
+        indexes = []
+        for day_ahead, hours in enumerate(self.time_based_trigger_table):
+            trigger_date = date - timedelta(days=day_ahead)
+            if local_date < trigger_date:
+                continue
+            hour = 23 if local_date > trigger_date else local_datetime.hour
+            indexes.append(hours[hour])
+        return indexes
+
     def get_time_based_factor(
         self,
         date: date_cls,
@@ -421,33 +784,18 @@ class DynamicPricingAdapter:
         # Early return if not time based or lead days is invalid
         if not self.is_time_based or lead_days > TimeBasedTriggerRule.MAX_DAY_AHEAD:
             return (0, FactorChoices.PERCENTAGE)
-        for rule in self.time_based_trigger_rules:
-            trigger_datetime = self._get_trigger_datetime(
-                date,
-                rule["day_ahead"],
-                rule["hour"],
-                self.timezone,
-            )
-            if (
-                current_datetime >= trigger_datetime
-                and occupancy >= rule["min_occupancy"]
-            ):
-                return self._factor_to_repr(rule)
+        for index in self._get_time_based_trigger_indexes(date, current_datetime):
+            i = bisect_right(index["thresholds"], occupancy) - 1
+            if i >= 0:
+                return index["factors"][i]
         return (0, FactorChoices.PERCENTAGE)
 
     @staticmethod
     def _calculate_rate_by_factors(
         base_rate: int, factors: list[tuple[int | float, int]]
     ):
-        percentage_sum = 0
-        increment_sum = 0
-
         # Calculate the sum of percentage and increment factors
-        for factor in factors:
-            if factor[1] == FactorChoices.PERCENTAGE:
-                percentage_sum += factor[0]
-            else:
-                increment_sum += factor[0]
+        percentage_sum, increment_sum = DynamicPricingAdapter._sum_factors(factors)
 
         # Calculate the final rate, percentage is applied first then increment is applied
         # round() is used to avoid floating point precision issues
@@ -476,14 +824,29 @@ class DynamicPricingAdapter:
             raise ValidationError("Dynamic pricing is not enabled.")
 
         base_rate = self.get_base_rate(date)
-        factors = []
-        factors.append(self.get_rate_plan_factor(rate_plan_id))
-        factors.append(self.get_lead_days_based_factor(date, current_datetime))
-        factors.append(self.get_weekday_based_factor(date))
-        factors.append(self.get_month_based_factor(date))
-        factors.append(self.get_season_based_factor(date))
+        factors = self.get_restriction_base_rate_factors(
+            rate_plan_id, date, current_datetime
+        )
         return self._calculate_rate_by_factors(base_rate, factors)
 
+    def get_restriction_base_rate_factors(
+        self,
+        rate_plan_id: int,
+        date: date_cls,
+        current_datetime: datetime,
+    ) -> list[tuple[int | float, int]]:
+        """
+        Get the factors the base rate of a restriction is calculated from, in
+        the order of RateTrace.FACTORS.
+        """
+        return [
+            self.get_rate_plan_factor(rate_plan_id),
+            self.get_lead_days_based_factor(date, current_datetime),
+            self.get_weekday_based_factor(date),
+            self.get_month_based_factor(date),
+            self.get_season_based_factor(date),
+        ]
+
     def calculate_restriction_rate(
         self,
         base_rate: int,
@@ -509,20 +872,389 @@ class DynamicPricingAdapter:
         if base_rate <= 0:
             raise ValidationError("Base rate must be positive.")
 
-        factors = []
-        factors.append(self.get_occupancy_based_factor(occupancy))
-        factors.append(self.get_time_based_factor(date, current_datetime, occupancy))
+        factors = self.get_restriction_rate_factors(date, current_datetime, occupancy)
         return self._calculate_rate_by_factors(base_rate, factors)
 
+    def get_restriction_rate_factors(
+        self,
+        date: date_cls,
+        current_datetime: datetime,
+        occupancy: int,
+    ) -> list[tuple[int | float, int]]:
+        """
+        Get the factors the rate of a restriction is calculated from, applied
+        on its base rate, in the order of RateTrace.FACTORS.
+        """
+        return [
+            self.get_occupancy_based_factor(occupancy),
+            self.get_time_based_factor(date, current_datetime, occupancy),
+        ]
+
+    def get_rate_plan_factor_arrays(
+        self, rate_plan_ids: list[int]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the rate plan factors for the given rate plan ids as arrays.
+
+        Args:
+            rate_plan_ids (list[int]): The rate plan ids.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The percentage and increment factors,
+                one entry per rate plan.
+        """
+        return self._factors_to_arrays(
+            [self.get_rate_plan_factor(rate_plan_id) for rate_plan_id in rate_plan_ids]
+        )
+
+    def build_factor_calendar(self, start_date: date_cls, days: int) -> dict:
+        """
+        Compile the date based factors (lead days, weekday, month and season)
+        of the given number of days starting at start_date.
+
+        The lead days of a date are its offset from start_date, so the calendar
+        is only valid while start_date is the current date.
+
+        Args:
+            start_date (date): The first date of the calendar, i.e. today.
+            days (int): The number of days to compile.
+
+        Returns:
+            dict: The start date and a (2, days) array holding the summed
+                percentage and increment factors keyed by day offset.
+        """
+        current_datetime = datetime.combine(start_date, time(), tzinfo=self.timezone)
+        factors = np.zeros((2, days), dtype=np.int32)
+        for offset in range(days):
+            date = start_date + timedelta(days=offset)
+            factors[:, offset] = self._sum_factors(
+                (
+                    self.get_lead_days_based_factor(date, current_datetime),
+                    self.get_weekday_based_factor(date),
+                    self.get_month_based_factor(date),
+                    self.get_season_based_factor(date),
+                )
+            )
+        return {"start_date": start_date, "factors": factors}
+
+    def get_factor_calendar(self, start_date: date_cls, days: int) -> dict:
+        """
+        Get the factor calendar starting at start_date and covering at least
+        the given number of days, from the cache if possible.
+
+        Args:
+            start_date (date): The first date of the calendar, i.e. today.
+            days (int): The number of days the calendar must cover.
+
+        Returns:
+            dict: The factor calendar, see build_factor_calendar.
+        """
+        # Not shared when the adapter was loaded with uncommitted changes
+        is_shared = self.generation is not None
+        calendar = self.factor_calendar
+        if calendar is None and is_shared:
+            calendar = cache.get(
+                self.get_factor_calendar_cache_key(self.setting.id, self.generation)
+            )
+        if (
+            calendar is None
+            or calendar["start_date"] != start_date
+            or calendar["factors"].shape[1] < days
+        ):
+            calendar = self.build_factor_calendar(
+                start_date,
+                max(days, self.inventory_days + 1 + self.FACTOR_CALENDAR_MARGIN_DAYS),
+            )
+            if is_shared:
+                cache.set(
+                    self.get_factor_calendar_cache_key(
+                        self.setting.id, self.generation
+                    ),
+                    calendar,
+                    timeout=self.CACHE_TIMEOUT,
+                )
+        self.factor_calendar = calendar
+        return calendar
+
+    def get_date_factor_arrays(
+        self, dates: list[date_cls], current_datetime: datetime
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the base rates and the summed date based factors (lead days, weekday,
+        month and season) for the given dates as arrays.
+
+        Args:
+            dates (list[date]): The dates to get the factors for.
+            current_datetime (datetime): The current datetime.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: The base rates, the
+                percentage sums and the increment sums, one entry per date.
+        """
+        current_date = current_datetime.date()
+        offsets = np.array([(date - current_date).days for date in dates], dtype=int)
+        if offsets.size == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        if offsets.min() < 0:
+            raise ValidationError("Lead time must be positive.")
+
+        calendar = self.get_factor_calendar(current_date, int(offsets.max()) + 1)
+        factors = calendar["factors"][:, offsets].astype(np.int64)
+        return self.get_base_rate_array(dates), factors[0], factors[1]
+
+    def get_occupancy_based_factor_arrays(
+        self, occupancies: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the occupancy based factors for an array of occupancies.
+
+        Args:
+            occupancies (np.ndarray): The occupancies to get the factors for.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The percentage and increment factors,
+                with the same shape as occupancies.
+        """
+        percentages = np.zeros(occupancies.shape, dtype=np.int64)
+        increments = np.zeros(occupancies.shape, dtype=np.int64)
+        if not self.is_occupancy_based:
+            return percentages, increments
+
+        index = self.occupancy_based_trigger_index
+        matched = np.zeros(occupancies.shape, dtype=bool)
+        self._apply_threshold_index(
+            index, occupancies, matched, percentages, increments
+        )
+        return percentages, increments
+
+    def get_time_based_factor_arrays(
+        self,
+        dates: list[date_cls],
+        current_datetime: datetime,
+        occupancies: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the time based factors for a rate plan x date matrix of occupancies.
+
+        Args:
+            dates (list[date]): The dates, one per column of occupancies.
+            current_datetime (datetime): The current datetime.
+            occupancies (np.ndarray): The occupancies, one row per rate plan.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The percentage and increment factors,
+                with the same shape as occupancies.
+        """
+        percentages = np.zeros(occupancies.shape, dtype=np.int64)
+        increments = np.zeros(occupancies.shape, dtype=np.int64)
+        if not self.is_time_based:
+            return percentages, increments
+
+        current_date = current_datetime.date()
+        for column, date in enumerate(dates):
+            # Only the first few days can be affected by time based rules
+            if (date - current_date).days > TimeBasedTriggerRule.MAX_DAY_AHEAD:
+                continue
+            # Earlier indexes take precedence, rows matched once are done
+            matched = np.zeros(occupancies.shape[0], dtype=bool)
+            for index in self._get_time_based_trigger_indexes(date, current_datetime):
+                self._apply_threshold_index(
+                    index,
+                    occupancies[:, column],
+                    matched,
+                    percentages[:, column],
+                    increments[:, column],
+                )
+        return percentages, increments
+
+    @staticmethod
+    def _apply_threshold_index(
+        index: dict,
+        occupancies: np.ndarray,
+        matched: np.ndarray,
+        percentages: np.ndarray,
+        increments: np.ndarray,
+    ):
+        """
+        Vectorized version of _lookup_threshold_index, writes the factors of
+        the occupancies that are not matched yet in place and marks them.
+        """
+        if not index["thresholds"]:
+            return
+        (
+            factor_percentages,
+            factor_increments,
+        ) = DynamicPricingAdapter._factors_to_arrays(index["factors"])
+        # Index of the highest threshold that is lower or equal to the occupancy
+        i = np.searchsorted(index["thresholds"], occupancies, side="right") - 1
+        rows = (i >= 0) & ~matched
+        percentages[rows] = factor_percentages[i[rows]]
+        increments[rows] = factor_increments[i[rows]]
+        matched |= rows
+
+    @staticmethod
+    def _sum_factors(factors) -> tuple[int | float, int]:
+        percentage_sum = 0
+        increment_sum = 0
+        for factor in factors:
+            if factor[1] == FactorChoices.PERCENTAGE:
+                percentage_sum += factor[0]
+            else:
+                increment_sum += factor[0]
+        return percentage_sum, increment_sum
+
+    @staticmethod
+    def _factors_to_arrays(factors) -> tuple[np.ndarray, np.ndarray]:
+        percentages = np.zeros(len(factors), dtype=np.int64)
+        increments = np.zeros(len(factors), dtype=np.int64)
+        for i, (value, choice) in enumerate(factors):
+            if choice == FactorChoices.PERCENTAGE:
+                percentages[i] = value
+            else:
+                increments[i] = value
+        return percentages, increments
+
+    @staticmethod
+    def _calculate_rates_by_factor_arrays(
+        base_rates: np.ndarray,
+        percentage_sums: np.ndarray,
+        increment_sums: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Vectorized version of _calculate_rate_by_factors, the arrays are
+        broadcast against each other.
+        """
+        # Same operations in the same order as _calculate_rate_by_factors, so
+        # that the float intermediate values are exactly the same
+        rates = np.round(base_rates * (1 + percentage_sums / 100), 2)
+        return np.ceil(rates).astype(np.int64) + increment_sums
+
+    def calculate_rates(
+        self,
+        rate_plan_ids: list[int],
+        dates: list[date_cls],
+        occupancies: np.ndarray,
+        current_datetime: datetime,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the base rates and rates for a rate plan x date matrix.
+
+        This is the batch equivalent of calling calculate_restriction_base_rate
+        and calculate_restriction_rate for each (rate plan, date) pair, the
+        date based factors are only computed once per date.
+
+        Args:
+            rate_plan_ids (list[int]): The rate plan ids, one per row.
+            dates (list[date]): The dates, one per column. Must not be in the past.
+            occupancies (np.ndarray): The occupancy of each (rate plan, date) pair.
+            current_datetime (datetime): The current datetime.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The base rates and rates matrices.
+        """
+        if not self.is_enabled:
+            raise ValidationError("Dynamic pricing is not enabled.")
+
+        base_rates, date_percentages, date_increments = self.get_date_factor_arrays(
+            dates, current_datetime
+        )
+        rate_plan_percentages, rate_plan_increments = self.get_rate_plan_factor_arrays(
+            rate_plan_ids
+        )
+        restriction_base_rates = self._calculate_rates_by_factor_arrays(
+            base_rates[np.newaxis, :],
+            rate_plan_percentages[:, np.newaxis] + date_percentages[np.newaxis, :],
+            rate_plan_increments[:, np.newaxis] + date_increments[np.newaxis, :],
+        )
+
+        (
+            occupancy_percentages,
+            occupancy_increments,
+        ) = self.get_occupancy_based_factor_arrays(occupancies)
+        time_percentages, time_increments = self.get_time_based_factor_arrays(
+            dates, current_datetime, occupancies
+        )
+        rates = self._calculate_rates_by_factor_arrays(
+            restriction_base_rates,
+            occupancy_percentages + time_percentages,
+            occupancy_increments + time_increments,
+        )
+        return restriction_base_rates, rates
+
+    def trace_rates(
+        self,
+        rate_plan_ids: list[int],
+        dates: list[date_cls],
+        occupancies: np.ndarray,
+        current_datetime: datetime,
+        base_rates: np.ndarray,
+        rates: np.ndarray,
+        sample_rate: float,
+    ) -> list[RateTrace]:
+        """
+        Record the factors of a random sample of the rates calculated by
+        calculate_rates. The factors are looked up again one by one, which is
+        only affordable for a small sample.
+
+        Args:
+            rate_plan_ids (list[int]): The rate plan ids, one per row.
+            dates (list[date]): The dates, one per column.
+            occupancies (np.ndarray): The occupancy of each (rate plan, date) pair.
+            current_datetime (datetime): The current datetime.
+            base_rates (np.ndarray): The calculated base rates.
+            rates (np.ndarray): The calculated rates.
+            sample_rate (float): The probability of each pair to be traced.
+
+        Returns:
+            list[RateTrace]: The created rate traces.
+        """
+        rows, columns = np.nonzero(np.random.random(rates.shape) < sample_rate)
+        traces = []
+        for row, column in zip(rows.tolist(), columns.tolist()):
+            rate_plan_id = rate_plan_ids[row]
+            date = dates[column]
+            occupancy = int(occupancies[row, column])
+            percentages, increments = self._factors_to_arrays(
+                self.get_restriction_base_rate_factors(
+                    rate_plan_id, date, current_datetime
+                )
+                + self.get_restriction_rate_factors(date, current_datetime, occupancy)
+            )
+            traces.append(
+                RateTrace(
+                    rate_plan_id=rate_plan_id,
+                    date=date,
+                    calculated_at=current_datetime,
+                    occupancy=occupancy,
+                    base_rate=self.get_base_rate(date),
+                    restriction_base_rate=int(base_rates[row, column]),
+                    rate=int(rates[row, column]),
+                    percentage_factors=percentages.tolist(),
+                    increment_factors=increments.tolist(),
+                )
+            )
+        return RateTrace.objects.bulk_create(traces)
+
     def calculate_and_update_rates(
-        self, room_types: list[int], dates: tuple[date_cls, date_cls]
+        self,
+        room_types: list[int],
+        dates: tuple[date_cls, date_cls],
+        rate_plans: list[int] = None,
+        only_dates: list[date_cls] = None,
+        cause: int = RateHistory.CauseChoices.UNKNOWN,
     ) -> list[RatePlanRestrictions]:
         """
         Calculate and update rates for a given list of room types and dates.
+        The changed rates are recorded in the rate history.
 
         Args:
             room_types (list[int]): The internal room type IDs to calculate and update rates for.
             dates (tuple[date_cls, date_cls]): The range of dates to calculate and update rates for.
+            rate_plans (list[int]): Only update the rates of these rate plans.
+            only_dates (list[date_cls]): Only update the rates of these dates
+                within the range.
+            cause (int): Why the rates are updated, see RateHistory.CauseChoices.
 
         Returns:
             list[RatePlanRestrictions]: The updated rate plan restrictions.
@@ -530,59 +1262,122 @@ class DynamicPricingAdapter:
         if not self.is_enabled:
             return []
 
-        room_type_inventory_map = (
-            self.setting.hotel.adapter.get_room_type_inventory_map(room_types, dates)
+        # Lead days are counted from the local date of the hotel, the same
+        # date its inventory and time based rules are relative to
+        current_datetime = timezone.now().astimezone(self.timezone)
+        # Dates in the past are never recalculated
+        start_date = max(dates[0], current_datetime.date())
+        if start_date > dates[1]:
+            return []
+
+        room_type_occupancies = self.setting.hotel.adapter.get_room_type_occupancies(
+            room_types, (start_date, dates[1])
         )
 
         # Get rate plan restrictions, also restriction rms to update the base rate
-        rate_plans = RatePlan.objects.filter(
+        rate_plan_queryset = RatePlan.objects.filter(
             room_type__hotel=self.setting.hotel,
             room_type__id__in=room_types,
-        ).prefetch_related(
-            Prefetch(
-                "restrictions",
-                queryset=RatePlanRestrictions.objects.filter(
-                    date__range=dates
-                ).select_related("rms"),
-                to_attr="filtered_restrictions",
+        )
+        if rate_plans is not None:
+            rate_plan_queryset = rate_plan_queryset.filter(id__in=rate_plans)
+        # Also filtered by the date of the RMS restrictions, both tables are
+        # partitioned by date
+        restriction_queryset = RatePlanRestrictions.objects.filter(
+            date__range=dates, rms__date__range=dates
+        )
+        if only_dates is not None:
+            restriction_queryset = restriction_queryset.filter(date__in=only_dates)
+        rate_plans = list(
+            rate_plan_queryset.prefetch_related(
+                Prefetch(
+                    "restrictions",
+                    queryset=restriction_queryset.select_related("rms"),
+                    to_attr="filtered_restrictions",
+                )
             )
         )
-        current_datetime = timezone.now()
+
+        # Build the rate plan x date occupancy matrix
+        calendar = [
+            start_date + timedelta(days=i)
+            for i in range((dates[1] - start_date).days + 1)
+        ]
+        occupancies = np.array(
+            [room_type_occupancies[rate_plan.room_type_id] for rate_plan in rate_plans],
+            dtype=np.int64,
+        ).reshape(len(rate_plans), len(calendar))
+
+        rate_plan_ids = [rate_plan.id for rate_plan in rate_plans]
+        base_rates, rates = self.calculate_rates(
+            rate_plan_ids=rate_plan_ids,
+            dates=calendar,
+            occupancies=occupancies,
+            current_datetime=current_datetime,
+        )
+        if settings.RMS_RATE_TRACE_SAMPLE_RATE > 0:
+            self.trace_rates(
+                rate_plan_ids=rate_plan_ids,
+                dates=calendar,
+                occupancies=occupancies,
+                current_datetime=current_datetime,
+                base_rates=base_rates,
+                rates=rates,
+                sample_rate=settings.RMS_RATE_TRACE_SAMPLE_RATE,
+            )
+
         new_restrictions = []
         new_restriction_rms = []
-
-        # Loop through mapped rate plans
-        for rate_plan in rate_plans:
-            room_type_id = rate_plan.room_type.id
+        history = []
+        for row, rate_plan in enumerate(rate_plans):
             for restriction in rate_plan.filtered_restrictions:
-                if restriction.date < current_datetime.date():
+                column = (restriction.date - start_date).days
+                if column < 0:
                     # Not gonna happend, but just in case
                     # and worth to send notification
                     continue
 
-                new_base_rate = self.calculate_restriction_base_rate(
-                    rate_plan_id=rate_plan.id,
-                    date=restriction.date,
-                    current_datetime=current_datetime,
-                )
-
-                new_rate = self.calculate_restriction_rate(
-                    base_rate=new_base_rate,
-                    date=restriction.date,
-                    current_datetime=current_datetime,
-                    occupancy=room_type_inventory_map[room_type_id][restriction.date],
-                )
+                new_base_rate = int(base_rates[row, column])
+                if new_base_rate <= 0:
+                    raise ValidationError("Base rate must be positive.")
+                new_rate = int(rates[row, column])
 
                 if (
                     new_rate != restriction.rate
                     or new_base_rate != restriction.rms.base_rate
                 ):
+                    history.append(
+                        (
+                            restriction.id,
+                            restriction.rate,
+                            new_rate,
+                            new_base_rate,
+                            cause,
+                            current_datetime,
+                        )
+                    )
                     restriction.rms.base_rate = new_base_rate
                     restriction.rate = new_rate
                     new_restrictions.append(restriction)
                     new_restriction_rms.append(restriction.rms)
 
-        RatePlanRestrictions.objects.bulk_update(new_restrictions, ["rate"])
-        RMSRatePlanRestrictions.objects.bulk_update(new_restriction_rms, ["base_rate"])
+        bulk_update_from_values(new_restrictions, ["rate"], match_fields=["date"])
+        bulk_update_from_values(
+            new_restriction_rms, ["base_rate"], match_fields=["date"]
+        )
+        copy_from_values(
+            RateHistory,
+            [
+                "restriction_id",
+                "old_rate",
+                "new_rate",
+                "base_rate",
+                "cause",
+                "created_at",
+            ],
+            history,
+        )
+        if new_restrictions:
+            invalidate_rate_calendar(self.setting.hotel_id)
 
         return new_restrictions
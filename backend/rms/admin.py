@@ -48,7 +48,6 @@ class TimeBasedTriggerRuleAdmin(admin.ModelAdmin):
         "min_occupancy",
         "increment_factor",
         "percentage_factor",
-        "periodic_task_id",
     ]
 
     def get_ordering(self, request: HttpRequest) -> list[str] | tuple[Any, ...]:
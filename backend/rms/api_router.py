@@ -6,8 +6,11 @@ from .views import (
     DynamicPricingSettingModelViewSet,
     IntervalBaseRateModelViewSet,
     OccupancyBasedTriggerRuleModelViewSet,
+    RateCalendarAPIView,
     RatePlanPercentageFactorUpdateAPIView,
+    RateTraceListAPIView,
     RecalculateAllRateAPIView,
+    SimulateRatesAPIView,
     TimeBasedTriggerRuleModelViewSet,
 )
 
@@ -47,9 +50,24 @@ urlpatterns += [
         RatePlanPercentageFactorUpdateAPIView.as_view(),
         name="rate-plan-percentage-factor",
     ),
+    path(
+        "rate-traces/<uuid:rate_plan__uuid>/",
+        RateTraceListAPIView.as_view(),
+        name="rate-traces",
+    ),
     path(
         "recalculate-all-rate/<uuid:uuid>/",
         RecalculateAllRateAPIView.as_view(),
         name="recalculate-all-rate",
     ),
+    path(
+        "rate-calendar/<uuid:uuid>/",
+        RateCalendarAPIView.as_view(),
+        name="rate-calendar",
+    ),
+    path(
+        "simulate-rates/<uuid:uuid>/",
+        SimulateRatesAPIView.as_view(),
+        name="simulate-rates",
+    ),
 ]
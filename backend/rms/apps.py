@@ -1,6 +1,9 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 from django.utils.translation import gettext_lazy as _
 
+from backend.utils.partitions import install_triggers
+
 
 class RmsConfig(AppConfig):
     name = "backend.rms"
@@ -9,3 +12,9 @@ class RmsConfig(AppConfig):
     def ready(self):
         import backend.rms.pg_triggers  # noqa F401
         import backend.rms.signals  # noqa F401
+
+        post_migrate.connect(install_migrated_triggers, sender=self)
+
+
+def install_migrated_triggers(using, **kwargs):
+    install_triggers(using=using)
@@ -0,0 +1,222 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class PendingInvalidation:
+    """
+    on_commit callback invalidating the cache of a setting.
+
+    Until the transaction is committed, other transactions don't see its
+    changes and keep using the cache, while the transaction itself loads the
+    adapter from the database, see get_pending_invalidations.
+    """
+
+    def __init__(self, setting_id: int, invalidate: Callable[[int], Any]):
+        self.setting_id = setting_id
+        self.invalidate = invalidate
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.invalidate(self.setting_id)
+
+
+def get_pending_invalidations(using: str = None) -> set[int]:
+    """
+    Get the ids of the settings invalidated by the current transaction.
+
+    Callbacks of rolled back savepoints are discarded by Django, so they are
+    not pending anymore.
+
+    Returns:
+        set[int]: The setting ids.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return set()
+    return {
+        callback[1].setting_id
+        for callback in connection.run_on_commit
+        if isinstance(callback[1], PendingInvalidation) and not callback[1].done
+    }
+
+
+class LocalAdapterCache:
+    """
+    Process local LRU of decoded DynamicPricingAdapter payloads, in front of
+    the shared cache.
+
+    Each entry remembers the generation of the setting it was loaded at. While
+    the invalidation listener is subscribed, entries are trusted for ttl
+    seconds and evicted by the listener. Otherwise, or once the ttl is over,
+    they are checked against the current generation in the shared cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.listener = None
+        self.entries = OrderedDict()
+        # Lowest generation that may still be stored, per setting
+        self.min_generations = {}
+        self.lock = threading.Lock()
+
+    def get(
+        self, setting_id: int, get_generation: Callable[[], int]
+    ) -> tuple[int, dict] | None:
+        """
+        Get the generation and payload of the given setting.
+
+        Args:
+            setting_id (int): The dynamic pricing setting id.
+            get_generation (Callable[[], int]): Returns the current generation
+                of the setting, only called when the entry must be checked.
+
+        Returns:
+            tuple[int, dict] | None: The generation and payload, None if there
+                is no valid entry.
+        """
+        with self.lock:
+            entry = self.entries.get(setting_id)
+        if entry is None:
+            return None
+        generation, payload, checked_at = entry
+        now = time.monotonic()
+        if not (
+            self.listener is not None
+            and self.listener.is_subscribed
+            and now - checked_at < self.ttl
+        ):
+            if get_generation() != generation:
+                with self.lock:
+                    if self.entries.get(setting_id) is entry:
+                        del self.entries[setting_id]
+                return None
+            entry = (generation, payload, now)
+        with self.lock:
+            if setting_id in self.entries:
+                self.entries[setting_id] = entry
+                self.entries.move_to_end(setting_id)
+        return generation, payload
+
+    def set(self, setting_id: int, generation: int, payload: dict):
+        with self.lock:
+            # The payload may have been read before an invalidation we
+            # already received, it is stale then
+            if generation < self.min_generations.get(setting_id, 0):
+                return
+            self.entries[setting_id] = (generation, payload, time.monotonic())
+            self.entries.move_to_end(setting_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def evict(self, setting_id: int, generation: int = 0):
+        with self.lock:
+            self.entries.pop(setting_id, None)
+            if generation > self.min_generations.get(setting_id, 0):
+                self.min_generations[setting_id] = generation
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.min_generations.clear()
+
+
+class AdapterInvalidationListener:
+    """
+    Evict the local adapter cache entries of the settings published on the
+    invalidation channel, so that hot settings don't need to check their
+    generation in the shared cache.
+
+    Only available when the shared cache is django-redis. The listener runs
+    in a daemon thread, started lazily in each (forked) process.
+    """
+
+    CHANNEL = "rms:adapter:invalidate"
+    RECONNECT_DELAY = 1
+
+    def __init__(self, local_cache: LocalAdapterCache):
+        self.local_cache = local_cache
+        local_cache.listener = self
+        self.pid = None
+        self.subscribed = threading.Event()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_available() -> bool:
+        try:
+            from django_redis.cache import RedisCache
+        except ImportError:  # pragma: no cover
+            return False
+        return isinstance(cache, RedisCache)
+
+    @property
+    def is_subscribed(self) -> bool:
+        return self.pid == os.getpid() and self.subscribed.is_set()
+
+    def ensure_started(self):
+        if self.pid == os.getpid() or not self.is_available():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.subscribed.clear()
+            threading.Thread(
+                target=self.run, name="rms-adapter-invalidation", daemon=True
+            ).start()
+
+    def run(self):
+        from django_redis import get_redis_connection
+
+        while True:
+            try:
+                pubsub = get_redis_connection("default").pubsub(
+                    ignore_subscribe_messages=True
+                )
+                pubsub.subscribe(self.CHANNEL)
+                # Invalidations published while not subscribed are lost
+                self.local_cache.clear()
+                self.subscribed.set()
+                for message in pubsub.listen():
+                    self.handle_message(message)
+            except Exception:
+                logger.exception("Adapter invalidation listener disconnected")
+            finally:
+                self.subscribed.clear()
+            time.sleep(self.RECONNECT_DELAY)
+
+    def handle_message(self, message: dict):
+        setting_id, generation = message["data"].split(b":")
+        self.local_cache.evict(int(setting_id), int(generation))
+
+    def publish(self, setting_id: int, generation: int):
+        if not self.is_available():
+            return
+        from django_redis import get_redis_connection
+
+        try:
+            get_redis_connection("default").publish(
+                self.CHANNEL, f"{setting_id}:{generation}"
+            )
+        except Exception:
+            # Listeners still check the generation once their entries expire
+            logger.exception("Failed to publish adapter invalidation")
+
+
+local_adapter_cache = LocalAdapterCache(
+    maxsize=settings.RMS_ADAPTER_LOCAL_CACHE_SIZE,
+    ttl=settings.RMS_ADAPTER_LOCAL_CACHE_TTL,
+)
+adapter_invalidation_listener = AdapterInvalidationListener(local_adapter_cache)
@@ -0,0 +1,281 @@
+import struct
+import sys
+from array import array
+from zoneinfo import ZoneInfo
+
+# Bump whenever the layout below changes, payloads of any other version are
+# rejected and the adapter is rebuilt from the database
+PAYLOAD_VERSION = 2
+
+# Version, length of the timezone name and number of rate plans, followed by
+# the timezone name, the rate plan ids as little endian int64 values (they are
+# big auto fields) and a flat array of little endian int32 values
+HEADER = struct.Struct("<HHI")
+
+FLAG_NAMES = (
+    "is_enabled",
+    "is_lead_days_based",
+    "is_weekday_based",
+    "is_month_based",
+    "is_season_based",
+    "is_occupancy_based",
+    "is_time_based",
+)
+FACTOR_KEYS = ("percentage_factor", "increment_factor")
+SEASON_BASED_RULE_KEYS = (
+    "start_month",
+    "start_day",
+    "end_month",
+    "end_day",
+    "percentage_factor",
+    "increment_factor",
+)
+OCCUPANCY_BASED_RULE_KEYS = ("min_occupancy", "increment_factor", "percentage_factor")
+TIME_BASED_RULE_KEYS = (
+    "hour",
+    "percentage_factor",
+    "increment_factor",
+    "min_occupancy",
+    "day_ahead",
+)
+
+
+class PayloadVersionError(ValueError):
+    pass
+
+
+def _run_lengths(values) -> list[list]:
+    """
+    Run length encode the given values, as [value, length] pairs.
+    """
+    runs = []
+    for value in values:
+        if runs and runs[-1][0] == value:
+            runs[-1][1] += 1
+        else:
+            runs.append([value, 1])
+    return runs
+
+
+class _Writer:
+    def __init__(self):
+        self.values = array("i")
+
+    def int(self, value: int):
+        self.values.append(value)
+
+    def ints(self, values):
+        self.values.append(len(values))
+        self.values.extend(values)
+
+    def rows(self, rows: list[dict], keys: tuple[str]):
+        # Run length encoded, consecutive rules often have the same values
+        runs = _run_lengths(tuple(row[key] for key in keys) for row in rows)
+        self.values.append(len(runs))
+        for i in range(len(keys)):
+            self.values.extend(values[i] for values, _ in runs)
+        self.values.extend(length for _, length in runs)
+
+    def threshold_index(self, index: dict):
+        self.ints(index["thresholds"])
+        self.values.extend(value for value, _ in index["factors"])
+        self.values.extend(choice for _, choice in index["factors"])
+
+    def runs(self, values):
+        runs = _run_lengths(values)
+        self.values.append(len(runs))
+        for value, length in runs:
+            self.values.append(value)
+            self.values.append(length)
+
+
+class _Reader:
+    def __init__(self, values: list[int]):
+        self.values = values
+        self.position = 0
+
+    def take(self, length: int) -> list[int]:
+        start = self.position
+        end = self.position = start + length
+        return self.values[start:end]
+
+    def int(self) -> int:
+        self.position += 1
+        return self.values[self.position - 1]
+
+    def ints(self) -> list[int]:
+        return self.take(self.int())
+
+    def rows(self, keys: tuple[str]) -> list[dict]:
+        length = self.int()
+        columns = [self.take(length) for _ in keys]
+        rows = []
+        # Rows of a run share the same dict, they are never modified
+        for values, run_length in zip(zip(*columns), self.take(length)):
+            rows.extend([dict(zip(keys, values))] * run_length)
+        return rows
+
+    def threshold_index(self) -> dict:
+        thresholds = self.ints()
+        values = self.take(len(thresholds))
+        choices = self.take(len(thresholds))
+        return {"thresholds": thresholds, "factors": list(zip(values, choices))}
+
+    def runs(self, typecode: str) -> array:
+        values = array(typecode)
+        for _ in range(self.int()):
+            value = self.int()
+            values += array(typecode, [value]) * self.int()
+        return values
+
+
+def _to_little_endian(values: array) -> array:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def encode_adapter_payload(payload: dict) -> bytes:
+    """
+    Encode the DynamicPricingAdapter cache payload.
+
+    Args:
+        payload (dict): The payload, see DynamicPricingAdapter.save_to_cache.
+
+    Returns:
+        bytes: The encoded payload.
+    """
+    writer = _Writer()
+    writer.int(
+        sum(1 << i for i, name in enumerate(FLAG_NAMES) if payload[name]),
+    )
+    writer.int(payload["inventory_days"])
+    # Base rate
+    writer.int(payload["default_base_rate"])
+    index = payload["interval_base_rate_index"]
+    writer.ints(index["lowers"])
+    writer.ints(index["uppers"])
+    writer.ints(index["base_rates"])
+    # Rate plan percentage factors
+    rate_plan_factors = payload["rate_plan_percentage_factors"]
+    rate_plan_ids = array("q", rate_plan_factors)
+    writer.rows(list(rate_plan_factors.values()), FACTOR_KEYS)
+    # Lead days, weekday and month based rules
+    writer.rows(payload["lead_days_based_rules"], FACTOR_KEYS)
+    writer.rows(payload["weekday_based_rules"], FACTOR_KEYS)
+    writer.rows(payload["month_based_rules"], FACTOR_KEYS)
+    # Season based rules, dates are stored as month/day
+    season_based_rules = []
+    for rule in payload["season_based_rules"]:
+        start_month, start_day = rule["start_date"].split("/")
+        end_month, end_day = rule["end_date"].split("/")
+        season_based_rules.append(
+            {
+                "start_month": int(start_month),
+                "start_day": int(start_day),
+                "end_month": int(end_month),
+                "end_day": int(end_day),
+                "percentage_factor": rule["percentage_factor"],
+                "increment_factor": rule["increment_factor"],
+            }
+        )
+    writer.rows(season_based_rules, SEASON_BASED_RULE_KEYS)
+    writer.runs(payload["season_based_table"])
+    # Availability based trigger rules
+    writer.rows(payload["occupancy_based_trigger_rules"], OCCUPANCY_BASED_RULE_KEYS)
+    writer.threshold_index(payload["occupancy_based_trigger_index"])
+    # Time based trigger rules, consecutive hours mostly share the same index
+    writer.rows(payload["time_based_trigger_rules"], TIME_BASED_RULE_KEYS)
+    writer.int(len(payload["time_based_trigger_table"]))
+    for hours in payload["time_based_trigger_table"]:
+        runs = _run_lengths(hours)
+        writer.int(len(runs))
+        for index, length in runs:
+            writer.int(length)
+            writer.threshold_index(index)
+
+    timezone = str(payload["timezone"]).encode()
+    return (
+        HEADER.pack(PAYLOAD_VERSION, len(timezone), len(rate_plan_ids))
+        + timezone
+        + _to_little_endian(rate_plan_ids).tobytes()
+        + _to_little_endian(writer.values).tobytes()
+    )
+
+
+def decode_adapter_payload(data: bytes) -> dict:
+    """
+    Decode a DynamicPricingAdapter cache payload.
+
+    Args:
+        data (bytes): The payload, see encode_adapter_payload.
+
+    Raises:
+        PayloadVersionError: If the payload was encoded with another version.
+
+    Returns:
+        dict: The decoded payload.
+    """
+    if not isinstance(data, bytes) or len(data) < HEADER.size:
+        raise PayloadVersionError("Unknown payload format.")
+    version, timezone_length, rate_plan_count = HEADER.unpack_from(data)
+    if version != PAYLOAD_VERSION:
+        raise PayloadVersionError(f"Unsupported payload version: {version}.")
+    start = HEADER.size
+    end = start + timezone_length
+    timezone = data[start:end].decode()
+    rate_plan_ids = array("q")
+    start = end
+    end = start + rate_plan_count * rate_plan_ids.itemsize
+    rate_plan_ids.frombytes(data[start:end])
+    values = array("i")
+    values.frombytes(data[end:])
+    reader = _Reader(_to_little_endian(values).tolist())
+
+    payload = {"timezone": ZoneInfo(timezone)}
+    flags = reader.int()
+    for i, name in enumerate(FLAG_NAMES):
+        payload[name] = bool(flags & (1 << i))
+    payload["inventory_days"] = reader.int()
+    # Base rate
+    payload["default_base_rate"] = reader.int()
+    payload["interval_base_rate_index"] = {
+        "lowers": reader.ints(),
+        "uppers": reader.ints(),
+        "base_rates": reader.ints(),
+    }
+    # Rate plan percentage factors
+    payload["rate_plan_percentage_factors"] = dict(
+        zip(_to_little_endian(rate_plan_ids).tolist(), reader.rows(FACTOR_KEYS))
+    )
+    # Lead days, weekday and month based rules
+    payload["lead_days_based_rules"] = reader.rows(FACTOR_KEYS)
+    payload["weekday_based_rules"] = reader.rows(FACTOR_KEYS)
+    payload["month_based_rules"] = reader.rows(FACTOR_KEYS)
+    # Season based rules
+    payload["season_based_rules"] = [
+        {
+            "start_date": f"{rule['start_month']}/{rule['start_day']}",
+            "end_date": f"{rule['end_month']}/{rule['end_day']}",
+            "percentage_factor": rule["percentage_factor"],
+            "increment_factor": rule["increment_factor"],
+        }
+        for rule in reader.rows(SEASON_BASED_RULE_KEYS)
+    ]
+    payload["season_based_table"] = reader.runs("h")
+    # Availability based trigger rules
+    payload["occupancy_based_trigger_rules"] = reader.rows(OCCUPANCY_BASED_RULE_KEYS)
+    payload["occupancy_based_trigger_index"] = reader.threshold_index()
+    # Time based trigger rules, indexes within a run are shared, they are
+    # never modified after being built
+    payload["time_based_trigger_rules"] = reader.rows(TIME_BASED_RULE_KEYS)
+    time_based_trigger_table = []
+    for _ in range(reader.int()):
+        hours = []
+        for _ in range(reader.int()):
+            length = reader.int()
+            hours.extend([reader.threshold_index()] * length)
+        time_based_trigger_table.append(hours)
+    payload["time_based_trigger_table"] = time_based_trigger_table
+    return payload
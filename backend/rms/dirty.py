@@ -0,0 +1,268 @@
+from bisect import bisect_left
+from collections.abc import Callable
+from datetime import date as date_cls
+from datetime import timedelta
+from typing import Any
+
+from django.db import transaction
+
+from backend.utils.cache import pop_pending, push_pending
+
+from .models import (
+    IntervalBaseRate,
+    LeadDaysBasedRule,
+    MonthBasedRule,
+    OccupancyBasedTriggerRule,
+    SeasonBasedRule,
+    TimeBasedTriggerRule,
+    WeekdayBasedRule,
+)
+from .utils import build_day_of_year_table, get_day_of_year_index
+
+
+class DirtyScope:
+    """
+    Kinds of dirty scopes. A scope is a tuple holding its kind followed by its
+    arguments, it is resolved against the current calendar when drained, see
+    resolve_dirty_scopes.
+    """
+
+    # Every date of every rate plan
+    ALL = "all"
+    # The dates between start and end (both inclusive, None if unbounded)
+    DATES = "dates"
+    # The dates between the start and end offsets from the current date
+    # (both inclusive, None if unbounded)
+    OFFSETS = "offsets"
+    # The dates priced by the lead days based rule with the given lead days
+    LEAD_DAYS = "lead_days"
+    # The dates from the position of the given lead days on, the positions of
+    # the rules after it shifted
+    LEAD_DAYS_SHIFT = "lead_days_shift"
+    # The dates of the given weekday, from 1 (Monday) to 7 (Sunday)
+    WEEKDAY = "weekday"
+    # The dates of the given month
+    MONTH = "month"
+    # The dates within the given start month, start day, end month and end day
+    SEASON = "season"
+    # Every date of the given rate plan
+    RATE_PLAN = "rate_plan"
+
+
+def _get_date_range_bounds(dates) -> tuple[date_cls | None, date_cls | None]:
+    # Unsaved ranges may still be tuples, both bounds are taken as inclusive
+    if isinstance(dates, (list, tuple)):
+        return dates[0], dates[1]
+    return dates.lower, dates.upper
+
+
+def get_rule_dirty_scopes(rule) -> list[tuple]:
+    """
+    Get the scopes whose rates depend on the given rule.
+
+    Lead days based rules are matched by their position among the rules of the
+    setting, creating or deleting one (or changing its lead days) also dirties
+    the dates of the rules after it, see get_lead_days_shift_scope.
+
+    Args:
+        rule: The rule, an instance of one of the dynamic pricing rule models.
+
+    Returns:
+        list[tuple]: The dirty scopes, see DirtyScope.
+    """
+    if isinstance(rule, IntervalBaseRate):
+        return [(DirtyScope.DATES, *_get_date_range_bounds(rule.dates))]
+    if isinstance(rule, LeadDaysBasedRule):
+        return [(DirtyScope.LEAD_DAYS, rule.lead_days)]
+    if isinstance(rule, WeekdayBasedRule):
+        return [(DirtyScope.WEEKDAY, rule.weekday)]
+    if isinstance(rule, MonthBasedRule):
+        return [(DirtyScope.MONTH, rule.month)]
+    if isinstance(rule, SeasonBasedRule):
+        return [
+            (
+                DirtyScope.SEASON,
+                rule.start_month,
+                rule.start_day,
+                rule.end_month,
+                rule.end_day,
+            )
+        ]
+    if isinstance(rule, TimeBasedTriggerRule):
+        # Only dates up to day_ahead days ahead are ever triggered
+        return [(DirtyScope.OFFSETS, 0, rule.day_ahead)]
+    if isinstance(rule, OccupancyBasedTriggerRule):
+        return [(DirtyScope.ALL,)]
+    raise ValueError(f"Unknown rule: {rule!r}.")
+
+
+def get_lead_days_shift_scope(lead_days: int) -> tuple:
+    """
+    Get the scope of every date from the position of the given lead days on.
+    """
+    return (DirtyScope.LEAD_DAYS_SHIFT, lead_days)
+
+
+class PendingDirtyScopes:
+    """
+    on_commit callback recording the dirty scopes of a setting. The scopes
+    marked by a transaction are coalesced into a single callback, see
+    mark_dirty_scopes.
+    """
+
+    def __init__(self, setting_id: int, record: Callable[[int, set], Any]):
+        self.setting_id = setting_id
+        self.record = record
+        self.scopes = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.record(self.setting_id, self.scopes)
+
+
+def mark_dirty_scopes(
+    setting_id: int,
+    scopes: list[tuple],
+    record: Callable[[int, set], Any],
+    using: str = None,
+):
+    """
+    Record the dirty scopes of a setting once the current transaction is
+    committed, nothing is recorded if it is rolled back.
+
+    Args:
+        setting_id (int): The dynamic pricing setting id.
+        scopes (list[tuple]): The dirty scopes, see DirtyScope.
+        record (Callable[[int, set], Any]): Records the scopes, called with the
+            setting id and the scopes of the whole transaction.
+        using (str): The database alias.
+    """
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block:
+        for callback in connection.run_on_commit:
+            pending = callback[1]
+            if (
+                isinstance(pending, PendingDirtyScopes)
+                and pending.setting_id == setting_id
+                and not pending.done
+            ):
+                pending.scopes.update(scopes)
+                return
+    pending = PendingDirtyScopes(setting_id, record)
+    pending.scopes.update(scopes)
+    transaction.on_commit(pending, using=using)
+
+
+def get_dirty_scopes_key(setting_id: int) -> str:
+    return f"rms:dirty:{setting_id}"
+
+
+def push_dirty_scopes(setting_id: int, scopes: set[tuple], schedule_timeout: int):
+    """
+    Store the dirty scopes of a setting.
+
+    Args:
+        setting_id (int): The dynamic pricing setting id.
+        scopes (set[tuple]): The dirty scopes, see DirtyScope.
+        schedule_timeout (int): How long a scheduled drain is waited for before
+            another one is scheduled.
+
+    Returns:
+        bool: Whether a drain must be scheduled, i.e. none is pending yet.
+    """
+    return push_pending(
+        get_dirty_scopes_key(setting_id), list(scopes), schedule_timeout
+    )
+
+
+def pop_dirty_scopes(setting_id: int) -> set[tuple]:
+    """
+    Remove and return the dirty scopes stored for a setting. Scopes pushed from
+    now on require another drain to be scheduled.
+
+    Args:
+        setting_id (int): The dynamic pricing setting id.
+
+    Returns:
+        set[tuple]: The dirty scopes, see DirtyScope.
+    """
+    scopes = set()
+    for entry in pop_pending(get_dirty_scopes_key(setting_id)):
+        if entry is None:
+            # We can't tell what was dirtied
+            scopes.add((DirtyScope.ALL,))
+        else:
+            scopes.update(tuple(scope) for scope in entry)
+    return scopes
+
+
+def _is_dirty_date(
+    scope: tuple,
+    date: date_cls,
+    offset: int,
+    lead_days: list[int],
+    season_tables: dict,
+) -> bool:
+    kind = scope[0]
+    if kind == DirtyScope.ALL:
+        return True
+    if kind in (DirtyScope.DATES, DirtyScope.OFFSETS):
+        start, end = scope[1], scope[2]
+        value = date if kind == DirtyScope.DATES else offset
+        return (start is None or start <= value) and (end is None or value <= end)
+    if kind in (DirtyScope.LEAD_DAYS, DirtyScope.LEAD_DAYS_SHIFT):
+        if not lead_days:
+            return False
+        # The position of the rule, or where it was if it was deleted
+        position = bisect_left(lead_days, scope[1])
+        # Dates beyond the last lead days based rule are priced by it
+        if kind == DirtyScope.LEAD_DAYS_SHIFT or position >= len(lead_days) - 1:
+            return offset >= min(position, len(lead_days) - 1)
+        return offset == position
+    if kind == DirtyScope.WEEKDAY:
+        return date.isoweekday() == scope[1]
+    if kind == DirtyScope.MONTH:
+        return date.month == scope[1]
+    if kind == DirtyScope.SEASON:
+        if scope not in season_tables:
+            season_tables[scope] = build_day_of_year_table([scope[1:]])
+        return season_tables[scope][get_day_of_year_index(date)] >= 0
+    return False
+
+
+def resolve_dirty_scopes(
+    scopes: set[tuple],
+    dates: tuple[date_cls, date_cls],
+    current_date: date_cls,
+    lead_days: list[int],
+) -> tuple[list[date_cls], set[int]]:
+    """
+    Resolve dirty scopes into the dates to recalculate for every rate plan and
+    the rate plans to recalculate for every date.
+
+    Args:
+        scopes (set[tuple]): The dirty scopes, see DirtyScope.
+        dates (tuple[date, date]): The range of dates that can be recalculated.
+        current_date (date): The current local date of the hotel, offsets are
+            relative to it.
+        lead_days (list[int]): The ascending lead days of the lead days based
+            rules, empty if they are not enabled.
+
+    Returns:
+        tuple[list[date], set[int]]: The sorted dirty dates and the dirty rate
+            plan ids.
+    """
+    rate_plans = {scope[1] for scope in scopes if scope[0] == DirtyScope.RATE_PLAN}
+    date_scopes = [scope for scope in scopes if scope[0] != DirtyScope.RATE_PLAN]
+    season_tables = {}
+    dirty_dates = []
+    for i in range((dates[1] - dates[0]).days + 1):
+        date = dates[0] + timedelta(days=i)
+        offset = (date - current_date).days
+        if any(
+            _is_dirty_date(scope, date, offset, lead_days, season_tables)
+            for scope in date_scopes
+        ):
+            dirty_dates.append(date)
+    return dirty_dates, rate_plans
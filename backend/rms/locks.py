@@ -0,0 +1,39 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from backend.utils.db import try_advisory_xact_lock
+
+# Advisory lock namespace of the rates of a hotel, unique across the project
+HOTEL_RATES_LOCK_NAMESPACE = 1001
+
+
+class HotelRatesLockedError(Exception):
+    """
+    Raised when the rates of a hotel are already being recalculated by another
+    transaction.
+    """
+
+    def __init__(self, hotel_id: int):
+        self.hotel_id = hotel_id
+        super().__init__(f"The rates of hotel {hotel_id} are being recalculated.")
+
+
+@contextmanager
+def lock_hotel_rates(hotel_id: int):
+    """
+    Run a block in a transaction holding the rates lock of a hotel, so that
+    concurrent recalculations of the same hotel don't race on its restrictions.
+    Nested blocks of the same transaction take the lock again.
+
+    Args:
+        hotel_id (int): The hotel id, the key of the advisory lock.
+
+    Raises:
+        HotelRatesLockedError: Another transaction holds the lock, the block
+            is not run.
+    """
+    with transaction.atomic():
+        if not try_advisory_xact_lock(HOTEL_RATES_LOCK_NAMESPACE, hotel_id):
+            raise HotelRatesLockedError(hotel_id)
+        yield
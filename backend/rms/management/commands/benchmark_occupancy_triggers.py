@@ -0,0 +1,165 @@
+import random
+import time
+import uuid
+from unittest import mock
+
+from celery.app.task import Task
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.cm.adapter import ChannexAdapter
+from backend.cm.models import CMHotelConnector
+from backend.pms.models import (
+    Booking,
+    BookingRoom,
+    Hotel,
+    RatePlan,
+    RatePlanRestrictions,
+    RoomType,
+)
+from backend.rms.models import OccupancyBasedTriggerRule, RMSRatePlanRestrictions
+from backend.rms.tasks import (
+    handle_occupancy_based_trigger,
+    handle_pending_occupancy_based_triggers,
+    schedule_occupancy_based_trigger,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a burst of booking webhooks, recalculating the rates once per "
+        "booking against coalescing the occupancy based triggers. Tasks and "
+        "channel manager pushes are recorded instead of being sent, the hotel "
+        "is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, default=200)
+        parser.add_argument("--room-types", type=int, default=5)
+        parser.add_argument("--rate-plans", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with mock.patch.object(Task, "apply_async"), mock.patch.object(
+            handle_pending_occupancy_based_triggers, "apply_async"
+        ) as apply_async, mock.patch.object(
+            ChannexAdapter, "save_rate_plan_restrictions"
+        ) as save_rate_plan_restrictions:
+            hotel = self.create_hotel(options["room_types"], options["rate_plans"])
+            try:
+                for name, replay in (
+                    ("per booking", self.replay_per_booking),
+                    ("coalesced", self.replay_coalesced),
+                ):
+                    self.reset(hotel)
+                    bookings = self.generate_bookings(
+                        hotel, options["bookings"], options["seed"]
+                    )
+                    apply_async.reset_mock()
+                    save_rate_plan_restrictions.reset_mock()
+
+                    start = time.perf_counter()
+                    recalculations = replay(hotel, bookings, apply_async)
+                    elapsed = time.perf_counter() - start
+
+                    pushed = sum(
+                        len(call.kwargs["new_rate_plan_restrictions"])
+                        for call in save_rate_plan_restrictions.call_args_list
+                    )
+                    self.stdout.write(
+                        f"{name}: {len(bookings) / elapsed:.1f} bookings/s, "
+                        f"{recalculations} recalculations, "
+                        f"{save_rate_plan_restrictions.call_count} pushes "
+                        f"of {pushed} restrictions"
+                    )
+            finally:
+                # Booking rooms protect their room types
+                Booking.objects.filter(hotel=hotel).delete()
+                hotel.delete()
+
+    @staticmethod
+    def create_hotel(room_types: int, rate_plans: int) -> Hotel:
+        hotel = Hotel.objects.create(name="Benchmark", inventory_days=365)
+        setting = hotel.dynamic_pricing_setting
+        setting.is_enabled = True
+        setting.is_occupancy_based = True
+        setting.default_base_rate = 1000000
+        setting.save()
+        for min_occupancy in range(1, 6):
+            OccupancyBasedTriggerRule.objects.create(
+                setting=setting,
+                min_occupancy=min_occupancy,
+                percentage_factor=5 * min_occupancy,
+            )
+        for i in range(room_types):
+            room_type = RoomType.objects.create(hotel=hotel, name=f"Benchmark {i}")
+            for j in range(rate_plans):
+                RatePlan.objects.create(room_type=room_type, name=f"Benchmark {j}")
+        # Created as is, the channel manager is never called
+        CMHotelConnector.objects.bulk_create(
+            [CMHotelConnector(pms=hotel, cm_id=uuid.uuid4(), cm_api_key="benchmark")]
+        )
+        return hotel
+
+    @staticmethod
+    def reset(hotel: Hotel):
+        Booking.objects.filter(hotel=hotel).delete()
+        RatePlanRestrictions.objects.filter(rate_plan__room_type__hotel=hotel).update(
+            rate=0
+        )
+        RMSRatePlanRestrictions.objects.filter(
+            restriction__rate_plan__room_type__hotel=hotel
+        ).update(base_rate=0)
+
+    @staticmethod
+    def generate_bookings(hotel: Hotel, count: int, seed: int) -> list[tuple]:
+        rng = random.Random(seed)
+        room_types = list(
+            RoomType.objects.filter(hotel=hotel).values_list("id", flat=True)
+        )
+        today = timezone.now().date()
+        bookings = []
+        for _ in range(count):
+            arrival_date = today + timezone.timedelta(days=rng.randrange(60))
+            departure_date = arrival_date + timezone.timedelta(days=rng.randrange(1, 8))
+            bookings.append((rng.choice(room_types), arrival_date, departure_date))
+        return bookings
+
+    @staticmethod
+    def save_booking(hotel: Hotel, room_type: int, arrival_date, departure_date):
+        # Same rows as a new booking revision
+        booking = Booking.objects.create(
+            hotel=hotel, dates=(arrival_date, departure_date), raw_data={}
+        )
+        BookingRoom.objects.create(
+            booking=booking,
+            room_type_id=room_type,
+            dates=(arrival_date, departure_date),
+            raw_data={},
+        )
+
+    def replay_per_booking(self, hotel: Hotel, bookings: list[tuple], apply_async):
+        for room_type, arrival_date, departure_date in bookings:
+            self.save_booking(hotel, room_type, arrival_date, departure_date)
+            handle_occupancy_based_trigger(
+                hotel_id=hotel.id,
+                room_types=[room_type],
+                dates=(arrival_date.isoformat(), departure_date.isoformat()),
+            )
+        return len(bookings)
+
+    def replay_coalesced(self, hotel: Hotel, bookings: list[tuple], apply_async):
+        for room_type, arrival_date, departure_date in bookings:
+            self.save_booking(hotel, room_type, arrival_date, departure_date)
+            schedule_occupancy_based_trigger(
+                hotel_id=hotel.id,
+                room_types=[room_type],
+                dates=(arrival_date.isoformat(), departure_date.isoformat()),
+            )
+        # The whole burst falls within the delay of the first trigger, run the
+        # scheduled handlers once it is over
+        recalculations = 0
+        for _ in apply_async.call_args_list:
+            handle_pending_occupancy_based_triggers(hotel.id)
+            recalculations += 1
+        return recalculations
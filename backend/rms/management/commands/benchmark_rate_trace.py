@@ -0,0 +1,81 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from backend.pms.models import Hotel, RatePlan, RoomType
+from backend.rms.adapter import DynamicPricingAdapter
+from backend.rms.models import RateTrace
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the overhead of tracing rates on calculate_and_update_rates "
+        "for several sample rates, 0 being tracing off. Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rate-plans", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument(
+            "--sample-rates", type=float, nargs="+", default=[0, 0.001, 0.01]
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            hotel = Hotel.objects.create(name="Benchmark", inventory_days=365)
+            room_type = RoomType.objects.create(hotel=hotel, name="Benchmark")
+            for i in range(options["rate_plans"]):
+                RatePlan.objects.create(room_type=room_type, name=f"Benchmark {i}")
+            setting = hotel.dynamic_pricing_setting
+            setting.is_enabled = True
+            setting.default_base_rate = 100
+            setting.save()
+            with connection.cursor() as cursor:
+                # Otherwise the planner doesn't know about the new restrictions
+                cursor.execute(
+                    "ANALYZE pms_rateplanrestrictions, rms_rmsrateplanrestrictions"
+                )
+            adapter = DynamicPricingAdapter(setting=setting)
+            # The rates are up to date from now on, only the traces are written
+            self.calculate(adapter, hotel, room_type)
+            self.stdout.write(
+                f"Calculating {options['rate_plans']} rate plans x "
+                f"{hotel.inventory_days + 1} days"
+            )
+
+            baseline = None
+            for sample_rate in options["sample_rates"]:
+                timings = []
+                traces = 0
+                with override_settings(RMS_RATE_TRACE_SAMPLE_RATE=sample_rate):
+                    for _ in range(options["repeat"]):
+                        sid = transaction.savepoint()
+                        start = time.perf_counter()
+                        self.calculate(adapter, hotel, room_type)
+                        timings.append(time.perf_counter() - start)
+                        traces += RateTrace.objects.filter(
+                            rate_plan__room_type=room_type
+                        ).count()
+                        transaction.savepoint_rollback(sid)
+                best = min(timings)
+                if baseline is None:
+                    baseline = best
+                self.stdout.write(
+                    f"sample rate {sample_rate}: best {best:.4f}s, "
+                    f"mean {sum(timings) / len(timings):.4f}s, "
+                    f"overhead {(best / baseline - 1) * 100:+.1f}%, "
+                    f"{traces / options['repeat']:.0f} traces per call"
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def calculate(adapter: DynamicPricingAdapter, hotel: Hotel, room_type: RoomType):
+        today = timezone.now().astimezone(hotel.timezone).date()
+        adapter.calculate_and_update_rates(
+            room_types=[room_type.id],
+            dates=(today, today + timedelta(days=hotel.inventory_days)),
+        )
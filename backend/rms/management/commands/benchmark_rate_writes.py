@@ -0,0 +1,72 @@
+import math
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.pms.models import Hotel, RatePlan, RatePlanRestrictions, RoomType
+from backend.rms.models import RMSRatePlanRestrictions
+from backend.utils.db import bulk_update_from_values
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the write path of calculate_and_update_rates, bulk_update "
+        "against UPDATE ... FROM (VALUES ...). Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        with transaction.atomic():
+            restrictions = self.create_restrictions(rows)
+            self.stdout.write(f"Updating {len(restrictions)} restrictions")
+            for name, update in (
+                ("bulk_update", self.bulk_update),
+                ("bulk_update_from_values", self.bulk_update_from_values),
+            ):
+                timings = []
+                for i in range(options["repeat"]):
+                    for restriction in restrictions:
+                        restriction.rate = i + 1
+                        restriction.rms.base_rate = i + 1
+                    sid = transaction.savepoint()
+                    start = time.perf_counter()
+                    update(restrictions)
+                    timings.append(time.perf_counter() - start)
+                    transaction.savepoint_rollback(sid)
+                self.stdout.write(
+                    f"{name}: best {min(timings):.3f}s, "
+                    f"mean {sum(timings) / len(timings):.3f}s"
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def create_restrictions(rows: int) -> list[RatePlanRestrictions]:
+        hotel = Hotel.objects.create(name="Benchmark", inventory_days=700)
+        room_type = RoomType.objects.create(hotel=hotel, name="Benchmark")
+        # Each rate plan gets a restriction per day of the inventory window
+        for i in range(math.ceil(rows / (hotel.inventory_days + 1))):
+            RatePlan.objects.create(room_type=room_type, name=f"Benchmark {i}")
+        return list(
+            RatePlanRestrictions.objects.filter(rate_plan__room_type=room_type)
+            .select_related("rms")
+            .order_by("id")[:rows]
+        )
+
+    @staticmethod
+    def bulk_update(restrictions: list[RatePlanRestrictions]):
+        RatePlanRestrictions.objects.bulk_update(restrictions, ["rate"])
+        RMSRatePlanRestrictions.objects.bulk_update(
+            [restriction.rms for restriction in restrictions], ["base_rate"]
+        )
+
+    @staticmethod
+    def bulk_update_from_values(restrictions: list[RatePlanRestrictions]):
+        bulk_update_from_values(restrictions, ["rate"])
+        bulk_update_from_values(
+            [restriction.rms for restriction in restrictions], ["base_rate"]
+        )
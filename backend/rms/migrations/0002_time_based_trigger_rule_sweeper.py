@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-17 12:22
+
+from django.db import migrations, models
+
+
+def delete_time_based_trigger_periodic_tasks(apps, schema_editor):
+    # Time based trigger rules are handled by sweep_time_based_triggers now
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(
+        task="backend.rms.tasks.handle_time_based_trigger"
+    ).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("django_celery_beat", "0018_improve_crontab_helptext"),
+        ("rms", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="timebasedtriggerrule",
+            name="periodic_task",
+        ),
+        migrations.AddIndex(
+            model_name="timebasedtriggerrule",
+            index=models.Index(
+                fields=["hour", "day_ahead"], name="rms_timebas_hour_5c851d_idx"
+            ),
+        ),
+        migrations.RunPython(
+            delete_time_based_trigger_periodic_tasks, migrations.RunPython.noop
+        ),
+    ]
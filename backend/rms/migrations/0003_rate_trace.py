@@ -0,0 +1,63 @@
+# Generated by Django 4.2.1 on 2026-10-17 12:50
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pms", "0001_initial"),
+        ("rms", "0002_time_based_trigger_rule_sweeper"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateTrace",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("calculated_at", models.DateTimeField()),
+                ("occupancy", models.IntegerField()),
+                ("base_rate", models.PositiveIntegerField()),
+                ("restriction_base_rate", models.IntegerField()),
+                ("rate", models.IntegerField()),
+                (
+                    "percentage_factors",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.SmallIntegerField(), size=None
+                    ),
+                ),
+                (
+                    "increment_factors",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(), size=None
+                    ),
+                ),
+                (
+                    "rate_plan",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rate_traces",
+                        to="pms.rateplan",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["rate_plan", "date"],
+                        name="rms_ratetra_rate_pl_03033c_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.1 on 2026-10-17 12:58
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+from backend.utils.partitions import create_monthly_partitions
+
+
+def create_rate_history_partitions(apps, schema_editor):
+    # Then created ahead by maintain_rate_history_partitions
+    create_monthly_partitions(
+        "rms_ratehistory",
+        timezone.now().date(),
+        settings.RMS_RATE_HISTORY_PARTITIONS_AHEAD + 1,
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rms", "0003_rate_trace"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="RateHistory",
+                    fields=[
+                        ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                        ("restriction_id", models.BigIntegerField()),
+                        ("old_rate", models.IntegerField()),
+                        ("new_rate", models.IntegerField()),
+                        ("base_rate", models.IntegerField()),
+                        (
+                            "cause",
+                            models.PositiveSmallIntegerField(
+                                choices=[
+                                    (0, "Unknown"),
+                                    (1, "Recalculation"),
+                                    (2, "Rule change"),
+                                    (3, "Occupancy"),
+                                    (4, "Time"),
+                                ]
+                            ),
+                        ),
+                        ("created_at", models.DateTimeField()),
+                    ],
+                    options={
+                        "indexes": [
+                            models.Index(
+                                fields=["restriction_id", "created_at"],
+                                name="rms_ratehis_restric_54d5c8_idx",
+                            )
+                        ],
+                    },
+                ),
+            ],
+            # Django can't create partitioned tables, the partition key must
+            # be part of the primary key
+            database_operations=[
+                migrations.RunSQL(
+                    sql="""
+                    CREATE TABLE rms_ratehistory (
+                        id bigint GENERATED BY DEFAULT AS IDENTITY,
+                        restriction_id bigint NOT NULL,
+                        old_rate integer NOT NULL,
+                        new_rate integer NOT NULL,
+                        base_rate integer NOT NULL,
+                        cause smallint NOT NULL CHECK (cause >= 0),
+                        created_at timestamp with time zone NOT NULL,
+                        PRIMARY KEY (id, created_at)
+                    ) PARTITION BY RANGE (created_at);
+                    CREATE INDEX rms_ratehis_restric_54d5c8_idx
+                        ON rms_ratehistory (restriction_id, created_at);
+                    """,
+                    reverse_sql="DROP TABLE rms_ratehistory;",
+                ),
+            ],
+        ),
+        migrations.RunPython(create_rate_history_partitions, migrations.RunPython.noop),
+    ]
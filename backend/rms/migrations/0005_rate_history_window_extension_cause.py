@@ -0,0 +1,26 @@
+# Generated by Django 4.2.1 on 2026-10-17 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rms", "0004_rate_history"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ratehistory",
+            name="cause",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (0, "Unknown"),
+                    (1, "Recalculation"),
+                    (2, "Rule change"),
+                    (3, "Occupancy"),
+                    (4, "Time"),
+                    (5, "Window extension"),
+                ]
+            ),
+        ),
+    ]
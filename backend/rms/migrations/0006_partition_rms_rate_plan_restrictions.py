@@ -0,0 +1,71 @@
+from django.db import migrations, models
+
+from backend.utils.partitions import create_monthly_partitions, get_monthly_partitions
+
+
+def create_restriction_partitions(apps, schema_editor):
+    # The same months as the restrictions, then created ahead by
+    # maintain_restriction_partitions
+    using = schema_editor.connection.alias
+    for month in get_monthly_partitions("pms_rateplanrestrictions", using).values():
+        create_monthly_partitions("rms_rmsrateplanrestrictions", month, 1, using=using)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pms", "0002_partition_rate_plan_restrictions"),
+        ("rms", "0005_rate_history_window_extension_cause"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name="rmsrateplanrestrictions",
+                    name="date",
+                    field=models.DateField(editable=False),
+                    preserve_default=False,
+                ),
+            ],
+            # Partitioned by the date of the restriction like the
+            # restrictions, which are referenced by (id, date)
+            database_operations=[
+                migrations.RunSQL(
+                    sql="""
+                    ALTER TABLE rms_rmsrateplanrestrictions
+                        RENAME TO rms_rmsrateplanrestrictions_unpartitioned;
+                    ALTER INDEX rms_rmsrateplanrestrictions_pkey
+                        RENAME TO rms_rmsrateplanrestrictions_unpartitioned_pkey;
+
+                    CREATE TABLE rms_rmsrateplanrestrictions (
+                        restriction_id bigint NOT NULL,
+                        date date NOT NULL,
+                        base_rate integer NOT NULL
+                            CONSTRAINT rms_rmsrateplanrestrictions_base_rate_check
+                            CHECK (base_rate >= 0),
+                        CONSTRAINT rms_rmsrateplanrestrictions_pkey
+                            PRIMARY KEY (restriction_id, date),
+                        CONSTRAINT rms_rmsrateplanrestr_restriction_id_fba713f4_fk_pms_ratep
+                            FOREIGN KEY (restriction_id, date)
+                            REFERENCES pms_rateplanrestrictions (id, date)
+                            ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED
+                    ) PARTITION BY RANGE (date);
+                    CREATE TABLE rms_rmsrateplanrestrictions_default
+                        PARTITION OF rms_rmsrateplanrestrictions DEFAULT;
+                    """,
+                ),
+                migrations.RunPython(create_restriction_partitions),
+                migrations.RunSQL(
+                    sql="""
+                    INSERT INTO rms_rmsrateplanrestrictions
+                        (restriction_id, date, base_rate)
+                    SELECT restriction.id, restriction.date, rms.base_rate
+                    FROM rms_rmsrateplanrestrictions_unpartitioned rms
+                    JOIN pms_rateplanrestrictions restriction
+                        ON restriction.id = rms.restriction_id;
+                    DROP TABLE rms_rmsrateplanrestrictions_unpartitioned;
+                    """,
+                ),
+            ],
+        ),
+    ]
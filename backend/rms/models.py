@@ -2,11 +2,10 @@ import uuid
 from datetime import datetime
 
 from django.contrib.postgres.constraints import ExclusionConstraint
-from django.contrib.postgres.fields import DateRangeField, RangeOperators
+from django.contrib.postgres.fields import ArrayField, DateRangeField, RangeOperators
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django_celery_beat.models import PeriodicTask
 
 from backend.pms.models import Hotel, RatePlan, RatePlanRestrictions
 
@@ -22,6 +21,8 @@ class RMSRatePlanRestrictions(models.Model):
         related_name="rms",
         primary_key=True,
     )
+    # The date of the restriction, the partition key of both tables
+    date = models.DateField(editable=False)
     base_rate = models.PositiveIntegerField()
 
 
@@ -101,7 +102,14 @@ class RuleFactor(models.Model):
     class Meta:
         abstract = True
 
-    def save(self, *args, **kwargs):
+    def validate(self):
+        """
+        Validate the rule against its setting, it is saved only if valid.
+
+        Raises:
+            ValidationError: If the rule is invalid.
+            RuleNotEnabledError: If the rules of its kind are not enabled.
+        """
         if self.percentage_factor < -100:
             raise ValidationError("Percentage factor cannot be less than -100")
 
@@ -109,6 +117,9 @@ class RuleFactor(models.Model):
             raise ValidationError(
                 "Either percentage factor or increment factor must be set"
             )
+
+    def save(self, *args, **kwargs):
+        self.validate()
         super().save(*args, **kwargs)
 
 
@@ -126,10 +137,10 @@ class LeadDaysBasedRule(RuleFactor):
             models.Index(fields=["setting", "lead_days"]),
         ]
 
-    def save(self, *args, **kwargs):
+    def validate(self):
         if not self.setting.is_lead_days_based:
             raise RuleNotEnabledError("Lead days based rules are not enabled")
-        super().save(*args, **kwargs)
+        super().validate()
 
 
 class WeekdayBasedRule(RuleFactor):
@@ -156,12 +167,12 @@ class WeekdayBasedRule(RuleFactor):
             models.Index(fields=["setting", "weekday"]),
         ]
 
-    def save(self, *args, **kwargs):
+    def validate(self):
         if self.weekday not in self.WeekdayChoices.values:
             raise ValidationError("Invalid weekday")
         if not self.setting.is_weekday_based:
             raise RuleNotEnabledError("Weekday based rules are not enabled")
-        super().save(*args, **kwargs)
+        super().validate()
 
 
 class MonthBasedRule(RuleFactor):
@@ -193,12 +204,12 @@ class MonthBasedRule(RuleFactor):
             models.Index(fields=["setting", "month"]),
         ]
 
-    def save(self, *args, **kwargs):
+    def validate(self):
         if self.month not in self.MonthChoices.values:
             raise ValidationError("Invalid month")
         if not self.setting.is_month_based:
             raise RuleNotEnabledError("Month based rules are not enabled")
-        super().save(*args, **kwargs)
+        super().validate()
 
 
 class SeasonBasedRule(RuleFactor):
@@ -219,7 +230,7 @@ class SeasonBasedRule(RuleFactor):
             models.Index(fields=["setting", "name"]),
         ]
 
-    def save(self, *args, **kwargs):
+    def validate(self):
         try:
             datetime.strptime(f"{self.start_month}/{self.start_day}", "%m/%d")
             datetime.strptime(f"{self.end_month}/{self.end_day}", "%m/%d")
@@ -227,7 +238,7 @@ class SeasonBasedRule(RuleFactor):
             raise ValidationError("Invalid start or end date")
         if not self.setting.is_season_based:
             raise RuleNotEnabledError("Season based rules are not enabled")
-        super().save(*args, **kwargs)
+        super().validate()
 
 
 class OccupancyBasedTriggerRule(RuleFactor):
@@ -244,10 +255,10 @@ class OccupancyBasedTriggerRule(RuleFactor):
             models.Index(fields=["setting", "min_occupancy"]),
         ]
 
-    def save(self, *args, **kwargs):
+    def validate(self):
         if not self.setting.is_occupancy_based:
             raise RuleNotEnabledError("Occupancy based rules are not enabled")
-        super().save(*args, **kwargs)
+        super().validate()
 
 
 class TimeBasedTriggerRule(RuleFactor):
@@ -270,22 +281,87 @@ class TimeBasedTriggerRule(RuleFactor):
         default=0,
     )
 
-    periodic_task = models.ForeignKey(
-        PeriodicTask,
-        on_delete=models.DO_NOTHING,
-        related_name="time_based_trigger_rules",
-        null=True,
-        blank=True,
-    )
-
     class Meta:
         unique_together = ("setting", "hour", "day_ahead", "min_occupancy")
+        indexes = [
+            # Rules whose hour just passed are looked up every hour
+            models.Index(fields=["hour", "day_ahead"]),
+        ]
 
-    def save(self, *args, **kwargs):
+    def validate(self):
         if self.hour > 23:
             raise ValidationError("Invalid hour")
         if self.day_ahead not in self.DayAheadChoices.values:
             raise ValidationError("Invalid day ahead")
         if not self.setting.is_time_based:
             raise RuleNotEnabledError("Time based rules are not enabled")
-        super().save(*args, **kwargs)
+        super().validate()
+
+
+class RateTrace(models.Model):
+    """
+    The factors a sampled rate was calculated from, see
+    DynamicPricingAdapter.trace_rates. Traces are only appended.
+    """
+
+    # The factors in the order they are stored in, the base rate of the
+    # restriction is calculated from the first five
+    FACTORS = (
+        "rate_plan",
+        "lead_days",
+        "weekday",
+        "month",
+        "season",
+        "occupancy",
+        "time",
+    )
+
+    rate_plan = models.ForeignKey(
+        RatePlan,
+        on_delete=models.CASCADE,
+        related_name="rate_traces",
+    )
+    date = models.DateField()
+    calculated_at = models.DateTimeField()
+    occupancy = models.IntegerField()
+    base_rate = models.PositiveIntegerField()
+    restriction_base_rate = models.IntegerField()
+    rate = models.IntegerField()
+    percentage_factors = ArrayField(models.SmallIntegerField())
+    increment_factors = ArrayField(models.IntegerField())
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["rate_plan", "date"]),
+        ]
+
+
+class RateHistory(models.Model):
+    """
+    A change of the rate of a restriction, see calculate_and_update_rates.
+    Changes are only appended, in a table partitioned by month of created_at,
+    see the rate history migration.
+    """
+
+    class CauseChoices(models.IntegerChoices):
+        UNKNOWN = 0, _("Unknown")
+        RECALCULATION = 1, _("Recalculation")
+        RULE_CHANGE = 2, _("Rule change")
+        OCCUPANCY = 3, _("Occupancy")
+        TIME = 4, _("Time")
+        WINDOW_EXTENSION = 5, _("Window extension")
+
+    # The primary key of the table is (id, created_at), the partition key
+    # must be part of it
+    id = models.BigAutoField(primary_key=True)
+    restriction_id = models.BigIntegerField()
+    old_rate = models.IntegerField()
+    new_rate = models.IntegerField()
+    base_rate = models.IntegerField()
+    cause = models.PositiveSmallIntegerField(choices=CauseChoices.choices)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["restriction_id", "created_at"]),
+        ]
@@ -2,7 +2,7 @@ import pgtrigger
 
 from backend.pms.models import RatePlan, RatePlanRestrictions
 
-from .models import RMSRatePlan, RMSRatePlanRestrictions
+from .models import RateTrace, RMSRatePlan, RMSRatePlanRestrictions
 
 """
 We want loosely coupled code, so we separate the data domain of the PMS. But
@@ -15,8 +15,8 @@ pgtrigger.register(
         operation=pgtrigger.Insert,
         when=pgtrigger.After,
         func=f"""
-          INSERT INTO {RMSRatePlanRestrictions._meta.db_table} (restriction_id, base_rate)
-          VALUES (NEW.id, 0);
+          INSERT INTO {RMSRatePlanRestrictions._meta.db_table} (restriction_id, date, base_rate)
+          VALUES (NEW.id, NEW.date, 0);
           RETURN NEW;
         """,
     ),
@@ -34,3 +34,7 @@ pgtrigger.register(
         """,
     ),
 )(RatePlan)
+
+pgtrigger.register(
+    pgtrigger.Protect(name="rms_rate_trace_append_only", operation=pgtrigger.Update),
+)(RateTrace)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from backend.pms.models import Hotel, RatePlanRestrictions
+from backend.utils.cache import get_or_set_locked
+
+# Rate calendars are invalidated when rates are written, the timeout only
+# cleans up the ones of former dates and generations
+RATE_CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_rate_calendar_generation_key(hotel_id: int) -> str:
+    return f"rms:rate_calendar:{hotel_id}:generation"
+
+
+def get_rate_calendar_cache_key(hotel_id: int, generation: int, start_date: date):
+    return f"rms:rate_calendar:{hotel_id}:{generation}:{start_date.isoformat()}"
+
+
+def bump_rate_calendar_generation(hotel_id: int) -> int:
+    """
+    Bump the generation of the rate calendar of a hotel, the cached calendars
+    of the former generations can't be reached anymore.
+
+    Returns:
+        int: The new generation.
+    """
+    generation_key = get_rate_calendar_generation_key(hotel_id)
+    cache.add(generation_key, 0, timeout=None)
+    return cache.incr(generation_key)
+
+
+def invalidate_rate_calendar(hotel_id: int):
+    """
+    Invalidate the rate calendar of a hotel once the current transaction is
+    committed, until then other transactions don't see the new rates.
+    """
+    transaction.on_commit(lambda: bump_rate_calendar_generation(hotel_id))
+
+
+def build_rate_calendar(hotel: Hotel, start_date: date, end_date: date) -> dict:
+    """
+    Build the room type x rate plan x date grid of the rates of a hotel with a
+    single query. The rates of each rate plan are columns aligned with dates.
+
+    Args:
+        hotel (Hotel): The hotel.
+        start_date (date): The first date.
+        end_date (date): The last date, included.
+
+    Returns:
+        dict: The dates and the room types with their rate plans, each with
+            its rates and RMS base rates, None where there is no restriction.
+    """
+    dates = [
+        start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)
+    ]
+    restrictions = (
+        RatePlanRestrictions.objects.filter(
+            rate_plan__room_type__hotel=hotel,
+            date__range=(start_date, end_date),
+            rms__date__range=(start_date, end_date),
+        )
+        .order_by("rate_plan__room_type_id", "rate_plan_id")
+        .values_list(
+            "rate_plan__room_type__uuid",
+            "rate_plan__room_type__name",
+            "rate_plan__uuid",
+            "rate_plan__name",
+            "date",
+            "rate",
+            "rms__base_rate",
+        )
+    )
+
+    room_types = {}
+    rate_plans = {}
+    for (
+        room_type_uuid,
+        room_type_name,
+        rate_plan_uuid,
+        rate_plan_name,
+        restriction_date,
+        rate,
+        base_rate,
+    ) in restrictions:
+        rate_plan = rate_plans.get(rate_plan_uuid)
+        if rate_plan is None:
+            room_type = room_types.get(room_type_uuid)
+            if room_type is None:
+                room_type = room_types[room_type_uuid] = {
+                    "uuid": room_type_uuid,
+                    "name": room_type_name,
+                    "rate_plans": [],
+                }
+            rate_plan = rate_plans[rate_plan_uuid] = {
+                "uuid": rate_plan_uuid,
+                "name": rate_plan_name,
+                "rates": [None] * len(dates),
+                "base_rates": [None] * len(dates),
+            }
+            room_type["rate_plans"].append(rate_plan)
+        column = (restriction_date - start_date).days
+        rate_plan["rates"][column] = rate
+        rate_plan["base_rates"][column] = base_rate
+    return {"dates": dates, "room_types": list(room_types.values())}
+
+
+def get_rate_calendar(hotel: Hotel) -> tuple[dict, str]:
+    """
+    Get the rate calendar of the inventory of a hotel, from the local today,
+    from the cache or built once per generation, see invalidate_rate_calendar.
+
+    Args:
+        hotel (Hotel): The hotel.
+
+    Returns:
+        tuple[dict, str]: The rate calendar, see build_rate_calendar, and its
+            ETag.
+    """
+    start_date = timezone.now().astimezone(hotel.timezone).date()
+    generation = cache.get(get_rate_calendar_generation_key(hotel.id), 0)
+
+    def build():
+        rate_calendar = build_rate_calendar(
+            hotel, start_date, start_date + timedelta(days=hotel.inventory_days)
+        )
+        digest = hashlib.md5(
+            json.dumps(rate_calendar, cls=DjangoJSONEncoder).encode()
+        ).hexdigest()
+        return rate_calendar, f'"{digest}"'
+
+    return get_or_set_locked(
+        get_rate_calendar_cache_key(hotel.id, generation, start_date),
+        build,
+        timeout=RATE_CALENDAR_CACHE_TIMEOUT,
+    )
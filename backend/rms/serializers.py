@@ -9,6 +9,7 @@ from .models import (
     LeadDaysBasedRule,
     MonthBasedRule,
     OccupancyBasedTriggerRule,
+    RateTrace,
     RMSRatePlan,
     SeasonBasedRule,
     TimeBasedTriggerRule,
@@ -146,3 +147,173 @@ class DynamicPricingSettingSerializer(serializers.ModelSerializer):
             "rate_plans"
         )
         return RMSRoomTypeSerializer(queryset, many=True).data
+
+
+class SimulatedRuleSerializer(serializers.ModelSerializer):
+    """
+    A created rule of a rate simulation, or an updated one identified by its
+    uuid whose omitted fields are left unchanged.
+    """
+
+    uuid = serializers.UUIDField()
+
+    def __init__(self, *args, is_update=False, **kwargs):
+        self.is_update = is_update
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_update:
+            del fields["uuid"]
+            return fields
+        for name, field in fields.items():
+            field.required = name == "uuid"
+        return fields
+
+
+class SimulatedIntervalBaseRateSerializer(SimulatedRuleSerializer):
+    dates = DateRangeField()
+
+    class Meta:
+        model = IntervalBaseRate
+        fields = ("uuid", "dates", "base_rate")
+
+
+class SimulatedRuleFactorSerializer(SimulatedRuleSerializer):
+    class Meta:
+        fields = ("uuid", "percentage_factor", "increment_factor")
+
+
+class SimulatedLeadDaysBasedRuleSerializer(SimulatedRuleFactorSerializer):
+    class Meta(SimulatedRuleFactorSerializer.Meta):
+        model = LeadDaysBasedRule
+        fields = SimulatedRuleFactorSerializer.Meta.fields + ("lead_days",)
+
+
+class SimulatedWeekdayBasedRuleSerializer(SimulatedRuleFactorSerializer):
+    class Meta(SimulatedRuleFactorSerializer.Meta):
+        model = WeekdayBasedRule
+        fields = SimulatedRuleFactorSerializer.Meta.fields + ("weekday",)
+
+
+class SimulatedMonthBasedRuleSerializer(SimulatedRuleFactorSerializer):
+    class Meta(SimulatedRuleFactorSerializer.Meta):
+        model = MonthBasedRule
+        fields = SimulatedRuleFactorSerializer.Meta.fields + ("month",)
+
+
+class SimulatedSeasonBasedRuleSerializer(SimulatedRuleFactorSerializer):
+    class Meta(SimulatedRuleFactorSerializer.Meta):
+        model = SeasonBasedRule
+        fields = SimulatedRuleFactorSerializer.Meta.fields + (
+            "name",
+            "start_month",
+            "start_day",
+            "end_month",
+            "end_day",
+        )
+
+
+class SimulatedOccupancyBasedTriggerRuleSerializer(SimulatedRuleFactorSerializer):
+    class Meta(SimulatedRuleFactorSerializer.Meta):
+        model = OccupancyBasedTriggerRule
+        fields = SimulatedRuleFactorSerializer.Meta.fields + ("min_occupancy",)
+
+
+class SimulatedTimeBasedTriggerRuleSerializer(SimulatedRuleFactorSerializer):
+    class Meta(SimulatedRuleFactorSerializer.Meta):
+        model = TimeBasedTriggerRule
+        fields = SimulatedRuleFactorSerializer.Meta.fields + (
+            "hour",
+            "day_ahead",
+            "min_occupancy",
+        )
+
+
+class RuleDiffSerializer(serializers.Serializer):
+    """
+    The rules of a kind to create, update or delete in a rate simulation.
+    """
+
+    def __init__(self, rule_serializer_class, *args, **kwargs):
+        self.rule_serializer_class = rule_serializer_class
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        return {
+            "create": self.rule_serializer_class(many=True, required=False),
+            "update": self.rule_serializer_class(
+                many=True, required=False, is_update=True
+            ),
+            "delete": serializers.ListField(
+                child=serializers.UUIDField(), required=False
+            ),
+        }
+
+
+class SimulatedSettingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DynamicPricingSetting
+        fields = (
+            "is_lead_days_based",
+            "is_weekday_based",
+            "is_month_based",
+            "is_season_based",
+            "is_occupancy_based",
+            "is_time_based",
+            "default_base_rate",
+        )
+
+
+class RateSimulationSerializer(serializers.Serializer):
+    setting = SimulatedSettingSerializer(required=False)
+    interval_base_rates = RuleDiffSerializer(
+        SimulatedIntervalBaseRateSerializer, required=False
+    )
+    lead_days_based_rules = RuleDiffSerializer(
+        SimulatedLeadDaysBasedRuleSerializer, required=False
+    )
+    weekday_based_rules = RuleDiffSerializer(
+        SimulatedWeekdayBasedRuleSerializer, required=False
+    )
+    month_based_rules = RuleDiffSerializer(
+        SimulatedMonthBasedRuleSerializer, required=False
+    )
+    season_based_rules = RuleDiffSerializer(
+        SimulatedSeasonBasedRuleSerializer, required=False
+    )
+    occupancy_based_trigger_rules = RuleDiffSerializer(
+        SimulatedOccupancyBasedTriggerRuleSerializer, required=False
+    )
+    time_based_trigger_rules = RuleDiffSerializer(
+        SimulatedTimeBasedTriggerRuleSerializer, required=False
+    )
+    # Defaults to the inventory days of the hotel
+    days = serializers.IntegerField(min_value=1, max_value=731, required=False)
+
+
+class RateTraceSerializer(serializers.ModelSerializer):
+    factors = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RateTrace
+        fields = (
+            "date",
+            "calculated_at",
+            "occupancy",
+            "base_rate",
+            "restriction_base_rate",
+            "rate",
+            "factors",
+        )
+
+    def get_factors(self, obj):
+        return {
+            name: {
+                "percentage_factor": percentage_factor,
+                "increment_factor": increment_factor,
+            }
+            for name, percentage_factor, increment_factor in zip(
+                RateTrace.FACTORS, obj.percentage_factors, obj.increment_factors
+            )
+        }
@@ -1,14 +1,11 @@
-import json
-
 from django.core.exceptions import ValidationError
 from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from django.utils import timezone
-from django_celery_beat.models import CrontabSchedule, PeriodicTask
 
-from backend.pms.models import RatePlan
+from backend.pms.models import RatePlan, RoomType
 
 from .adapter import DynamicPricingAdapter
+from .dirty import DirtyScope, get_lead_days_shift_scope, get_rule_dirty_scopes
 from .models import (
     DynamicPricingSetting,
     Hotel,
@@ -21,6 +18,8 @@ from .models import (
     TimeBasedTriggerRule,
     WeekdayBasedRule,
 )
+from .rate_calendar import invalidate_rate_calendar
+from .tasks import mark_rates_dirty
 
 
 @receiver(post_save, sender=Hotel, dispatch_uid="rms:post_save_hotel")
@@ -46,8 +45,6 @@ def post_save_hotel(sender, instance: Hotel, created, **kwargs):
             month_based_rules.append(MonthBasedRule(setting=setting, month=i + 1))
         MonthBasedRule.objects.bulk_create(month_based_rules)
 
-    # TODO: Update celery task schedule if time zone is changed
-
 
 @receiver(pre_save, sender=DynamicPricingSetting, dispatch_uid="rms:pre_save_dps")
 def pre_save_dynamic_pricing_setting(sender, instance: DynamicPricingSetting, **kwargs):
@@ -57,89 +54,6 @@ def pre_save_dynamic_pricing_setting(sender, instance: DynamicPricingSetting, **
         )
 
 
-@receiver(post_save, sender=DynamicPricingSetting, dispatch_uid="rms:post_save_dps")
-def post_save_dynamic_pricing_setting(sender, instance, created, **kwargs):
-    if created:
-        return
-
-    periodic_tasks = []
-    rules = TimeBasedTriggerRule.objects.filter(setting=instance).select_related(
-        "periodic_task"
-    )
-    for rule in rules:
-        # Update the enabled field of the periodic task based on the setting
-        rule.periodic_task.enabled = instance.is_time_based and instance.is_enabled
-        periodic_tasks.append(rule.periodic_task)
-    PeriodicTask.objects.bulk_update(periodic_tasks, ["enabled"])
-
-
-@receiver(
-    post_save,
-    sender=TimeBasedTriggerRule,
-    dispatch_uid="rms:post_save_time_based_trigger_rule",
-)
-def post_save_time_based_trigger_rule(
-    sender, instance: TimeBasedTriggerRule, created, **kwargs
-):
-    """
-    Set up the periodic task for the time based trigger rule.
-    We try to reuse the existing periodic task if possible.
-    """
-    original_periodic_task = instance.periodic_task
-
-    crontab, _ = CrontabSchedule.objects.get_or_create(
-        hour=str(instance.hour),
-        minute="*",
-        day_of_week="*",
-        day_of_month="*",
-        month_of_year="*",
-        timezone=instance.setting.hotel.timezone,
-    )
-    periodic_task, _ = PeriodicTask.objects.get_or_create(
-        name=f"Time based rule trigger at {instance.hour} for "
-        f"{instance.setting.hotel.name} with {instance.day_ahead} day(s) ahead",
-        task="backend.rms.tasks.handle_time_based_trigger",
-        crontab=crontab,
-        kwargs=json.dumps(
-            {
-                "hotel_id": instance.setting.hotel.id,
-                "day_ahead": instance.day_ahead,
-                "zone_info": str(instance.setting.hotel.timezone),
-            }
-        ),
-        defaults={
-            "start_time": timezone.now(),
-        },
-    )
-
-    # Update directly to avoid calling save() method of instance
-    TimeBasedTriggerRule.objects.filter(id=instance.id).update(
-        periodic_task=periodic_task.id
-    )
-
-    # Inject the updated periodic task to instance
-    instance.periodic_task = periodic_task
-
-    # If the periodic task is updated, delete the original one if it is not used by other rules
-    if not created and original_periodic_task.time_based_trigger_rules.count() == 0:
-        original_periodic_task.delete()
-
-
-@receiver(
-    post_delete,
-    sender=TimeBasedTriggerRule,
-    dispatch_uid="rms:post_delete_time_based_trigger_rule",
-)
-def post_delete_time_based_trigger_rule(
-    sender, instance: TimeBasedTriggerRule, **kwargs
-):
-    """
-    Delete the periodic task if it is not used by other rules.
-    """
-    if instance.periodic_task.time_based_trigger_rules.count() == 0:
-        instance.periodic_task.delete()
-
-
 """
 We temporarily invalidate the cache after each save/delete objects that
 are related to dynamic pricing setting.
@@ -153,12 +67,16 @@ the rules, invalidate the cache and recalculate all the rates.
 @receiver(post_save, sender=RatePlan, dispatch_uid="rms:rm_cache")
 def rm_cache_post_save_rate_plan(sender, instance: RatePlan, created, **kwargs):
     if created:
-        DynamicPricingAdapter.invalidate_cache(instance.room_type.hotel.id)
+        DynamicPricingAdapter.invalidate_cache(
+            instance.room_type.hotel.dynamic_pricing_setting.id
+        )
 
 
 @receiver(post_save, sender=RMSRatePlan, dispatch_uid="rms:rm_cache")
 def rm_cache_post_save_rms_rate_plan(sender, instance: RMSRatePlan, created, **kwargs):
-    DynamicPricingAdapter.invalidate_cache(instance.rate_plan.room_type.hotel.id)
+    DynamicPricingAdapter.invalidate_cache(
+        instance.rate_plan.room_type.hotel.dynamic_pricing_setting.id
+    )
 
 
 @receiver(post_save, sender=DynamicPricingSetting, dispatch_uid="rms:rm_cache")
@@ -186,3 +104,97 @@ def rm_cache_post_save_rule(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=TimeBasedTriggerRule, dispatch_uid="rms:rm_cache")
 def rm_cache_post_delete_rule(sender, instance, **kwargs):
     DynamicPricingAdapter.invalidate_cache(instance.setting.id)
+
+
+"""
+Mark the rates depending on a changed object as dirty, only those are
+recalculated, see recalculate_dirty_rates. The scopes of a rule before it is
+updated are dirty as well, e.g. when the range of an interval base rate is
+moved.
+"""
+
+
+@receiver(pre_save, sender=IntervalBaseRate, dispatch_uid="rms:dirty_rates")
+@receiver(pre_save, sender=LeadDaysBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(pre_save, sender=WeekdayBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(pre_save, sender=MonthBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(pre_save, sender=SeasonBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(pre_save, sender=OccupancyBasedTriggerRule, dispatch_uid="rms:dirty_rates")
+@receiver(pre_save, sender=TimeBasedTriggerRule, dispatch_uid="rms:dirty_rates")
+def dirty_rates_pre_save_rule(sender, instance, **kwargs):
+    instance._original = None
+    if instance.pk is not None:
+        instance._original = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=IntervalBaseRate, dispatch_uid="rms:dirty_rates")
+@receiver(post_save, sender=LeadDaysBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_save, sender=WeekdayBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_save, sender=MonthBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_save, sender=SeasonBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_save, sender=OccupancyBasedTriggerRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_save, sender=TimeBasedTriggerRule, dispatch_uid="rms:dirty_rates")
+def dirty_rates_post_save_rule(sender, instance, created, **kwargs):
+    original = getattr(instance, "_original", None)
+    scopes = get_rule_dirty_scopes(instance)
+    if original is not None:
+        scopes += get_rule_dirty_scopes(original)
+    if isinstance(instance, LeadDaysBasedRule) and (
+        original is None or original.lead_days != instance.lead_days
+    ):
+        lead_days = instance.lead_days
+        if original is not None:
+            lead_days = min(lead_days, original.lead_days)
+        scopes.append(get_lead_days_shift_scope(lead_days))
+    mark_rates_dirty(instance.setting_id, scopes)
+
+
+@receiver(post_delete, sender=IntervalBaseRate, dispatch_uid="rms:dirty_rates")
+@receiver(post_delete, sender=LeadDaysBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_delete, sender=WeekdayBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_delete, sender=MonthBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_delete, sender=SeasonBasedRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_delete, sender=OccupancyBasedTriggerRule, dispatch_uid="rms:dirty_rates")
+@receiver(post_delete, sender=TimeBasedTriggerRule, dispatch_uid="rms:dirty_rates")
+def dirty_rates_post_delete_rule(sender, instance, **kwargs):
+    scopes = get_rule_dirty_scopes(instance)
+    if isinstance(instance, LeadDaysBasedRule):
+        scopes.append(get_lead_days_shift_scope(instance.lead_days))
+    mark_rates_dirty(instance.setting_id, scopes)
+
+
+@receiver(post_save, sender=RatePlan, dispatch_uid="rms:dirty_rates")
+def dirty_rates_post_save_rate_plan(sender, instance: RatePlan, created, **kwargs):
+    if created:
+        mark_rates_dirty(
+            instance.room_type.hotel.dynamic_pricing_setting.id,
+            [(DirtyScope.RATE_PLAN, instance.id)],
+        )
+
+
+@receiver(post_save, sender=RMSRatePlan, dispatch_uid="rms:dirty_rates")
+def dirty_rates_post_save_rms_rate_plan(
+    sender, instance: RMSRatePlan, created, **kwargs
+):
+    mark_rates_dirty(
+        instance.rate_plan.room_type.hotel.dynamic_pricing_setting.id,
+        [(DirtyScope.RATE_PLAN, instance.rate_plan_id)],
+    )
+
+
+@receiver(post_save, sender=DynamicPricingSetting, dispatch_uid="rms:dirty_rates")
+def dirty_rates_post_save_dps(sender, instance, created, **kwargs):
+    if not created:
+        mark_rates_dirty(instance.id, [(DirtyScope.ALL,)])
+
+
+@receiver(post_save, sender=RoomType, dispatch_uid="rms:rate_calendar")
+@receiver(post_delete, sender=RoomType, dispatch_uid="rms:rate_calendar")
+def rate_calendar_room_type(sender, instance: RoomType, **kwargs):
+    invalidate_rate_calendar(instance.hotel_id)
+
+
+@receiver(post_save, sender=RatePlan, dispatch_uid="rms:rate_calendar")
+@receiver(post_delete, sender=RatePlan, dispatch_uid="rms:rate_calendar")
+def rate_calendar_rate_plan(sender, instance: RatePlan, **kwargs):
+    invalidate_rate_calendar(instance.room_type.hotel_id)
@@ -0,0 +1,261 @@
+from datetime import timedelta
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from backend.pms.models import RatePlan, RatePlanRestrictions
+
+from .adapter import DynamicPricingAdapter
+from .models import (
+    DynamicPricingSetting,
+    IntervalBaseRate,
+    LeadDaysBasedRule,
+    MonthBasedRule,
+    OccupancyBasedTriggerRule,
+    RMSRatePlan,
+    SeasonBasedRule,
+    TimeBasedTriggerRule,
+    WeekdayBasedRule,
+)
+
+# The model, the setting flag, the fields that identify a rule within its
+# setting (see unique_together) and the order the rules apply in, of each kind
+# of rule keyed by its related name, see DynamicPricingAdapter.load_from_db
+RULE_KINDS = {
+    "interval_base_rates": (
+        IntervalBaseRate,
+        None,
+        None,
+        lambda rule: rule.dates.lower,
+    ),
+    "lead_days_based_rules": (
+        LeadDaysBasedRule,
+        "is_lead_days_based",
+        ("lead_days",),
+        lambda rule: rule.lead_days,
+    ),
+    "weekday_based_rules": (
+        WeekdayBasedRule,
+        "is_weekday_based",
+        ("weekday",),
+        lambda rule: rule.weekday,
+    ),
+    "month_based_rules": (
+        MonthBasedRule,
+        "is_month_based",
+        ("month",),
+        lambda rule: rule.month,
+    ),
+    "season_based_rules": (
+        SeasonBasedRule,
+        "is_season_based",
+        ("name",),
+        lambda rule: rule.name,
+    ),
+    "occupancy_based_trigger_rules": (
+        OccupancyBasedTriggerRule,
+        "is_occupancy_based",
+        ("min_occupancy",),
+        lambda rule: -rule.min_occupancy,
+    ),
+    "time_based_trigger_rules": (
+        TimeBasedTriggerRule,
+        "is_time_based",
+        ("hour", "day_ahead", "min_occupancy"),
+        lambda rule: (rule.day_ahead, -rule.hour, -rule.min_occupancy),
+    ),
+}
+RULE_FIELDS = {
+    "interval_base_rates": ("dates", "base_rate"),
+    "lead_days_based_rules": ("percentage_factor", "increment_factor"),
+    "weekday_based_rules": ("percentage_factor", "increment_factor"),
+    "month_based_rules": ("percentage_factor", "increment_factor"),
+    "season_based_rules": (
+        "start_month",
+        "start_day",
+        "end_month",
+        "end_day",
+        "percentage_factor",
+        "increment_factor",
+    ),
+    "occupancy_based_trigger_rules": (
+        "min_occupancy",
+        "increment_factor",
+        "percentage_factor",
+    ),
+    "time_based_trigger_rules": (
+        "hour",
+        "percentage_factor",
+        "increment_factor",
+        "min_occupancy",
+        "day_ahead",
+    ),
+}
+
+
+def _apply_rule_diff(
+    setting: DynamicPricingSetting, kind: str, rules: list, diff: dict
+) -> list:
+    """
+    Apply the diff of a kind of rule to its rules in memory, the created and
+    updated rules are validated like when they are saved.
+    """
+    model, _, unique_fields, _ = RULE_KINDS[kind]
+    rules = {rule.uuid: rule for rule in rules}
+    changed = []
+    for uuid in diff.get("delete", []):
+        if rules.pop(uuid, None) is None:
+            raise ValidationError(f"Unknown rule {uuid} in {kind}.")
+    for fields in diff.get("update", []):
+        rule = rules.get(fields["uuid"])
+        if rule is None:
+            raise ValidationError(f"Unknown rule {fields['uuid']} in {kind}.")
+        for name, value in fields.items():
+            if name != "uuid":
+                setattr(rule, name, value)
+        changed.append(rule)
+    for fields in diff.get("create", []):
+        rule = model(setting=setting, **fields)
+        rules[rule.uuid] = rule
+        changed.append(rule)
+
+    rules = list(rules.values())
+    for rule in changed:
+        if not isinstance(rule, IntervalBaseRate):
+            rule.validate()
+    if unique_fields is not None:
+        keys = [tuple(getattr(rule, name) for name in unique_fields) for rule in rules]
+        if len(set(keys)) != len(keys):
+            raise ValidationError(f"Duplicate {', '.join(unique_fields)} in {kind}.")
+    else:
+        # Interval base rates can't overlap, see IntervalBaseRate
+        intervals = sorted((rule.dates.lower, rule.dates.upper) for rule in rules)
+        for previous, interval in zip(intervals, intervals[1:]):
+            if interval[0] < previous[1]:
+                raise ValidationError("Date range overlaps with another interval.")
+    return rules
+
+
+def build_simulated_adapter(
+    setting: DynamicPricingSetting, diff: dict
+) -> DynamicPricingAdapter:
+    """
+    Build a dynamic pricing adapter from the current rules of a setting with
+    the given changes applied in memory, nothing is written to the database or
+    the cache.
+
+    Args:
+        setting (DynamicPricingSetting): The setting, with its hotel.
+        diff (dict): The changes, see RateSimulationSerializer.
+
+    Returns:
+        DynamicPricingAdapter: The simulated dynamic pricing adapter.
+
+    Raises:
+        ValidationError: If a changed rule is invalid.
+    """
+    # A copy, the changes must not leak to the instance of the caller
+    hotel = setting.hotel
+    setting = DynamicPricingSetting(
+        **{
+            field.attname: getattr(setting, field.attname)
+            for field in DynamicPricingSetting._meta.concrete_fields
+        }
+    )
+    setting.hotel = hotel
+    for name, value in diff.get("setting", {}).items():
+        setattr(setting, name, value)
+    # Rates are simulated whether or not they are calculated yet
+    setting.is_enabled = True
+
+    rules = {
+        "rate_plan_percentage_factors": RMSRatePlan.objects.filter(
+            rate_plan__room_type__hotel_id=setting.hotel_id
+        ).values("rate_plan__id", "percentage_factor", "increment_factor")
+    }
+    for kind, (model, flag, _, order) in RULE_KINDS.items():
+        kind_diff = diff.get(kind, {})
+        if flag is not None and not getattr(setting, flag):
+            # Not applied, the changes can't be validated either
+            if any(kind_diff.values()):
+                raise ValidationError(
+                    f"{kind.replace('_', ' ').capitalize()} are not enabled."
+                )
+            rules[kind] = []
+            continue
+        kind_rules = list(model.objects.filter(setting_id=setting.id))
+        for rule in kind_rules:
+            # Validated against the simulated setting
+            rule.setting = setting
+        if any(kind_diff.values()):
+            kind_rules = _apply_rule_diff(setting, kind, kind_rules, kind_diff)
+        kind_rules.sort(key=order)
+        rules[kind] = [
+            {name: getattr(rule, name) for name in RULE_FIELDS[kind]}
+            for rule in kind_rules
+        ]
+    return DynamicPricingAdapter.from_rules(setting, rules)
+
+
+def simulate_rates(setting: DynamicPricingSetting, diff: dict, days: int) -> dict:
+    """
+    Calculate the rates of every rate plan of a hotel as if the given changes
+    were applied, without applying them.
+
+    Args:
+        setting (DynamicPricingSetting): The setting, with its hotel.
+        diff (dict): The changes, see RateSimulationSerializer.
+        days (int): The number of days to simulate, from the local today.
+
+    Returns:
+        dict: The simulated dates and rate plans, the simulated base rates and
+            rates and the current rates (None if not stored) as rate plan x
+            date matrices.
+    """
+    adapter = build_simulated_adapter(setting, diff)
+    hotel = setting.hotel
+    current_datetime = timezone.now().astimezone(hotel.timezone)
+    start_date = current_datetime.date()
+    dates = [start_date + timedelta(days=i) for i in range(days)]
+    rate_plans = list(
+        RatePlan.objects.filter(room_type__hotel=hotel)
+        .order_by("room_type_id", "id")
+        .values("id", "uuid", "name", "room_type_id", "room_type__uuid")
+    )
+
+    room_types = sorted({rate_plan["room_type_id"] for rate_plan in rate_plans})
+    room_type_occupancies = hotel.adapter.get_room_type_occupancies(
+        room_types, (dates[0], dates[-1])
+    )
+    occupancies = np.array(
+        [room_type_occupancies[rate_plan["room_type_id"]] for rate_plan in rate_plans],
+        dtype=np.int64,
+    ).reshape(len(rate_plans), len(dates))
+    base_rates, rates = adapter.calculate_rates(
+        rate_plan_ids=[rate_plan["id"] for rate_plan in rate_plans],
+        dates=dates,
+        occupancies=occupancies,
+        current_datetime=current_datetime,
+    )
+
+    rows = {rate_plan["id"]: row for row, rate_plan in enumerate(rate_plans)}
+    current_rates = [[None] * len(dates) for _ in rate_plans]
+    for rate_plan_id, date, rate in RatePlanRestrictions.objects.filter(
+        rate_plan_id__in=rows, date__range=(dates[0], dates[-1])
+    ).values_list("rate_plan_id", "date", "rate"):
+        current_rates[rows[rate_plan_id]][(date - start_date).days] = rate
+    return {
+        "dates": dates,
+        "rate_plans": [
+            {
+                "uuid": rate_plan["uuid"],
+                "name": rate_plan["name"],
+                "room_type": rate_plan["room_type__uuid"],
+            }
+            for rate_plan in rate_plans
+        ],
+        "base_rates": base_rates.tolist(),
+        "rates": rates.tolist(),
+        "current_rates": current_rates,
+    }
@@ -1,23 +1,63 @@
-from zoneinfo import ZoneInfo
+import time
+from datetime import date, datetime, timedelta
 
-from django.db import transaction
+from celery import chord
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
 from django.utils import timezone
 
 from backend.cm.models import CMHotelConnector
-from backend.pms.models import RoomType
-from backend.rms.models import DynamicPricingSetting
+from backend.pms.models import Hotel, RatePlan, RatePlanRestrictions, RoomType
+from backend.rms.models import (
+    DynamicPricingSetting,
+    LeadDaysBasedRule,
+    RateHistory,
+    RMSRatePlanRestrictions,
+    TimeBasedTriggerRule,
+)
+from backend.utils.cache import pop_pending, push_pending
+from backend.utils.partitions import (
+    add_months,
+    create_monthly_partitions,
+    detach_monthly_partitions,
+    drop_monthly_partitions,
+)
 from config.celery_app import app
 
 from .adapter import DynamicPricingAdapter
+from .dirty import (
+    DirtyScope,
+    mark_dirty_scopes,
+    pop_dirty_scopes,
+    push_dirty_scopes,
+    resolve_dirty_scopes,
+)
+from .locks import HotelRatesLockedError, lock_hotel_rates
+from .utils import get_passed_hours
 
+logger = get_task_logger(__name__)
 
-@app.task
-def recalculate_all_rate(dynamic_pricing_setting_id: int):
-    with transaction.atomic():
-        dynamic_pricing_setting = DynamicPricingSetting.objects.get(
-            id=dynamic_pricing_setting_id
-        )
-        hotel = dynamic_pricing_setting.hotel
+
+def recalculate_hotel_rates(hotel: Hotel) -> int:
+    """
+    Recalculate the rates of the whole inventory of a hotel and push them to
+    its channel manager, in a single transaction holding the rates lock of the
+    hotel.
+
+    Args:
+        hotel (Hotel): The hotel.
+
+    Returns:
+        int: The number of updated restrictions.
+
+    Raises:
+        HotelRatesLockedError: The rates of the hotel are being recalculated.
+    """
+    with lock_hotel_rates(hotel.id):
         adapter = DynamicPricingAdapter(hotel=hotel)
         room_types = RoomType.objects.filter(hotel=hotel).values_list("id", flat=True)
         today = timezone.now().astimezone(hotel.timezone).date()
@@ -27,50 +67,633 @@ def recalculate_all_rate(dynamic_pricing_setting_id: int):
                 today,
                 today + timezone.timedelta(days=hotel.inventory_days),
             ],
+            cause=RateHistory.CauseChoices.RECALCULATION,
         )
-        if new_restrictions:
-            cm_hotel_connector = CMHotelConnector.objects.get(pms=hotel)
+        cm_hotel_connector = CMHotelConnector.objects.filter(pms=hotel).first()
+        if new_restrictions and cm_hotel_connector is not None:
             cm_hotel_connector.adapter.save_rate_plan_restrictions(
                 new_rate_plan_restrictions=new_restrictions
             )
+    return len(new_restrictions)
+
+
+def defer_hotel_rates(dynamic_pricing_setting_id: int):
+    """
+    Recalculate the whole inventory of a hotel whose rates are being
+    recalculated once the running recalculation is done. Deferred requests are
+    coalesced with the other dirty scopes of the hotel, see record_dirty_rates.
+    """
+    record_dirty_rates(dynamic_pricing_setting_id, {(DirtyScope.ALL,)})
+
+
+@app.task
+def recalculate_all_rate(dynamic_pricing_setting_id: int):
+    dynamic_pricing_setting = DynamicPricingSetting.objects.select_related("hotel").get(
+        id=dynamic_pricing_setting_id
+    )
+    try:
+        recalculate_hotel_rates(dynamic_pricing_setting.hotel)
+    except HotelRatesLockedError:
+        # The running recalculation may have started before the changes this
+        # one is for
+        defer_hotel_rates(dynamic_pricing_setting_id)
+
+
+@app.task
+def recalculate_fleet_rates(timezones: list[str] = None):
+    """
+    Recalculate the whole inventory of every enabled hotel. The hotels are
+    fanned out in chunks of RMS_FLEET_RECALCULATION_CHUNK_SIZE, each hotel in
+    its own transaction, and the throughput is reported once every chunk is
+    done, see report_fleet_recalculation.
+
+    Args:
+        timezones (list[str]): Only recalculate the hotels of these timezones,
+            every hotel by default.
+    """
+    dynamic_pricing_settings = DynamicPricingSetting.objects.filter(is_enabled=True)
+    if timezones is not None:
+        dynamic_pricing_settings = dynamic_pricing_settings.filter(
+            hotel__timezone__in=timezones
+        )
+    chunk_size = settings.RMS_FLEET_RECALCULATION_CHUNK_SIZE
+    chunks = [[]]
+    for hotel_id in (
+        dynamic_pricing_settings.order_by("hotel_id")
+        .values_list("hotel_id", flat=True)
+        .iterator(chunk_size=chunk_size)
+    ):
+        if len(chunks[-1]) == chunk_size:
+            chunks.append([])
+        chunks[-1].append(hotel_id)
+    if not chunks[-1]:
+        return
+    chord(recalculate_hotel_chunk_rates.s(chunk) for chunk in chunks)(
+        report_fleet_recalculation.s(started_at=time.time())
+    )
+
+
+@app.task
+def recalculate_hotel_chunk_rates(hotel_ids: list[int]) -> dict[str, int]:
+    stats = {"hotels": 0, "restrictions": 0, "deferred": 0, "failed": 0}
+    hotels = (
+        Hotel.objects.filter(id__in=hotel_ids)
+        .select_related("dynamic_pricing_setting")
+        .order_by("id")
+    )
+    for hotel in hotels:
+        try:
+            stats["restrictions"] += recalculate_hotel_rates(hotel)
+            stats["hotels"] += 1
+        except HotelRatesLockedError:
+            defer_hotel_rates(hotel.dynamic_pricing_setting.id)
+            stats["deferred"] += 1
+        except SoftTimeLimitExceeded:
+            # Out of time for the whole chunk, not just this hotel
+            raise
+        except Exception:
+            # The other hotels of the chunk are not affected
+            logger.exception("Failed to recalculate the rates of %s", hotel.id)
+            stats["failed"] += 1
+    return stats
+
+
+@app.task
+def report_fleet_recalculation(
+    results: list[dict[str, int]], started_at: float
+) -> dict[str, float]:
+    elapsed = max(time.time() - started_at, 1e-3)
+    stats = {
+        key: sum(result[key] for result in results)
+        for key in ("hotels", "restrictions", "deferred", "failed")
+    }
+    stats["seconds"] = elapsed
+    stats["hotels_per_second"] = stats["hotels"] / elapsed
+    stats["restrictions_per_second"] = stats["restrictions"] / elapsed
+    logger.info(
+        "Recalculated %(hotels)d hotels (%(deferred)d deferred, %(failed)d "
+        "failed) and %(restrictions)d restrictions in %(seconds).1fs, %(hotels_per_second).1f hotels/s, "
+        "%(restrictions_per_second).1f restrictions/s",
+        stats,
+    )
+    return stats
+
+
+LEAD_DAYS_ROLLED_AT_KEY = "rms:lead_days:rolled_at"
+
+
+@app.task
+def roll_lead_days():
+    """
+    Recalculate the hotels whose local day started since the previous roll,
+    the lead days of all of their dates shifted. Scheduled every 15 minutes,
+    the local day of some timezones starts at a quarter past the hour.
+    """
+    now = timezone.now()
+    rolled_at = cache.get(LEAD_DAYS_ROLLED_AT_KEY)
+    if rolled_at is None:
+        rolled_at = now - timedelta(minutes=15)
+    rolled_at = max(rolled_at, now - timedelta(days=1))
+    cache.set(LEAD_DAYS_ROLLED_AT_KEY, now, None)
+
+    timezones = (
+        Hotel.objects.filter(dynamic_pricing_setting__is_enabled=True)
+        .values_list("timezone", flat=True)
+        .distinct()
+    )
+    rolled_timezones = [
+        str(zone_info)
+        for zone_info in timezones
+        if any(hour == 0 for _, hour in get_passed_hours(zone_info, rolled_at, now))
+    ]
+    if rolled_timezones:
+        recalculate_fleet_rates.delay(timezones=rolled_timezones)
 
 
 @app.task
 def handle_occupancy_based_trigger(
     hotel_id: int, room_types: list[int], dates: tuple[str, str]
 ):
-    with transaction.atomic():
-        adapter = DynamicPricingAdapter(hotel=hotel_id)
-        new_restrictions = adapter.calculate_and_update_rates(
-            room_types=room_types,
-            dates=(
-                timezone.datetime.strptime(dates[0], "%Y-%m-%d").date(),
-                timezone.datetime.strptime(dates[1], "%Y-%m-%d").date(),
-            ),
+    try:
+        with lock_hotel_rates(hotel_id):
+            adapter = DynamicPricingAdapter(hotel=hotel_id)
+            new_restrictions = adapter.calculate_and_update_rates(
+                room_types=room_types,
+                dates=(
+                    timezone.datetime.strptime(dates[0], "%Y-%m-%d").date(),
+                    timezone.datetime.strptime(dates[1], "%Y-%m-%d").date(),
+                ),
+                cause=RateHistory.CauseChoices.OCCUPANCY,
+            )
+            if new_restrictions:
+                cm_hotel_connector = CMHotelConnector.objects.get(pms=hotel_id)
+                cm_hotel_connector.adapter.save_rate_plan_restrictions(
+                    new_rate_plan_restrictions=new_restrictions
+                )
+    except HotelRatesLockedError:
+        # Handled along with the pending triggers of the hotel once the
+        # running recalculation is done
+        schedule_occupancy_based_trigger(hotel_id, room_types, dates)
+
+
+def get_occupancy_based_triggers_key(hotel_id: int) -> str:
+    return f"rms:occupancy:{hotel_id}"
+
+
+def schedule_occupancy_based_trigger(
+    hotel_id: int, room_types: list[int], dates: tuple[str, str]
+):
+    """
+    Coalesce an occupancy based trigger with the other ones of the hotel, they
+    are handled together once the current transaction is committed and
+    RMS_OCCUPANCY_TRIGGER_DELAY seconds passed, see
+    handle_pending_occupancy_based_triggers.
+
+    Args:
+        hotel_id (int): The hotel id.
+        room_types (list[int]): The room types whose occupancy changed.
+        dates (tuple[str, str]): The range of dates whose occupancy changed.
+    """
+    trigger = (list(room_types), tuple(dates))
+    transaction.on_commit(
+        lambda: push_occupancy_based_triggers(
+            hotel_id, [trigger], settings.RMS_OCCUPANCY_TRIGGER_DELAY
         )
-        if new_restrictions:
-            cm_hotel_connector = CMHotelConnector.objects.get(pms=hotel_id)
-            cm_hotel_connector.adapter.save_rate_plan_restrictions(
-                new_rate_plan_restrictions=new_restrictions
+    )
+
+
+def push_occupancy_based_triggers(hotel_id: int, triggers: list, delay: int):
+    """
+    Push triggers to the pending ones of a hotel, and schedule them to be
+    handled in delay seconds unless they already are.
+    """
+    key = get_occupancy_based_triggers_key(hotel_id)
+    scheduled = [
+        push_pending(key, trigger, schedule_timeout=delay + 60) for trigger in triggers
+    ]
+    if any(scheduled):
+        handle_pending_occupancy_based_triggers.apply_async(
+            args=(hotel_id,), countdown=delay
+        )
+
+
+@app.task
+def handle_pending_occupancy_based_triggers(hotel_id: int):
+    triggers = []
+    try:
+        with lock_hotel_rates(hotel_id):
+            triggers = pop_pending(get_occupancy_based_triggers_key(hotel_id))
+            if triggers:
+                handle_occupancy_based_triggers(hotel_id, triggers)
+    except HotelRatesLockedError:
+        # The triggers stay pending, they are handled along with the ones
+        # coming in meanwhile
+        handle_pending_occupancy_based_triggers.apply_async(
+            args=(hotel_id,), countdown=settings.RMS_HOTEL_LOCK_RETRY_DELAY
+        )
+    except Exception:
+        # The recalculation was rolled back but the triggers were popped, they
+        # are pushed back to be retried
+        push_occupancy_based_triggers(
+            hotel_id, triggers, settings.RMS_OCCUPANCY_TRIGGER_RETRY_DELAY
+        )
+        raise
+
+
+def handle_occupancy_based_triggers(hotel_id: int, triggers: list):
+    if None in triggers:
+        # We can't tell what changed, recalculate the whole inventory
+        hotel = Hotel.objects.get(id=hotel_id)
+        today = timezone.now().astimezone(hotel.timezone).date()
+        room_types = set(
+            RoomType.objects.filter(hotel=hotel).values_list("id", flat=True)
+        )
+        start_date = today.isoformat()
+        end_date = (today + timezone.timedelta(days=hotel.inventory_days)).isoformat()
+    else:
+        room_types = {room_type for trigger in triggers for room_type in trigger[0]}
+        # Dates are ISO formatted, so they compare as dates
+        start_date = min(trigger[1][0] for trigger in triggers)
+        end_date = max(trigger[1][1] for trigger in triggers)
+    handle_occupancy_based_trigger(
+        hotel_id=hotel_id,
+        room_types=sorted(room_types),
+        dates=(start_date, end_date),
+    )
+
+
+TIME_BASED_TRIGGERS_SWEPT_AT_KEY = "rms:time_based_triggers:swept_at"
+
+
+def get_time_based_triggers(start: datetime, end: datetime) -> dict[int, set[date]]:
+    """
+    Get the dates to recalculate for the time based trigger rules whose local
+    hour started within a period.
+
+    Args:
+        start (datetime): The start of the period, exclusive.
+        end (datetime): The end of the period, inclusive.
+
+    Returns:
+        dict[int, set[date]]: The dates to recalculate by hotel id.
+    """
+    timezones = (
+        Hotel.objects.filter(
+            dynamic_pricing_setting__is_enabled=True,
+            dynamic_pricing_setting__is_time_based=True,
+        )
+        .values_list("timezone", flat=True)
+        .distinct()
+    )
+    # Local dates of the hours that just passed, by timezone and hour
+    trigger_dates = {}
+    query = Q()
+    for zone_info in timezones:
+        passed_hours = get_passed_hours(zone_info, start, end)
+        if not passed_hours:
+            continue
+        for trigger_date, hour in passed_hours:
+            trigger_dates.setdefault((str(zone_info), hour), []).append(trigger_date)
+        query |= Q(
+            setting__hotel__timezone=zone_info,
+            hour__in={hour for _, hour in passed_hours},
+        )
+    if not trigger_dates:
+        return {}
+
+    triggers = {}
+    rules = (
+        TimeBasedTriggerRule.objects.filter(
+            query,
+            setting__is_enabled=True,
+            setting__is_time_based=True,
+        )
+        .values_list(
+            "setting__hotel_id", "setting__hotel__timezone", "hour", "day_ahead"
+        )
+        .distinct()
+    )
+    for hotel_id, zone_info, hour, day_ahead in rules:
+        for trigger_date in trigger_dates[(str(zone_info), hour)]:
+            triggers.setdefault(hotel_id, set()).add(
+                trigger_date + timedelta(days=day_ahead)
             )
+    return triggers
 
 
 @app.task
-def handle_time_based_trigger(hotel_id: int, day_ahead: int, zone_info: str):
-    with transaction.atomic():
-        date = (
-            timezone.now().astimezone(ZoneInfo(zone_info))
-            + timezone.timedelta(days=day_ahead)
-        ).date()
+def sweep_time_based_triggers():
+    """
+    Recalculate the rates of the hotels whose time based trigger rules' local
+    hour started since the previous sweep, in batches of
+    RMS_TIME_BASED_TRIGGER_BATCH_SIZE hotels. Scheduled every 15 minutes, the
+    local hours of some timezones start at a quarter past the UTC hour.
+    """
+    now = timezone.now()
+    swept_at = cache.get(TIME_BASED_TRIGGERS_SWEPT_AT_KEY)
+    if swept_at is None:
+        swept_at = now - timedelta(minutes=15)
+    # Hours missed for longer don't need to be caught up, the rates are
+    # calculated for the current time anyway
+    swept_at = max(swept_at, now - timedelta(days=1))
+    cache.set(TIME_BASED_TRIGGERS_SWEPT_AT_KEY, now, None)
+
+    triggers = sorted(get_time_based_triggers(swept_at, now).items())
+    batch_size = settings.RMS_TIME_BASED_TRIGGER_BATCH_SIZE
+    for start in range(0, len(triggers), batch_size):
+        end = start + batch_size
+        handle_time_based_triggers.delay(
+            [
+                (hotel_id, [date.isoformat() for date in sorted(dates)])
+                for hotel_id, dates in triggers[start:end]
+            ]
+        )
+
+
+@app.task
+def handle_time_based_triggers(triggers: list[tuple[int, list[str]]]):
+    for hotel_id, dates in triggers:
+        try:
+            handle_time_based_trigger(hotel_id, dates)
+        except HotelRatesLockedError:
+            # Triggered on its own once the running recalculation is done
+            handle_time_based_triggers.apply_async(
+                args=([(hotel_id, dates)],),
+                countdown=settings.RMS_HOTEL_LOCK_RETRY_DELAY,
+            )
+        except SoftTimeLimitExceeded:
+            # Out of time for the whole batch, not just this hotel
+            raise
+        except Exception:
+            # The other hotels of the batch are not affected
+            logger.exception("Failed to handle time based trigger of %s", hotel_id)
+
+
+def handle_time_based_trigger(hotel_id: int, dates: list[str]):
+    recalculate_hotel_dates(
+        hotel_id,
+        [date.fromisoformat(value) for value in dates],
+        cause=RateHistory.CauseChoices.TIME,
+    )
+
+
+def recalculate_hotel_dates(hotel_id: int, dates: list[date], cause: int):
+    """
+    Recalculate the rates of some dates of a hotel and push them to its
+    channel manager, holding the rates lock of the hotel.
+
+    Args:
+        hotel_id (int): The hotel id.
+        dates (list[date]): The dates, sorted.
+        cause (int): Why, see RateHistory.CauseChoices.
+
+    Raises:
+        HotelRatesLockedError: The rates of the hotel are being recalculated.
+    """
+    with lock_hotel_rates(hotel_id):
         adapter = DynamicPricingAdapter(hotel=hotel_id)
         room_types = RoomType.objects.filter(hotel_id=hotel_id).values_list(
             "id", flat=True
         )
         new_restrictions = adapter.calculate_and_update_rates(
-            room_types=room_types, dates=[date, date]
+            room_types=room_types,
+            dates=(dates[0], dates[-1]),
+            only_dates=dates,
+            cause=cause,
         )
-        if new_restrictions:
-            cm_hotel_connector = CMHotelConnector.objects.get(pms=hotel_id)
+        cm_hotel_connector = CMHotelConnector.objects.filter(pms=hotel_id).first()
+        if new_restrictions and cm_hotel_connector is not None:
             cm_hotel_connector.adapter.save_rate_plan_restrictions(
                 new_rate_plan_restrictions=new_restrictions
             )
+
+
+def record_dirty_rates(dynamic_pricing_setting_id: int, scopes: set[tuple]):
+    """
+    Store the dirty scopes of a setting and schedule their recalculation,
+    unless it is already scheduled. Scopes recorded within the delay are
+    recalculated together.
+    """
+    delay = settings.RMS_DIRTY_RATES_DELAY
+    if push_dirty_scopes(dynamic_pricing_setting_id, scopes, delay + 60):
+        recalculate_dirty_rates.apply_async(
+            args=(dynamic_pricing_setting_id,), countdown=delay
+        )
+
+
+def mark_rates_dirty(dynamic_pricing_setting_id: int, scopes: list[tuple]):
+    """
+    Mark the rates of the given scopes as dirty once the current transaction
+    is committed, see DirtyScope.
+    """
+    mark_dirty_scopes(dynamic_pricing_setting_id, scopes, record_dirty_rates)
+
+
+@app.task
+def recalculate_dirty_rates(dynamic_pricing_setting_id: int):
+    hotel_id = (
+        DynamicPricingSetting.objects.filter(id=dynamic_pricing_setting_id)
+        .values_list("hotel_id", flat=True)
+        .first()
+    )
+    # Deleting a hotel dirties the rates of its rules on the way
+    if hotel_id is None:
+        pop_dirty_scopes(dynamic_pricing_setting_id)
+        return
+    try:
+        with lock_hotel_rates(hotel_id):
+            scopes = pop_dirty_scopes(dynamic_pricing_setting_id)
+            if scopes:
+                recalculate_dirty_scopes(dynamic_pricing_setting_id, scopes)
+    except HotelRatesLockedError:
+        # The scopes stay dirty, they are recalculated along with the ones
+        # dirtied meanwhile
+        recalculate_dirty_rates.apply_async(
+            args=(dynamic_pricing_setting_id,),
+            countdown=settings.RMS_HOTEL_LOCK_RETRY_DELAY,
+        )
+
+
+def recalculate_dirty_scopes(dynamic_pricing_setting_id: int, scopes: set[tuple]):
+    dynamic_pricing_setting = DynamicPricingSetting.objects.select_related("hotel").get(
+        id=dynamic_pricing_setting_id
+    )
+    hotel = dynamic_pricing_setting.hotel
+    adapter = DynamicPricingAdapter(setting=dynamic_pricing_setting)
+    if not adapter.is_enabled:
+        return
+    room_types = RoomType.objects.filter(hotel=hotel).values_list("id", flat=True)
+    today = timezone.now().astimezone(hotel.timezone).date()
+    window = (today, today + timezone.timedelta(days=hotel.inventory_days))
+    dirty_dates, dirty_rate_plans = resolve_dirty_scopes(
+        scopes,
+        dates=window,
+        # The adapter counts lead days and days ahead from the local date too
+        current_date=today,
+        lead_days=(
+            list(
+                LeadDaysBasedRule.objects.filter(setting=dynamic_pricing_setting)
+                .order_by("lead_days")
+                .values_list("lead_days", flat=True)
+            )
+            if adapter.is_lead_days_based
+            else []
+        ),
+    )
+
+    new_restrictions = []
+    if dirty_dates:
+        is_whole_window = len(dirty_dates) == (window[1] - window[0]).days + 1
+        new_restrictions += adapter.calculate_and_update_rates(
+            room_types=room_types,
+            dates=(dirty_dates[0], dirty_dates[-1]),
+            only_dates=None if is_whole_window else dirty_dates,
+            cause=RateHistory.CauseChoices.RULE_CHANGE,
+        )
+    if dirty_rate_plans:
+        # Restrictions are reloaded, those updated above are left as is
+        new_restrictions += adapter.calculate_and_update_rates(
+            room_types=room_types,
+            dates=window,
+            rate_plans=list(dirty_rate_plans),
+            cause=RateHistory.CauseChoices.RULE_CHANGE,
+        )
+    # Rule changes are tracked whether or not the hotel is connected yet
+    cm_hotel_connector = CMHotelConnector.objects.filter(pms=hotel).first()
+    if new_restrictions and cm_hotel_connector is not None:
+        cm_hotel_connector.adapter.save_rate_plan_restrictions(
+            new_rate_plan_restrictions=new_restrictions
+        )
+
+
+@app.task
+def maintain_rate_history_partitions():
+    """
+    Create the rate history partitions of the coming months and drop the ones
+    past the retention, dropping a partition is much cheaper than deleting its
+    rows. Scheduled daily.
+    """
+    table = RateHistory._meta.db_table
+    this_month = timezone.now().date()
+    created = create_monthly_partitions(
+        table, this_month, settings.RMS_RATE_HISTORY_PARTITIONS_AHEAD + 1
+    )
+    dropped = drop_monthly_partitions(
+        table, add_months(this_month, -settings.RMS_RATE_HISTORY_RETENTION_MONTHS)
+    )
+    logger.info("Rate history partitions created: %s, dropped: %s", created, dropped)
+
+
+@app.task
+def maintain_restriction_partitions():
+    """
+    Create the restriction partitions of the coming months and detach the ones
+    past the retention to be archived, detaching a partition is much cheaper
+    than deleting its rows. The RMS restrictions reference the restrictions,
+    so their partitions are detached first. Scheduled daily.
+    """
+    tables = [
+        RMSRatePlanRestrictions._meta.db_table,
+        RatePlanRestrictions._meta.db_table,
+    ]
+    this_month = timezone.now().date()
+    before = add_months(this_month, -settings.RATE_PLAN_RESTRICTIONS_RETENTION_MONTHS)
+    created = []
+    detached = []
+    for table in reversed(tables):
+        created += create_monthly_partitions(
+            table, this_month, settings.RATE_PLAN_RESTRICTIONS_PARTITIONS_AHEAD + 1
+        )
+    for table in tables:
+        detached += detach_monthly_partitions(table, before)
+    logger.info("Restriction partitions created: %s, detached: %s", created, detached)
+
+
+def insert_missing_restrictions() -> dict[int, list[date]]:
+    """
+    Insert the restrictions of the dates that entered the inventory window of
+    every rate plan, from the day after its last restriction to the local
+    today + inventory days of its hotel, in a single INSERT ... SELECT. The
+    rms_rateplan_restrictions_insert trigger fires for each inserted row.
+
+    Returns:
+        dict[int, list[date]]: The sorted inserted dates by hotel id.
+    """
+    restriction_table = RatePlanRestrictions._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH inserted AS (
+                INSERT INTO {restriction_table}
+                    (uuid, rate_plan_id, date, rate, created_at, updated_at)
+                SELECT gen_random_uuid(), rate_plan.id, day::date, 0, now(), now()
+                FROM {RatePlan._meta.db_table} rate_plan
+                JOIN {RoomType._meta.db_table} room_type
+                    ON room_type.id = rate_plan.room_type_id
+                JOIN {Hotel._meta.db_table} hotel ON hotel.id = room_type.hotel_id
+                CROSS JOIN LATERAL (
+                    SELECT (now() AT TIME ZONE hotel.timezone)::date AS today
+                ) local
+                CROSS JOIN LATERAL (
+                    SELECT max(restriction.date) AS last_date
+                    FROM {restriction_table} restriction
+                    WHERE restriction.rate_plan_id = rate_plan.id
+                ) last
+                CROSS JOIN LATERAL generate_series(
+                    greatest(local.today, last.last_date + 1),
+                    local.today + hotel.inventory_days,
+                    interval '1 day'
+                ) day
+                ON CONFLICT (rate_plan_id, date) DO NOTHING
+                RETURNING rate_plan_id, date
+            )
+            SELECT room_type.hotel_id, array_agg(DISTINCT inserted.date)
+            FROM inserted
+            JOIN {RatePlan._meta.db_table} rate_plan
+                ON rate_plan.id = inserted.rate_plan_id
+            JOIN {RoomType._meta.db_table} room_type
+                ON room_type.id = rate_plan.room_type_id
+            GROUP BY room_type.hotel_id
+            """
+        )
+        return {hotel_id: sorted(dates) for hotel_id, dates in cursor.fetchall()}
+
+
+@app.task
+def extend_inventory_windows():
+    """
+    Top up the inventory window of every rate plan as days pass and price the
+    new dates only, in batches of RMS_FLEET_RECALCULATION_CHUNK_SIZE hotels.
+    Scheduled hourly, so the window of each hotel is extended shortly after
+    its local midnight, rate plans already covered are skipped.
+    """
+    new_dates = sorted(insert_missing_restrictions().items())
+    logger.info("Extended the inventory window of %s hotels", len(new_dates))
+    chunk_size = settings.RMS_FLEET_RECALCULATION_CHUNK_SIZE
+    hotels = [
+        (hotel_id, [value.isoformat() for value in dates])
+        for hotel_id, dates in new_dates
+    ]
+    for start in range(0, len(hotels), chunk_size):
+        end = start + chunk_size
+        price_new_restrictions.delay(hotels[start:end])
+
+
+@app.task
+def price_new_restrictions(hotels: list[tuple[int, list[str]]]):
+    for hotel_id, dates in hotels:
+        try:
+            recalculate_hotel_dates(
+                hotel_id,
+                [date.fromisoformat(value) for value in dates],
+                cause=RateHistory.CauseChoices.WINDOW_EXTENSION,
+            )
+        except HotelRatesLockedError:
+            price_new_restrictions.apply_async(
+                args=([(hotel_id, dates)],),
+                countdown=settings.RMS_HOTEL_LOCK_RETRY_DELAY,
+            )
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception:
+            logger.exception("Failed to price the new restrictions of %s", hotel_id)
@@ -1,24 +1,34 @@
 import datetime
 from zoneinfo import ZoneInfo
 
+import numpy as np
 import pytest
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import InternalError, transaction
 from django.utils import timezone
 
 from backend.pms.models import Booking, BookingRoom, RatePlanRestrictions
 
 from ..adapter import DynamicPricingAdapter, FactorChoices
-from ..models import LeadDaysBasedRule
+from ..models import (
+    LeadDaysBasedRule,
+    MonthBasedRule,
+    RateHistory,
+    RateTrace,
+    WeekdayBasedRule,
+)
 
 
 def test_dynamic_pricing_adapter_cache(
     hotel_factory,
     room_type_factory,
     django_assert_num_queries,
+    django_capture_on_commit_callbacks,
 ):
-    hotel = hotel_factory()
-    room_type_factory.create_batch(2, hotel=hotel)
+    with django_capture_on_commit_callbacks(execute=True):
+        hotel = hotel_factory()
+        room_type_factory.create_batch(2, hotel=hotel)
     adapter = DynamicPricingAdapter(hotel=hotel)
     db_weekday_based_rules = adapter.weekday_based_rules
     db_month_based_rules = adapter.month_based_rules
@@ -35,10 +45,58 @@ def test_dynamic_pricing_adapter_cache(
         assert adapter.occupancy_based_trigger_rules == db_occupancy_based_trigger_rules
         assert adapter.lead_days_based_rules == db_lead_days_based_rules
         assert adapter.time_based_trigger_rules == db_time_based_trigger_rules
-    adapter.invalidate_cache(setting_id=hotel.dynamic_pricing_setting.id)
-    assert not cache.get(
-        adapter.get_cache_key(setting_id=hotel.dynamic_pricing_setting.id)
-    )
+    cache_key = adapter.get_cache_key(setting_id=setting.id)
+    assert cache.get(cache_key)
+    # The cache is invalidated on commit
+    with django_capture_on_commit_callbacks(execute=True):
+        adapter.invalidate_cache(setting_id=setting.id)
+        assert cache.get(cache_key)
+    assert not cache.get(cache_key)
+    assert not cache.get(adapter.get_cache_key(setting_id=setting.id))
+
+
+def test_dynamic_pricing_adapter_factor_calendar(
+    hotel_factory,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        hotel = hotel_factory()
+        setting = hotel.dynamic_pricing_setting
+        setting.is_weekday_based = True
+        setting.save()
+    today = timezone.now().date()
+
+    adapter = DynamicPricingAdapter(hotel=hotel)
+    calendar = adapter.get_factor_calendar(today, 10)
+    assert calendar["start_date"] == today
+    assert calendar["factors"].shape[1] > hotel.inventory_days
+    assert not calendar["factors"].any()
+
+    with django_assert_num_queries(0):
+        adapter = DynamicPricingAdapter(setting=setting)
+        assert (adapter.get_factor_calendar(today, 10)["factors"] == 0).all()
+
+    # Saving a rule invalidates the calendar
+    calendar_cache_key = adapter.get_factor_calendar_cache_key(setting.id)
+    with django_capture_on_commit_callbacks(execute=True):
+        rule = WeekdayBasedRule.objects.get(
+            setting=setting, weekday=today.weekday() + 1
+        )
+        rule.increment_factor = 15
+        rule.save()
+    assert not cache.get(calendar_cache_key)
+
+    adapter = DynamicPricingAdapter(setting=setting)
+    factors = adapter.get_factor_calendar(today, 10)["factors"]
+    assert factors[1, 0] == 15
+    assert factors[1, 7] == 15
+    assert factors[1, 1:7].tolist() == [0] * 6
+
+    # The calendar is rebuilt when the day rolls over
+    tomorrow = today + timezone.timedelta(days=1)
+    factors = adapter.get_factor_calendar(tomorrow, 10)["factors"]
+    assert factors[1, 6] == 15
 
 
 def test_dynamic_pricing_adapter_default():
@@ -61,6 +119,32 @@ def test_dynamic_pricing_adapter_interval_base_rate(
     assert adapter.get_base_rate(date=start_date) == interval_base_rate.base_rate
 
 
+def test_dynamic_pricing_adapter_interval_base_rate_index(
+    interval_base_rate_factory, hotel_factory
+):
+    hotel = hotel_factory()
+    setting = hotel.dynamic_pricing_setting
+    setting.default_base_rate = 100
+    setting.save()
+    today = timezone.now().date()
+    for start, end, base_rate in ((20, 30, 300), (0, 5, 200), (5, 10, 250)):
+        interval_base_rate_factory(
+            setting=setting,
+            dates=(
+                today + timezone.timedelta(days=start),
+                today + timezone.timedelta(days=end),
+            ),
+            base_rate=base_rate,
+        )
+    adapter = DynamicPricingAdapter(hotel=hotel)
+
+    dates = [today + timezone.timedelta(days=i) for i in range(-2, 35)]
+    expected = [100] * 2 + [200] * 5 + [250] * 5 + [100] * 10 + [300] * 10
+    expected += [100] * 5
+    assert [adapter.get_base_rate(date) for date in dates] == expected
+    assert adapter.get_base_rate_array(dates).tolist() == expected
+
+
 def test_dynamic_pricing_adapter_rate_plan_factor(rate_plan_factory):
     rate_plan = rate_plan_factory()
     hotel = rate_plan.room_type.hotel
@@ -300,6 +384,90 @@ def test_dynamic_pricing_adapter_time_based(hotel_factory, time_based_rule_facto
     ) == (50, FactorChoices.PERCENTAGE)
 
 
+def test_dynamic_pricing_adapter_trigger_tables(
+    hotel_factory, occupancy_based_rule_factory, time_based_rule_factory
+):
+    hotel = hotel_factory(timezone="America/New_York")
+    setting = hotel.dynamic_pricing_setting
+    setting.is_occupancy_based = True
+    setting.is_time_based = True
+    setting.save()
+    for min_occupancy, percentage_factor in [(2, 5), (5, 10), (9, 15)]:
+        occupancy_based_rule_factory(
+            setting=setting,
+            min_occupancy=min_occupancy,
+            percentage_factor=percentage_factor,
+            increment_factor=0,
+        )
+    for day_ahead, hour, min_occupancy, increment_factor in [
+        (0, 1, 3, 100),
+        (0, 2, 6, 200),
+        (0, 9, 1, 300),
+        (0, 9, 8, 400),
+        (1, 0, 4, 500),
+        (1, 22, 2, 600),
+    ]:
+        time_based_rule_factory(
+            setting=setting,
+            day_ahead=day_ahead,
+            hour=hour,
+            min_occupancy=min_occupancy,
+            increment_factor=increment_factor,
+        )
+    adapter = DynamicPricingAdapter(hotel=hotel)
+    tz = ZoneInfo("America/New_York")
+
+    def expected_occupancy_based_factor(occupancy):
+        for rule in adapter.occupancy_based_trigger_rules:
+            if occupancy >= rule["min_occupancy"]:
+                return adapter._factor_to_repr(rule)
+        return (0, FactorChoices.PERCENTAGE)
+
+    def expected_time_based_factor(date, current_datetime, occupancy):
+        for rule in adapter.time_based_trigger_rules:
+            trigger_datetime = datetime.datetime.combine(
+                date - datetime.timedelta(days=rule["day_ahead"]),
+                datetime.time(rule["hour"]),
+                tzinfo=tz,
+            )
+            if current_datetime >= trigger_datetime and (
+                occupancy >= rule["min_occupancy"]
+            ):
+                return adapter._factor_to_repr(rule)
+        return (0, FactorChoices.PERCENTAGE)
+
+    for occupancy in range(12):
+        assert adapter.get_occupancy_based_factor(
+            occupancy
+        ) == expected_occupancy_based_factor(occupancy)
+
+    # Every hour around the spring forward and fall back transitions
+    occupancies = np.tile(np.arange(12)[:, None], (1, 2))
+    for start in (datetime.datetime(2023, 3, 11), datetime.datetime(2023, 11, 4)):
+        current_datetime = start.replace(tzinfo=datetime.timezone.utc)
+        for _ in range(72):
+            local_date = current_datetime.astimezone(tz).date()
+            dates = [local_date, local_date + datetime.timedelta(days=1)]
+            percentages, increments = adapter.get_time_based_factor_arrays(
+                dates, current_datetime.astimezone(tz), occupancies
+            )
+            for column, date in enumerate(dates):
+                for occupancy in range(12):
+                    expected = expected_time_based_factor(
+                        date, current_datetime, occupancy
+                    )
+                    assert (
+                        adapter.get_time_based_factor(
+                            date, current_datetime.astimezone(tz), occupancy
+                        )
+                        == expected
+                    )
+                    # All time based rules above are increments
+                    assert increments[occupancy, column] == expected[0]
+                    assert percentages[occupancy, column] == 0
+            current_datetime += datetime.timedelta(hours=1)
+
+
 def test_dynamic_pricing_adapter_calculate_rate(
     rate_plan_factory,
     occupancy_based_rule_factory,
@@ -443,8 +611,178 @@ def test_calculate_and_update_rates(
         RatePlanRestrictions.objects.get(rate_plan=rate_plan, date=end_date).rate == 120
     )
 
+    # Every change is recorded
+    restriction = RatePlanRestrictions.objects.get(rate_plan=rate_plan, date=end_date)
+    history = RateHistory.objects.get(restriction_id=restriction.id)
+    assert history.new_rate == 120
+    assert history.base_rate == 120
+    assert history.cause == RateHistory.CauseChoices.UNKNOWN
+    assert RateHistory.objects.count() == 3
+
     # Nothing should happen
     assert not adapter.calculate_and_update_rates(
         room_types=[rate_plan.room_type.id],
         dates=[start_date, end_date],
     )
+    assert RateHistory.objects.count() == 3
+
+
+def test_calculate_and_update_rates_trace(
+    settings,
+    rate_plan_factory,
+    occupancy_based_rule_factory,
+):
+    rate_plan = rate_plan_factory()
+    hotel = rate_plan.room_type.hotel
+    setting = hotel.dynamic_pricing_setting
+    setting.default_base_rate = 100
+    setting.is_enabled = True
+    setting.is_weekday_based = True
+    setting.is_occupancy_based = True
+    setting.save()
+    occupancy_based_rule_factory(setting=setting, min_occupancy=0, increment_factor=7)
+    for rule in WeekdayBasedRule.objects.filter(setting=setting):
+        rule.percentage_factor = 10
+        rule.save()
+    adapter = DynamicPricingAdapter(hotel=hotel)
+    start_date = timezone.now().astimezone(hotel.timezone).date()
+    end_date = start_date + timezone.timedelta(days=2)
+
+    # Off by default
+    adapter.calculate_and_update_rates(
+        room_types=[rate_plan.room_type.id], dates=[start_date, end_date]
+    )
+    assert not RateTrace.objects.exists()
+
+    settings.RMS_RATE_TRACE_SAMPLE_RATE = 1
+    adapter.calculate_and_update_rates(
+        room_types=[rate_plan.room_type.id], dates=[start_date, end_date]
+    )
+    traces = RateTrace.objects.filter(rate_plan=rate_plan).order_by("date")
+    assert [trace.date for trace in traces] == [
+        start_date + timezone.timedelta(days=i) for i in range(3)
+    ]
+    for trace in traces:
+        assert trace.base_rate == 100
+        assert trace.restriction_base_rate == 110
+        assert trace.rate == 117
+        assert trace.percentage_factors == [0, 0, 10, 0, 0, 0, 0]
+        assert trace.increment_factors == [0, 0, 0, 0, 0, 7, 0]
+        assert (
+            RatePlanRestrictions.objects.get(rate_plan=rate_plan, date=trace.date).rate
+            == trace.rate
+        )
+
+    # Append only
+    with pytest.raises(InternalError):
+        with transaction.atomic():
+            RateTrace.objects.filter(rate_plan=rate_plan).update(rate=0)
+
+
+def test_calculate_rates_by_factor_arrays():
+    base_rates = np.arange(1, 1000, 7)
+    for percentage_sum in range(-100, 201, 3):
+        for increment_sum in (-50, 0, 25):
+            rates = DynamicPricingAdapter._calculate_rates_by_factor_arrays(
+                base_rates, np.int64(percentage_sum), np.int64(increment_sum)
+            )
+            assert rates.tolist() == [
+                DynamicPricingAdapter._calculate_rate_by_factors(
+                    int(base_rate),
+                    [
+                        (percentage_sum, FactorChoices.PERCENTAGE),
+                        (increment_sum, FactorChoices.INCREMENT),
+                    ],
+                )
+                for base_rate in base_rates
+            ]
+
+
+def test_calculate_rates(
+    rate_plan_factory,
+    interval_base_rate_factory,
+    season_based_rule_factory,
+    occupancy_based_rule_factory,
+    time_based_rule_factory,
+):
+    rate_plan = rate_plan_factory()
+    room_type = rate_plan.room_type
+    other_rate_plan = rate_plan_factory(room_type=room_type)
+    hotel = room_type.hotel
+    setting = hotel.dynamic_pricing_setting
+    setting.default_base_rate = 133
+    setting.is_enabled = True
+    setting.is_lead_days_based = True
+    setting.is_weekday_based = True
+    setting.is_month_based = True
+    setting.is_season_based = True
+    setting.is_occupancy_based = True
+    setting.is_time_based = True
+    setting.save()
+
+    other_rate_plan.rms.increment_factor = 25
+    other_rate_plan.rms.save()
+    rate_plan.rms.percentage_factor = -15
+    rate_plan.rms.save()
+
+    today = timezone.now().date()
+    interval_base_rate_factory(
+        setting=setting,
+        dates=(today + timezone.timedelta(days=3), today + timezone.timedelta(days=9)),
+        base_rate=217,
+    )
+    LeadDaysBasedRule.objects.filter(setting=setting, lead_days__lte=5).update(
+        percentage_factor=7
+    )
+    WeekdayBasedRule.objects.filter(setting=setting, weekday=6).update(
+        percentage_factor=13
+    )
+    WeekdayBasedRule.objects.filter(setting=setting, weekday=7).update(
+        increment_factor=40
+    )
+    MonthBasedRule.objects.filter(setting=setting).update(percentage_factor=3)
+    season_start = today + timezone.timedelta(days=10)
+    season_end = today + timezone.timedelta(days=20)
+    season_based_rule_factory(
+        setting=setting,
+        start_day=season_start.day,
+        start_month=season_start.month,
+        end_day=season_end.day,
+        end_month=season_end.month,
+        percentage_factor=33,
+    )
+    occupancy_based_rule_factory(setting=setting, min_occupancy=2, percentage_factor=9)
+    occupancy_based_rule_factory(setting=setting, min_occupancy=5, increment_factor=70)
+    time_based_rule_factory(
+        setting=setting, hour=0, day_ahead=0, min_occupancy=1, percentage_factor=11
+    )
+    time_based_rule_factory(
+        setting=setting, hour=0, day_ahead=1, min_occupancy=3, increment_factor=15
+    )
+
+    adapter = DynamicPricingAdapter(hotel=hotel)
+    current_datetime = timezone.now()
+    dates = [today + timezone.timedelta(days=i) for i in range(30)]
+    rate_plan_ids = [rate_plan.id, other_rate_plan.id]
+    occupancies = np.array([[i % 7 for i in range(30)], [i % 4 for i in range(30)]])
+
+    base_rates, rates = adapter.calculate_rates(
+        rate_plan_ids=rate_plan_ids,
+        dates=dates,
+        occupancies=occupancies,
+        current_datetime=current_datetime,
+    )
+    for row, rate_plan_id in enumerate(rate_plan_ids):
+        for column, date in enumerate(dates):
+            base_rate = adapter.calculate_restriction_base_rate(
+                rate_plan_id=rate_plan_id,
+                date=date,
+                current_datetime=current_datetime,
+            )
+            assert base_rates[row, column] == base_rate
+            assert rates[row, column] == adapter.calculate_restriction_rate(
+                base_rate=base_rate,
+                date=date,
+                current_datetime=current_datetime,
+                occupancy=int(occupancies[row, column]),
+            )
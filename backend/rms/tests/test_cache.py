@@ -0,0 +1,130 @@
+from ..adapter import DynamicPricingAdapter
+from ..cache import (
+    AdapterInvalidationListener,
+    LocalAdapterCache,
+    PendingInvalidation,
+    local_adapter_cache,
+)
+from ..models import WeekdayBasedRule
+
+
+def test_local_adapter_cache_lru():
+    local_cache = LocalAdapterCache(maxsize=2, ttl=30)
+    local_cache.set(1, 0, {"id": 1})
+    local_cache.set(2, 0, {"id": 2})
+    assert local_cache.get(1, lambda: 0) == (0, {"id": 1})
+    # 2 is the least recently used one
+    local_cache.set(3, 0, {"id": 3})
+    assert local_cache.get(2, lambda: 0) is None
+    assert local_cache.get(1, lambda: 0) == (0, {"id": 1})
+    assert local_cache.get(3, lambda: 0) == (0, {"id": 3})
+
+
+def test_local_adapter_cache_generation():
+    local_cache = LocalAdapterCache(maxsize=2, ttl=30)
+    local_cache.set(1, 0, {"generation": 0})
+    assert local_cache.get(1, lambda: 1) is None
+    assert local_cache.get(1, lambda: 0) is None
+
+    # A payload read before an invalidation is not stored after it
+    local_cache.evict(1, generation=2)
+    local_cache.set(1, 1, {"generation": 1})
+    assert local_cache.get(1, lambda: 1) is None
+    local_cache.set(1, 2, {"generation": 2})
+    assert local_cache.get(1, lambda: 2) == (2, {"generation": 2})
+
+
+def test_local_adapter_cache_listener(mocker):
+    local_cache = LocalAdapterCache(maxsize=2, ttl=30)
+    listener = AdapterInvalidationListener(local_cache)
+    mocker.patch.object(
+        AdapterInvalidationListener,
+        "is_subscribed",
+        new_callable=mocker.PropertyMock,
+        return_value=True,
+    )
+    get_generation = mocker.Mock(return_value=0)
+    local_cache.set(1, 0, {"id": 1})
+
+    # Entries are trusted while the listener is subscribed
+    assert local_cache.get(1, get_generation) == (0, {"id": 1})
+    get_generation.assert_not_called()
+    listener.handle_message({"data": b"1:1"})
+    assert local_cache.get(1, get_generation) is None
+
+    # And checked once the ttl is over
+    local_cache.set(1, 1, {"id": 1})
+    mocker.patch("backend.rms.cache.time.monotonic", return_value=10**9)
+    get_generation.return_value = 1
+    assert local_cache.get(1, get_generation) == (1, {"id": 1})
+    get_generation.assert_called_once()
+
+
+def test_dynamic_pricing_adapter_local_cache(
+    hotel_factory,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+    mocker,
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        hotel = hotel_factory()
+        setting = hotel.dynamic_pricing_setting
+        setting.is_weekday_based = True
+        setting.save()
+    DynamicPricingAdapter(setting=setting)
+
+    # The shared cache is only asked for the generation
+    get_generation = mocker.spy(DynamicPricingAdapter, "get_generation")
+    with django_assert_num_queries(0):
+        adapter = DynamicPricingAdapter(setting=setting)
+    assert get_generation.call_count == 1
+    assert adapter.weekday_based_rules[0]["increment_factor"] == 0
+
+    # Invalidation bumps the generation, which drops the local entry
+    generation = DynamicPricingAdapter.get_generation(setting.id)
+    with django_capture_on_commit_callbacks(execute=True):
+        WeekdayBasedRule.objects.filter(setting=setting, weekday=1).update(
+            increment_factor=10
+        )
+        DynamicPricingAdapter.invalidate_cache(setting.id)
+    assert DynamicPricingAdapter.get_generation(setting.id) == generation + 1
+    adapter = DynamicPricingAdapter(setting=setting)
+    assert adapter.weekday_based_rules[0]["increment_factor"] == 10
+
+
+def test_dynamic_pricing_adapter_pending_invalidation(
+    hotel_factory,
+    django_capture_on_commit_callbacks,
+    weekday_based_rule_factory,
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        hotel = hotel_factory()
+        setting = hotel.dynamic_pricing_setting
+        setting.is_weekday_based = True
+        setting.save()
+    DynamicPricingAdapter(setting=setting)
+    generation = DynamicPricingAdapter.get_generation(setting.id)
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        rule = WeekdayBasedRule.objects.get(setting=setting, weekday=1)
+        rule.increment_factor = 10
+        rule.save()
+        rule.increment_factor = 20
+        rule.save()
+        # The transaction sees its own changes, without caching them
+        adapter = DynamicPricingAdapter(setting=setting)
+        assert adapter.generation is None
+        assert adapter.weekday_based_rules[0]["increment_factor"] == 20
+        assert DynamicPricingAdapter.get_generation(setting.id) == generation
+        assert local_adapter_cache.get(setting.id, lambda: generation)
+
+    # The generation is bumped once on commit
+    invalidations = [
+        callback for callback in callbacks if isinstance(callback, PendingInvalidation)
+    ]
+    assert len(invalidations) == 1
+    invalidations[0]()
+    assert DynamicPricingAdapter.get_generation(setting.id) == generation + 1
+    adapter = DynamicPricingAdapter(setting=setting)
+    assert adapter.generation == generation + 1
+    assert adapter.weekday_based_rules[0]["increment_factor"] == 20
@@ -0,0 +1,133 @@
+import datetime
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..adapter import DynamicPricingAdapter
+from ..cache import local_adapter_cache
+from ..codec import (
+    HEADER,
+    PAYLOAD_VERSION,
+    PayloadVersionError,
+    decode_adapter_payload,
+    encode_adapter_payload,
+)
+
+PAYLOAD_ATTRIBUTES = (
+    "timezone",
+    "inventory_days",
+    "is_enabled",
+    "default_base_rate",
+    "interval_base_rate_index",
+    "rate_plan_percentage_factors",
+    "is_lead_days_based",
+    "lead_days_based_rules",
+    "is_weekday_based",
+    "weekday_based_rules",
+    "is_month_based",
+    "month_based_rules",
+    "is_season_based",
+    "season_based_rules",
+    "season_based_table",
+    "is_occupancy_based",
+    "occupancy_based_trigger_rules",
+    "occupancy_based_trigger_index",
+    "is_time_based",
+    "time_based_trigger_rules",
+    "time_based_trigger_table",
+)
+
+
+@pytest.fixture
+def adapter_with_rules(
+    rate_plan_factory,
+    interval_base_rate_factory,
+    season_based_rule_factory,
+    occupancy_based_rule_factory,
+    time_based_rule_factory,
+    django_capture_on_commit_callbacks,
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        rate_plan = rate_plan_factory(room_type__hotel__timezone="Asia/Ho_Chi_Minh")
+        rate_plan.rms.percentage_factor = -10
+        rate_plan.rms.save()
+        hotel = rate_plan.room_type.hotel
+        setting = hotel.dynamic_pricing_setting
+        setting.is_enabled = True
+        setting.is_lead_days_based = True
+        setting.is_weekday_based = True
+        setting.is_month_based = True
+        setting.is_season_based = True
+        setting.is_occupancy_based = True
+        setting.is_time_based = True
+        setting.default_base_rate = 1000000
+        setting.save()
+        today = timezone.now().date()
+        interval_base_rate_factory(
+            setting=setting, dates=(today, today + datetime.timedelta(days=10))
+        )
+        season_based_rule_factory(
+            setting=setting, d1="12/20", d2="01/05", increment_factor=200
+        )
+        season_based_rule_factory(
+            setting=setting, d1="06/01", d2="08/31", percentage_factor=15
+        )
+        occupancy_based_rule_factory(
+            setting=setting, min_occupancy=3, percentage_factor=5
+        )
+        occupancy_based_rule_factory(
+            setting=setting, min_occupancy=7, increment_factor=50
+        )
+        time_based_rule_factory(
+            setting=setting, day_ahead=0, hour=18, min_occupancy=2, increment_factor=30
+        )
+        time_based_rule_factory(
+            setting=setting, day_ahead=1, hour=9, min_occupancy=4, percentage_factor=-5
+        )
+    return DynamicPricingAdapter(hotel=hotel)
+
+
+def test_encode_decode_adapter_payload(adapter_with_rules):
+    payload = {name: getattr(adapter_with_rules, name) for name in PAYLOAD_ATTRIBUTES}
+    data = encode_adapter_payload(payload)
+    assert isinstance(data, bytes)
+    assert decode_adapter_payload(data) == payload
+
+
+def test_encode_decode_adapter_payload_big_ids(adapter_with_rules):
+    payload = {name: getattr(adapter_with_rules, name) for name in PAYLOAD_ATTRIBUTES}
+    # Rate plan ids are big auto fields
+    payload["rate_plan_percentage_factors"] = {
+        2**40 + rate_plan_id: factor
+        for rate_plan_id, factor in payload["rate_plan_percentage_factors"].items()
+    }
+    assert decode_adapter_payload(encode_adapter_payload(payload)) == payload
+
+
+def test_adapter_load_from_cache_round_trip(
+    adapter_with_rules, django_assert_num_queries
+):
+    setting = adapter_with_rules.setting
+    local_adapter_cache.clear()
+    with django_assert_num_queries(0):
+        adapter = DynamicPricingAdapter(setting=setting)
+    for name in PAYLOAD_ATTRIBUTES:
+        assert getattr(adapter, name) == getattr(adapter_with_rules, name), name
+
+
+def test_decode_adapter_payload_version_mismatch(adapter_with_rules):
+    with pytest.raises(PayloadVersionError):
+        decode_adapter_payload(HEADER.pack(PAYLOAD_VERSION + 1, 0, 0))
+    with pytest.raises(PayloadVersionError):
+        decode_adapter_payload({"timezone": "UTC"})
+
+    # The adapter is rebuilt from the database and the payload is replaced
+    setting = adapter_with_rules.setting
+    cache_key = DynamicPricingAdapter.get_cache_key(setting.id)
+    cache.set(cache_key, HEADER.pack(PAYLOAD_VERSION + 1, 0, 0))
+    local_adapter_cache.clear()
+    adapter = DynamicPricingAdapter(setting=setting)
+    assert adapter.is_time_based
+    assert adapter.time_based_trigger_rules
+    assert decode_adapter_payload(cache.get(cache_key))["is_time_based"]
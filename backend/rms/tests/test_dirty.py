@@ -0,0 +1,153 @@
+import datetime
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from backend.pms.models import RatePlanRestrictions
+from backend.utils.cache import get_pending_queue_entry_key
+
+from ..adapter import DynamicPricingAdapter
+from ..dirty import (
+    DirtyScope,
+    get_dirty_scopes_key,
+    pop_dirty_scopes,
+    push_dirty_scopes,
+    resolve_dirty_scopes,
+)
+from ..models import MonthBasedRule
+from ..tasks import recalculate_dirty_rates
+
+
+def test_resolve_dirty_scopes():
+    current_date = datetime.date(2023, 12, 30)
+    dates = (current_date, datetime.date(2024, 1, 10))
+
+    def resolve(*scopes, lead_days=(1, 2, 3, 4, 5)):
+        return resolve_dirty_scopes(set(scopes), dates, current_date, list(lead_days))
+
+    assert resolve() == ([], set())
+    assert resolve((DirtyScope.RATE_PLAN, 1)) == ([], {1})
+    assert len(resolve((DirtyScope.ALL,))[0]) == 12
+    assert resolve((DirtyScope.DATES, None, datetime.date(2023, 12, 31)))[0] == [
+        datetime.date(2023, 12, 30),
+        datetime.date(2023, 12, 31),
+    ]
+    assert resolve((DirtyScope.OFFSETS, 10, None))[0] == [
+        datetime.date(2024, 1, 9),
+        datetime.date(2024, 1, 10),
+    ]
+    assert resolve((DirtyScope.MONTH, 12))[0] == [
+        datetime.date(2023, 12, 30),
+        datetime.date(2023, 12, 31),
+    ]
+    # Saturdays
+    assert resolve((DirtyScope.WEEKDAY, 6))[0] == [
+        datetime.date(2023, 12, 30),
+        datetime.date(2024, 1, 6),
+    ]
+    # Wraps around the new year
+    assert resolve((DirtyScope.SEASON, 12, 31, 1, 1))[0] == [
+        datetime.date(2023, 12, 31),
+        datetime.date(2024, 1, 1),
+    ]
+    assert resolve((DirtyScope.LEAD_DAYS, 2))[0] == [datetime.date(2023, 12, 31)]
+    # The last rule also prices the dates after it
+    assert resolve((DirtyScope.LEAD_DAYS, 11), lead_days=range(1, 12))[0] == [
+        datetime.date(2024, 1, 9),
+        datetime.date(2024, 1, 10),
+    ]
+    # Rules are matched by position, here after the rule of 3 lead days was
+    # deleted
+    assert resolve((DirtyScope.LEAD_DAYS, 4), lead_days=(1, 2, 4, 5))[0] == [
+        datetime.date(2024, 1, 1)
+    ]
+    assert resolve((DirtyScope.LEAD_DAYS_SHIFT, 3), lead_days=(1, 2, 4, 5))[0] == [
+        datetime.date(2024, 1, 1) + datetime.timedelta(days=i) for i in range(10)
+    ]
+    assert resolve((DirtyScope.LEAD_DAYS, 2), lead_days=())[0] == []
+
+
+def test_push_pop_dirty_scopes():
+    # Not the id of a setting of another test
+    setting_id = -1
+    assert pop_dirty_scopes(setting_id) == set()
+    # Only the first push schedules a drain
+    assert push_dirty_scopes(setting_id, {(DirtyScope.MONTH, 1)}, schedule_timeout=60)
+    assert not push_dirty_scopes(
+        setting_id, {(DirtyScope.MONTH, 2)}, schedule_timeout=60
+    )
+    assert pop_dirty_scopes(setting_id) == {
+        (DirtyScope.MONTH, 1),
+        (DirtyScope.MONTH, 2),
+    }
+    assert pop_dirty_scopes(setting_id) == set()
+
+    assert push_dirty_scopes(
+        setting_id, {(DirtyScope.RATE_PLAN, 1)}, schedule_timeout=60
+    )
+    assert not push_dirty_scopes(
+        setting_id, {(DirtyScope.RATE_PLAN, 2)}, schedule_timeout=60
+    )
+    # A missing entry may have been anything
+    cache.delete(get_pending_queue_entry_key(get_dirty_scopes_key(setting_id), 4))
+    assert pop_dirty_scopes(setting_id) == {
+        (DirtyScope.RATE_PLAN, 1),
+        (DirtyScope.ALL,),
+    }
+
+
+def test_recalculate_dirty_rates(
+    rate_plan_factory, django_capture_on_commit_callbacks, mocker
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        rate_plan = rate_plan_factory()
+        hotel = rate_plan.room_type.hotel
+        setting = hotel.dynamic_pricing_setting
+        setting.is_enabled = True
+        setting.is_month_based = True
+        setting.default_base_rate = 100
+        setting.save()
+
+    today = timezone.now().date()
+    restrictions = RatePlanRestrictions.objects.filter(
+        rate_plan=rate_plan, date__gte=today
+    )
+    assert restrictions.exists()
+    assert all(restriction.rate == 100 for restriction in restrictions)
+
+    month = (today + datetime.timedelta(days=40)).month
+    calculate_and_update_rates = mocker.spy(
+        DynamicPricingAdapter, "calculate_and_update_rates"
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        rule = MonthBasedRule.objects.get(setting=setting, month=month)
+        rule.increment_factor = 10
+        rule.save()
+        rule.increment_factor = 20
+        rule.save()
+
+    # Both saves are recalculated at once, only for the dates of the month
+    calculate_and_update_rates.assert_called_once()
+    only_dates = calculate_and_update_rates.call_args.kwargs["only_dates"]
+    assert {date.month for date in only_dates} == {month}
+    for restriction in restrictions.all():
+        assert restriction.rate == (120 if restriction.date.month == month else 100)
+
+
+def test_recalculate_dirty_rates_local_date(hotel_factory, mocker):
+    hotel = hotel_factory(timezone="Asia/Ho_Chi_Minh")
+    setting = hotel.dynamic_pricing_setting
+    setting.is_enabled = True
+    setting.default_base_rate = 100
+    setting.save()
+    calculate_and_update_rates = mocker.patch.object(
+        DynamicPricingAdapter, "calculate_and_update_rates", return_value=[]
+    )
+    # Already the next day in Ho Chi Minh City
+    utc_now = timezone.now().replace(hour=20, minute=0)
+    mocker.patch("django.utils.timezone.now", return_value=utc_now)
+
+    push_dirty_scopes(setting.id, {(DirtyScope.OFFSETS, 0, 0)}, schedule_timeout=60)
+    recalculate_dirty_rates(setting.id)
+    local_date = utc_now.date() + datetime.timedelta(days=1)
+    assert calculate_and_update_rates.call_args.kwargs["only_dates"] == [local_date]
@@ -1,12 +1,7 @@
 import pytest
 from django.core.exceptions import ValidationError
 
-from ..models import (
-    PeriodicTask,
-    RuleNotEnabledError,
-    SeasonBasedRule,
-    TimeBasedTriggerRule,
-)
+from ..models import RuleNotEnabledError, SeasonBasedRule, TimeBasedTriggerRule
 
 
 def test_dynamic_pricing(hotel_factory):
@@ -200,7 +195,5 @@ def test_time_based_rule_save(
         increment_factor=200000,
     )
     assert TimeBasedTriggerRule.objects.count() == 1
-    assert PeriodicTask.objects.count() == 1
     rule.delete()
     assert TimeBasedTriggerRule.objects.count() == 0
-    assert PeriodicTask.objects.count() == 0
@@ -0,0 +1,378 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from celery.exceptions import SoftTimeLimitExceeded
+from django.core.cache import cache
+
+from backend.pms.models import RatePlanRestrictions
+from backend.utils.partitions import get_monthly_partitions
+
+from ..dirty import DirtyScope
+from ..locks import HOTEL_RATES_LOCK_NAMESPACE
+from ..models import RateHistory, RMSRatePlanRestrictions
+from ..tasks import (
+    LEAD_DAYS_ROLLED_AT_KEY,
+    TIME_BASED_TRIGGERS_SWEPT_AT_KEY,
+    extend_inventory_windows,
+    get_time_based_triggers,
+    handle_pending_occupancy_based_triggers,
+    handle_time_based_triggers,
+    maintain_rate_history_partitions,
+    maintain_restriction_partitions,
+    price_new_restrictions,
+    recalculate_all_rate,
+    recalculate_fleet_rates,
+    recalculate_hotel_chunk_rates,
+    report_fleet_recalculation,
+    roll_lead_days,
+    schedule_occupancy_based_trigger,
+    sweep_time_based_triggers,
+)
+
+
+def test_schedule_occupancy_based_trigger(
+    hotel_factory, room_type_factory, django_capture_on_commit_callbacks, mocker
+):
+    hotel = hotel_factory()
+    room_types = [room_type_factory(hotel=hotel).id for _ in range(3)]
+    apply_async = mocker.patch.object(
+        handle_pending_occupancy_based_triggers, "apply_async"
+    )
+    handle_occupancy_based_trigger = mocker.patch(
+        "backend.rms.tasks.handle_occupancy_based_trigger"
+    )
+
+    # A burst of bookings is handled at once
+    with django_capture_on_commit_callbacks(execute=True):
+        schedule_occupancy_based_trigger(
+            hotel.id, [room_types[0]], ("2023-06-10", "2023-06-12")
+        )
+        schedule_occupancy_based_trigger(
+            hotel.id, room_types[:2], ("2023-06-01", "2023-06-11")
+        )
+    with django_capture_on_commit_callbacks(execute=True):
+        schedule_occupancy_based_trigger(
+            hotel.id, [room_types[0]], ("2023-06-05", "2023-06-20")
+        )
+    apply_async.assert_called_once()
+    assert apply_async.call_args.kwargs["args"] == (hotel.id,)
+
+    handle_pending_occupancy_based_triggers(hotel.id)
+    handle_occupancy_based_trigger.assert_called_once_with(
+        hotel_id=hotel.id,
+        room_types=sorted(room_types[:2]),
+        dates=("2023-06-01", "2023-06-20"),
+    )
+
+    # Nothing is pending anymore, the next trigger is scheduled again
+    handle_pending_occupancy_based_triggers(hotel.id)
+    handle_occupancy_based_trigger.assert_called_once()
+    with django_capture_on_commit_callbacks(execute=True):
+        schedule_occupancy_based_trigger(
+            hotel.id, [room_types[2]], ("2023-06-01", "2023-06-01")
+        )
+    assert apply_async.call_count == 2
+
+
+def enable_time_based_triggers(hotel):
+    setting = hotel.dynamic_pricing_setting
+    setting.is_enabled = True
+    setting.is_time_based = True
+    setting.default_base_rate = 100
+    setting.save()
+    return setting
+
+
+def test_get_time_based_triggers(hotel_factory, time_based_rule_factory):
+    utc_hotel = hotel_factory(timezone="UTC")
+    ho_chi_minh_hotel = hotel_factory(timezone="Asia/Ho_Chi_Minh")
+    disabled_hotel = hotel_factory(timezone="UTC")
+    for hotel in (utc_hotel, ho_chi_minh_hotel):
+        setting = enable_time_based_triggers(hotel)
+        time_based_rule_factory(
+            setting=setting, hour=10, day_ahead=0, increment_factor=10
+        )
+        time_based_rule_factory(
+            setting=setting, hour=17, day_ahead=1, increment_factor=10
+        )
+    setting = enable_time_based_triggers(disabled_hotel)
+    time_based_rule_factory(setting=setting, hour=10, day_ahead=0, increment_factor=10)
+    setting.is_enabled = False
+    setting.save()
+
+    # 10:00 UTC is 17:00 in Ho Chi Minh City
+    end = datetime(2023, 6, 1, 10, 0, tzinfo=timezone.utc)
+    assert get_time_based_triggers(end - timedelta(hours=1), end) == {
+        utc_hotel.id: {date(2023, 6, 1)},
+        ho_chi_minh_hotel.id: {date(2023, 6, 2)},
+    }
+    assert get_time_based_triggers(end, end + timedelta(hours=1)) == {}
+
+
+def test_sweep_time_based_triggers(
+    settings, hotel_factory, time_based_rule_factory, mocker
+):
+    settings.RMS_TIME_BASED_TRIGGER_BATCH_SIZE = 2
+    hotels = [hotel_factory(timezone="UTC") for _ in range(3)]
+    for hotel in hotels:
+        setting = enable_time_based_triggers(hotel)
+        for hour in range(24):
+            time_based_rule_factory(setting=setting, hour=hour, increment_factor=10)
+    delay = mocker.patch.object(handle_time_based_triggers, "delay")
+    # An hour boundary passed since the previous sweep
+    cache.set(
+        TIME_BASED_TRIGGERS_SWEPT_AT_KEY,
+        datetime.now(timezone.utc) - timedelta(hours=1),
+    )
+
+    # The hotels are fanned out in batches
+    sweep_time_based_triggers()
+    assert [len(call.args[0]) for call in delay.call_args_list] == [2, 1]
+    assert sorted(
+        hotel_id for call in delay.call_args_list for hotel_id, _ in call.args[0]
+    ) == sorted(hotel.id for hotel in hotels)
+
+    # Hours are swept once
+    delay.reset_mock()
+    sweep_time_based_triggers()
+    delay.assert_not_called()
+
+
+def test_recalculate_fleet_rates(settings, hotel_factory, mocker):
+    settings.RMS_FLEET_RECALCULATION_CHUNK_SIZE = 2
+    hotels = [hotel_factory(timezone="UTC") for _ in range(4)]
+    for hotel in hotels[:3]:
+        setting = hotel.dynamic_pricing_setting
+        setting.is_enabled = True
+        setting.default_base_rate = 100
+        setting.save()
+    hotel_factory(timezone="Asia/Ho_Chi_Minh").dynamic_pricing_setting.save()
+    recalculate_hotel_rates = mocker.patch(
+        "backend.rms.tasks.recalculate_hotel_rates",
+        side_effect=[10, 20, ValueError],
+    )
+    report = mocker.spy(report_fleet_recalculation, "run")
+
+    recalculate_fleet_rates(timezones=["UTC"])
+    assert [call.args[0] for call in recalculate_hotel_rates.call_args_list] == hotels[
+        :3
+    ]
+    # Both chunks are reported at once
+    report.assert_called_once()
+    stats = report.spy_return
+    assert (stats["hotels"], stats["restrictions"], stats["failed"]) == (2, 30, 1)
+    assert stats["hotels_per_second"] > 0
+
+    recalculate_hotel_rates.reset_mock()
+    recalculate_fleet_rates(timezones=["Asia/Ho_Chi_Minh"])
+    recalculate_hotel_rates.assert_not_called()
+
+
+def test_handle_pending_occupancy_based_triggers_locked(
+    hotel_factory, room_type_factory, django_capture_on_commit_callbacks, mocker
+):
+    hotel = hotel_factory()
+    room_type = room_type_factory(hotel=hotel)
+    apply_async = mocker.patch.object(
+        handle_pending_occupancy_based_triggers, "apply_async"
+    )
+    handle_occupancy_based_trigger = mocker.patch(
+        "backend.rms.tasks.handle_occupancy_based_trigger"
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        schedule_occupancy_based_trigger(
+            hotel.id, [room_type.id], ("2023-06-01", "2023-06-02")
+        )
+    apply_async.reset_mock()
+
+    # Another recalculation of the hotel is running, the drain is retried
+    try_advisory_xact_lock = mocker.patch(
+        "backend.rms.locks.try_advisory_xact_lock", return_value=False
+    )
+    handle_pending_occupancy_based_triggers(hotel.id)
+    try_advisory_xact_lock.assert_called_once_with(HOTEL_RATES_LOCK_NAMESPACE, hotel.id)
+    handle_occupancy_based_trigger.assert_not_called()
+    apply_async.assert_called_once()
+
+    # The triggers were left pending
+    try_advisory_xact_lock.return_value = True
+    handle_pending_occupancy_based_triggers(hotel.id)
+    handle_occupancy_based_trigger.assert_called_once_with(
+        hotel_id=hotel.id,
+        room_types=[room_type.id],
+        dates=("2023-06-01", "2023-06-02"),
+    )
+
+
+def test_handle_pending_occupancy_based_triggers_failed(
+    settings, hotel_factory, django_capture_on_commit_callbacks, mocker
+):
+    hotel = hotel_factory()
+    apply_async = mocker.patch.object(
+        handle_pending_occupancy_based_triggers, "apply_async"
+    )
+    handle_occupancy_based_trigger = mocker.patch(
+        "backend.rms.tasks.handle_occupancy_based_trigger",
+        side_effect=ConnectionError,
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        schedule_occupancy_based_trigger(hotel.id, [1], ("2023-06-01", "2023-06-02"))
+    apply_async.reset_mock()
+
+    # The recalculation failed, the triggers are pushed back and retried
+    with pytest.raises(ConnectionError):
+        handle_pending_occupancy_based_triggers(hotel.id)
+    apply_async.assert_called_once_with(
+        args=(hotel.id,), countdown=settings.RMS_OCCUPANCY_TRIGGER_RETRY_DELAY
+    )
+
+    handle_occupancy_based_trigger.reset_mock(side_effect=True)
+    handle_pending_occupancy_based_triggers(hotel.id)
+    handle_occupancy_based_trigger.assert_called_once_with(
+        hotel_id=hotel.id, room_types=[1], dates=("2023-06-01", "2023-06-02")
+    )
+
+
+def test_recalculate_all_rate_locked(hotel_factory, mocker):
+    setting = hotel_factory().dynamic_pricing_setting
+    mocker.patch("backend.rms.locks.try_advisory_xact_lock", return_value=False)
+    record_dirty_rates = mocker.patch("backend.rms.tasks.record_dirty_rates")
+
+    # Coalesced with the other recalculations of the hotel
+    recalculate_all_rate(setting.id)
+    record_dirty_rates.assert_called_once_with(setting.id, {(DirtyScope.ALL,)})
+
+
+def test_roll_lead_days(hotel_factory, mocker):
+    for zone_info in ("UTC", "Asia/Ho_Chi_Minh", "Asia/Kathmandu"):
+        setting = hotel_factory(timezone=zone_info).dynamic_pricing_setting
+        setting.is_enabled = True
+        setting.default_base_rate = 100
+        setting.save()
+    delay = mocker.patch.object(recalculate_fleet_rates, "delay")
+    now = mocker.patch("django.utils.timezone.now")
+
+    # Midnight in Ho Chi Minh City
+    now.return_value = datetime(2023, 6, 1, 17, 0, tzinfo=timezone.utc)
+    cache.set(LEAD_DAYS_ROLLED_AT_KEY, now.return_value - timedelta(minutes=15))
+    roll_lead_days()
+    delay.assert_called_once_with(timezones=["Asia/Ho_Chi_Minh"])
+
+    # Midnight in Kathmandu, missed runs are caught up
+    delay.reset_mock()
+    now.return_value += timedelta(hours=1, minutes=15)
+    roll_lead_days()
+    delay.assert_called_once_with(timezones=["Asia/Kathmandu"])
+
+
+def test_recalculate_hotel_chunk_rates_soft_time_limit(hotel_factory, mocker):
+    hotels = [hotel_factory() for _ in range(2)]
+    recalculate_hotel_rates = mocker.patch(
+        "backend.rms.tasks.recalculate_hotel_rates",
+        side_effect=SoftTimeLimitExceeded,
+    )
+
+    # The remaining hotels of the chunk are not recalculated past its limit
+    with pytest.raises(SoftTimeLimitExceeded):
+        recalculate_hotel_chunk_rates([hotel.id for hotel in hotels])
+    recalculate_hotel_rates.assert_called_once()
+
+
+def test_handle_time_based_triggers_soft_time_limit(mocker):
+    handle_time_based_trigger = mocker.patch(
+        "backend.rms.tasks.handle_time_based_trigger",
+        side_effect=[ValueError, SoftTimeLimitExceeded],
+    )
+
+    # Errors of a hotel don't stop the batch, running out of time does
+    with pytest.raises(SoftTimeLimitExceeded):
+        handle_time_based_triggers(
+            [(1, ["2023-06-01"]), (2, ["2023-06-01"]), (3, ["2023-06-01"])]
+        )
+    assert handle_time_based_trigger.call_count == 2
+
+
+def test_maintain_rate_history_partitions(db, settings, mocker):
+    settings.RMS_RATE_HISTORY_PARTITIONS_AHEAD = 1
+    settings.RMS_RATE_HISTORY_RETENTION_MONTHS = 2
+    table = "rms_ratehistory"
+    mocker.patch(
+        "django.utils.timezone.now",
+        return_value=datetime(2030, 1, 15, tzinfo=timezone.utc),
+    )
+    maintain_rate_history_partitions()
+    assert {f"{table}_p203001", f"{table}_p203002"} <= set(
+        get_monthly_partitions(table)
+    )
+
+    mocker.patch(
+        "django.utils.timezone.now",
+        return_value=datetime(2030, 4, 1, tzinfo=timezone.utc),
+    )
+    maintain_rate_history_partitions()
+    partitions = set(get_monthly_partitions(table))
+    # January is past the retention, February is kept
+    assert f"{table}_p203001" not in partitions
+    assert {f"{table}_p203002", f"{table}_p203004", f"{table}_p203005"} <= partitions
+
+
+def test_extend_inventory_windows(hotel_factory, rate_plan_factory, mocker):
+    hotel = hotel_factory(inventory_days=100)
+    rate_plan = rate_plan_factory(room_type__hotel=hotel)
+    setting = hotel.dynamic_pricing_setting
+    setting.is_enabled = True
+    setting.default_base_rate = 100
+    setting.save()
+    restrictions = RatePlanRestrictions.objects.filter(rate_plan=rate_plan)
+    last_dates = sorted(restrictions.values_list("date", flat=True))[-3:]
+    restrictions.filter(date__in=last_dates).delete()
+    restrictions.update(rate=50)
+    delay = mocker.patch.object(price_new_restrictions, "delay")
+
+    extend_inventory_windows()
+    delay.assert_called_once_with(
+        [(hotel.id, [value.isoformat() for value in last_dates])]
+    )
+    assert restrictions.count() == 101
+    new_restrictions = restrictions.filter(date__in=last_dates)
+    assert RMSRatePlanRestrictions.objects.filter(
+        restriction__in=new_restrictions
+    ).count() == len(last_dates)
+
+    # Only the new dates are priced
+    price_new_restrictions(*delay.call_args.args)
+    assert set(new_restrictions.values_list("rate", flat=True)) == {100}
+    assert restrictions.filter(rate=50).count() == 98
+    assert set(
+        RateHistory.objects.filter(
+            restriction_id__in=new_restrictions.values("id")
+        ).values_list("cause", flat=True)
+    ) == {RateHistory.CauseChoices.WINDOW_EXTENSION}
+
+    # Nothing is missing anymore
+    delay.reset_mock()
+    extend_inventory_windows()
+    delay.assert_not_called()
+
+
+def test_maintain_restriction_partitions(db, settings, mocker):
+    settings.RATE_PLAN_RESTRICTIONS_PARTITIONS_AHEAD = 1
+    settings.RATE_PLAN_RESTRICTIONS_RETENTION_MONTHS = 1
+    tables = [
+        RatePlanRestrictions._meta.db_table,
+        RMSRatePlanRestrictions._meta.db_table,
+    ]
+    partitions = {table: set(get_monthly_partitions(table)) for table in tables}
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    mocker.patch(
+        "django.utils.timezone.now",
+        return_value=datetime(2040, 1, 15, tzinfo=timezone.utc),
+    )
+    maintain_restriction_partitions()
+    for table in tables:
+        # The current partitions are past the retention
+        assert f"{table}_p{this_month:%Y%m}" in partitions[table]
+        assert set(get_monthly_partitions(table)) == {
+            f"{table}_p204001",
+            f"{table}_p204002",
+        }
@@ -1,6 +1,12 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
-from ..utils import is_within_period
+from ..utils import (
+    build_day_of_year_table,
+    get_day_of_year_index,
+    get_passed_hours,
+    is_within_period,
+)
 
 
 def test_is_within_period():
@@ -28,3 +34,51 @@ def test_is_within_period():
     date_str = "12/25/2022"
     date = datetime.strptime(date_str, "%m/%d/%Y").date()
     assert is_within_period(start_date, end_date, date)
+
+
+def test_build_day_of_year_table():
+    periods = [(12, 1, 1, 20), (1, 10, 3, 1), (2, 1, 2, 28), (6, 15, 6, 15)]
+    table = build_day_of_year_table(periods)
+    assert len(table) == 366
+    # Leap and non-leap years give the same result as is_within_period
+    for year in (2023, 2024):
+        day = date(year, 1, 1)
+        while day.year == year:
+            expected = -1
+            for i, (start_month, start_day, end_month, end_day) in enumerate(periods):
+                if is_within_period(
+                    f"{start_month}/{start_day}", f"{end_month}/{end_day}", day
+                ):
+                    expected = i
+                    break
+            assert table[get_day_of_year_index(day)] == expected, day
+            day += timedelta(days=1)
+    assert table[get_day_of_year_index(date(2024, 2, 29))] == 1
+    assert set(build_day_of_year_table([])) == {-1}
+
+
+def test_get_passed_hours():
+    start = datetime(2023, 3, 26, 0, 0, tzinfo=timezone.utc)
+    end = datetime(2023, 3, 26, 2, 0, tzinfo=timezone.utc)
+    assert get_passed_hours(ZoneInfo("UTC"), start, end) == [
+        (date(2023, 3, 26), 1),
+        (date(2023, 3, 26), 2),
+    ]
+    # Local hours start half past the UTC hour
+    assert get_passed_hours(ZoneInfo("Asia/Kolkata"), start, end) == [
+        (date(2023, 3, 26), 6),
+        (date(2023, 3, 26), 7),
+    ]
+    # Within a quarter hour sweep
+    assert get_passed_hours(
+        ZoneInfo("Asia/Kolkata"),
+        start + timedelta(minutes=15),
+        start + timedelta(minutes=30),
+    ) == [(date(2023, 3, 26), 6)]
+    # Clocks go forward at 01:00 UTC, the skipped 02:00 local still passes
+    assert get_passed_hours(ZoneInfo("Europe/Berlin"), start, end) == [
+        (date(2023, 3, 26), 2),
+        (date(2023, 3, 26), 3),
+        (date(2023, 3, 26), 4),
+    ]
+    assert get_passed_hours(ZoneInfo("UTC"), end, end) == []
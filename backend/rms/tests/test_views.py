@@ -0,0 +1,197 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from backend.pms.models import RatePlanRestrictions
+
+from ..adapter import DynamicPricingAdapter
+from ..models import RateTrace, SeasonBasedRule, WeekdayBasedRule
+from ..rate_calendar import get_rate_calendar
+
+
+@pytest.mark.django_db
+def test_simulate_rates_api_view(
+    admin,
+    manager,
+    get_api_client,
+    hotel_factory,
+    rate_plan_factory,
+    django_capture_on_commit_callbacks,
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        hotel = hotel_factory(inventory_days=365)
+        rate_plan = rate_plan_factory(room_type__hotel=hotel)
+        setting = hotel.dynamic_pricing_setting
+        setting.is_enabled = True
+        setting.is_weekday_based = True
+        setting.default_base_rate = 100
+        setting.save()
+    today = timezone.now().astimezone(hotel.timezone).date()
+    weekday_rule = WeekdayBasedRule.objects.get(
+        setting=setting, weekday=today.isoweekday()
+    )
+    url = reverse("rms:simulate-rates", kwargs={"uuid": setting.uuid})
+    data = {
+        "setting": {"is_season_based": True},
+        "season_based_rules": {
+            "create": [
+                {
+                    "name": "Year",
+                    "start_month": 1,
+                    "start_day": 1,
+                    "end_month": 12,
+                    "end_day": 31,
+                    "percentage_factor": 10,
+                    "increment_factor": 0,
+                }
+            ]
+        },
+        "weekday_based_rules": {
+            "update": [{"uuid": str(weekday_rule.uuid), "increment_factor": 5}]
+        },
+    }
+
+    response = get_api_client(manager).post(url, data, format="json")
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    cache_keys = set(cache._cache)
+    restrictions = list(
+        RatePlanRestrictions.objects.filter(rate_plan=rate_plan)
+        .order_by("date")
+        .values_list("date", "rate")
+    )
+    response = get_api_client(admin).post(url, data, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data["dates"]) == 365
+    assert response.data["dates"][0] == today
+    assert response.data["rate_plans"][0]["uuid"] == rate_plan.uuid
+    rates = response.data["rates"][0]
+    assert rates[0] == 115
+    assert rates[1:8].count(110) == 6
+    assert response.data["current_rates"][0][0] == 100
+
+    # Nothing is applied
+    assert set(cache._cache) == cache_keys
+    setting.refresh_from_db()
+    assert not setting.is_season_based
+    assert not SeasonBasedRule.objects.filter(setting=setting).exists()
+    weekday_rule.refresh_from_db()
+    assert weekday_rule.increment_factor == 0
+    assert (
+        list(
+            RatePlanRestrictions.objects.filter(rate_plan=rate_plan)
+            .order_by("date")
+            .values_list("date", "rate")
+        )
+        == restrictions
+    )
+    adapter = DynamicPricingAdapter(setting=setting)
+    assert (
+        adapter.calculate_restriction_base_rate(rate_plan.id, today, timezone.now())
+        == 100
+    )
+
+    # Rules of a disabled kind can't be changed
+    del data["setting"]
+    response = get_api_client(admin).post(url, data, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # Nor to duplicate an existing one
+    response = get_api_client(admin).post(
+        url,
+        {"weekday_based_rules": {"create": [{"weekday": 1, "increment_factor": 5}]}},
+        format="json",
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_rate_calendar_api_view(
+    admin,
+    manager,
+    get_api_client,
+    hotel_factory,
+    rate_plan_factory,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        hotel = hotel_factory(inventory_days=100)
+        rate_plan = rate_plan_factory(room_type__hotel=hotel)
+        setting = hotel.dynamic_pricing_setting
+        setting.is_enabled = True
+        setting.default_base_rate = 100
+        setting.save()
+    url = reverse("rms:rate-calendar", kwargs={"uuid": hotel.uuid})
+
+    # Not the hotel of the manager
+    response = get_api_client(manager).get(url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    admin_api_client = get_api_client(admin)
+    response = admin_api_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data["dates"]) == 101
+    room_type = response.data["room_types"][0]
+    assert room_type["uuid"] == rate_plan.room_type.uuid
+    assert room_type["rate_plans"][0]["uuid"] == rate_plan.uuid
+    assert room_type["rate_plans"][0]["rates"][0] == 100
+    assert room_type["rate_plans"][0]["base_rates"][0] == 100
+    etag = response["ETag"]
+
+    # Cached, not modified
+    with django_assert_num_queries(0):
+        rate_calendar = get_rate_calendar(hotel)
+    assert rate_calendar[1] == etag
+    response = admin_api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Invalidated when the rates are written
+    with django_capture_on_commit_callbacks(execute=True):
+        setting.default_base_rate = 200
+        setting.save()
+    response = admin_api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response["ETag"] != etag
+    assert response.data["room_types"][0]["rate_plans"][0]["rates"][0] == 200
+
+
+@pytest.mark.django_db
+def test_rate_trace_list_api_view(admin, manager, get_api_client, rate_plan_factory):
+    rate_plan = rate_plan_factory()
+    today = timezone.now().date()
+    for i in range(2):
+        RateTrace.objects.create(
+            rate_plan=rate_plan,
+            date=today + timezone.timedelta(days=i),
+            calculated_at=timezone.now(),
+            occupancy=1,
+            base_rate=100,
+            restriction_base_rate=110,
+            rate=120,
+            percentage_factors=[0, 0, 10, 0, 0, 0, 0],
+            increment_factors=[0, 0, 0, 0, 0, 10, 0],
+        )
+    url = reverse("rms:rate-traces", kwargs={"rate_plan__uuid": rate_plan.uuid})
+
+    response = get_api_client(manager).get(url)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    response = get_api_client(admin).get(url, {"date": today.isoformat()})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data) == 1
+    assert response.data[0]["rate"] == 120
+    assert response.data[0]["factors"]["weekday"] == {
+        "percentage_factor": 10,
+        "increment_factor": 0,
+    }
+    assert response.data[0]["factors"]["occupancy"]["increment_factor"] == 10
+
+    response = get_api_client(admin).get(url, {"limit": 1})
+    assert response.data["count"] == 2
+    assert (
+        response.data["results"][0]["date"]
+        == (today + timezone.timedelta(days=1)).isoformat()
+    )
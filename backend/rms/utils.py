@@ -1,5 +1,7 @@
+from array import array
 from datetime import date as date_class
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
 
 
 def is_within_period(
@@ -30,3 +32,71 @@ def is_within_period(
 
     # Check if the date falls within the time period
     return start_date <= date <= end_date
+
+
+# Number of days before each month in a leap year, every month/day pair
+# (02/29 included) gets its own slot in a day of year table
+DAYS_BEFORE_MONTH = (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
+DAY_OF_YEAR_TABLE_SIZE = 366
+
+
+def get_day_of_year_index(date: datetime | date_class) -> int:
+    """
+    Get the slot of a date in a day of year table. The slot only depends on the
+    month and day, so 03/01 has the same slot in leap and non-leap years.
+    """
+    return DAYS_BEFORE_MONTH[date.month - 1] + date.day - 1
+
+
+def build_day_of_year_table(periods: list[tuple[int, int, int, int]]) -> array:
+    """
+    Build a day of year lookup table for the given periods.
+
+    Args:
+        periods (list[tuple[int, int, int, int]]): The start month, start day,
+            end month and end day of each period, both ends are inclusive. A
+            period whose start is after its end wraps around the new year.
+
+    Returns:
+        array: For each slot (see get_day_of_year_index), the index of the first
+            period containing it, -1 if there is none.
+    """
+    table = array("h", [-1] * DAY_OF_YEAR_TABLE_SIZE)
+    for i, (start_month, start_day, end_month, end_day) in enumerate(periods):
+        start = DAYS_BEFORE_MONTH[start_month - 1] + start_day - 1
+        end = DAYS_BEFORE_MONTH[end_month - 1] + end_day - 1
+        if start <= end:
+            slots = range(start, end + 1)
+        else:
+            slots = [*range(start, DAY_OF_YEAR_TABLE_SIZE), *range(0, end + 1)]
+        for slot in slots:
+            if table[slot] == -1:
+                table[slot] = i
+    return table
+
+
+def get_passed_hours(
+    zone_info: ZoneInfo, start: datetime, end: datetime
+) -> list[tuple[date_class, int]]:
+    """
+    Get the local hours of a timezone that started within a period.
+
+    Args:
+        zone_info (ZoneInfo): The timezone.
+        start (datetime): The start of the period, exclusive.
+        end (datetime): The end of the period, inclusive.
+
+    Returns:
+        list[tuple[date, int]]: The local date and hour of each hour that
+            started within the period, in chronological order.
+    """
+    passed_hours = []
+    date = start.astimezone(zone_info).date()
+    end_date = end.astimezone(zone_info).date()
+    while date <= end_date:
+        for hour in range(24):
+            # Compared as instants, so this holds across DST changes
+            if start < datetime.combine(date, time(hour), tzinfo=zone_info) <= end:
+                passed_hours.append((date, hour))
+        date += timedelta(days=1)
+    return passed_hours
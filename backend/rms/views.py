@@ -1,23 +1,33 @@
+from django.contrib.auth import get_user_model
 from rest_framework import generics, mixins, response, status, viewsets
+from rest_framework.pagination import LimitOffsetPagination
 
-from backend.users.permissions import IsAdmin
+from backend.pms.models import Hotel
+from backend.users.permissions import IsAdmin, IsManager
 
 from .models import (
     DynamicPricingSetting,
     IntervalBaseRate,
     OccupancyBasedTriggerRule,
+    RateTrace,
     RMSRatePlan,
     TimeBasedTriggerRule,
 )
+from .rate_calendar import get_rate_calendar
 from .serializers import (
     DynamicPricingSettingSerializer,
     IntervalBaseRateSerializer,
     OccupancyBasedTriggerRuleSerializer,
     RatePlanPercentageFactorWriteOnlySerializer,
+    RateSimulationSerializer,
+    RateTraceSerializer,
     TimeBasedTriggerRuleSerializer,
 )
+from .simulation import simulate_rates
 from .tasks import recalculate_all_rate
 
+User = get_user_model()
+
 
 class RatePlanPercentageFactorUpdateAPIView(generics.UpdateAPIView):
     permission_classes = [IsAdmin]
@@ -67,3 +77,68 @@ class RecalculateAllRateAPIView(generics.GenericAPIView):
         dynamic_pricing_setting = self.get_object()
         recalculate_all_rate.delay(dynamic_pricing_setting.id)
         return response.Response(status=status.HTTP_200_OK)
+
+
+class SimulateRatesAPIView(generics.GenericAPIView):
+    permission_classes = [IsAdmin]
+    queryset = DynamicPricingSetting.objects.select_related("hotel")
+    serializer_class = RateSimulationSerializer
+    lookup_field = "uuid"
+
+    def post(self, request, *args, **kwargs):
+        dynamic_pricing_setting = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        diff = serializer.validated_data
+        days = diff.pop("days", dynamic_pricing_setting.hotel.inventory_days)
+        return response.Response(
+            simulate_rates(dynamic_pricing_setting, diff, days),
+            status=status.HTTP_200_OK,
+        )
+
+
+class RateCalendarAPIView(generics.GenericAPIView):
+    """
+    The rate calendar of the inventory of a hotel. Clients polling it send the
+    ETag of the calendar they have in If-None-Match and get a 304 until the
+    rates change.
+    """
+
+    permission_classes = [IsManager | IsAdmin]
+    lookup_field = "uuid"
+
+    def get_queryset(self):
+        if self.request.user.role == User.UserRoleChoices.ADMIN:
+            return Hotel.objects.all()
+        return Hotel.objects.filter(id=self.request.user.hotel_employee.hotel_id)
+
+    def get(self, request, *args, **kwargs):
+        hotel = self.get_object()
+        rate_calendar, etag = get_rate_calendar(hotel)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get("If-None-Match", "")
+        if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            return response.Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers
+            )
+        return response.Response(rate_calendar, headers=headers)
+
+
+class RateTraceListAPIView(generics.ListAPIView):
+    """
+    The traces of the rates of a rate plan, the most recent first, optionally
+    of a single date.
+    """
+
+    permission_classes = [IsAdmin]
+    serializer_class = RateTraceSerializer
+    pagination_class = LimitOffsetPagination
+
+    def get_queryset(self):
+        queryset = RateTrace.objects.filter(
+            rate_plan__uuid=self.kwargs["rate_plan__uuid"]
+        ).order_by("-id")
+        date = self.request.query_params.get("date")
+        if date is not None:
+            queryset = queryset.filter(date=date)
+        return queryset
@@ -0,0 +1,125 @@
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+from django.core.cache import cache
+
+
+def get_or_set_locked(
+    key: str,
+    default: Callable[[], Any],
+    timeout: int | None = None,
+    lock_timeout: int = 10,
+    poll_interval: float = 0.05,
+) -> Any:
+    """
+    Like cache.get_or_set, but only one caller builds a missing value. The
+    others wait for it to be set, so a burst of misses results in one build.
+
+    Args:
+        key (str): The cache key.
+        default (Callable[[], Any]): Builds the value, must not return None.
+        timeout (int | None): The timeout of the value.
+        lock_timeout (int): How long the lock is held at most, callers that
+            waited that long build the value themselves.
+        poll_interval (float): How often waiting callers check for the value.
+
+    Returns:
+        Any: The cached or built value.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key, token, timeout=lock_timeout):
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(poll_interval)
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+    try:
+        # The previous lock holder may have set it in the meantime
+        value = cache.get(key)
+        if value is None:
+            value = default()
+            cache.set(key, value, timeout=timeout)
+        return value
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+"""
+A pending queue stores values as numbered entries in the cache. Writers take
+the next number with an atomic increment and the consumer reads every entry
+since the last consumed number, so neither of them needs a lock. Only the first
+value pushed since the last pop asks for the consumer to be scheduled.
+"""
+
+PENDING_QUEUE_TIMEOUT = 60 * 60 * 24
+
+
+def get_pending_queue_entry_key(key: str, sequence: int) -> str:
+    return f"{key}:{sequence}"
+
+
+def push_pending(key: str, value: Any, schedule_timeout: int) -> bool:
+    """
+    Push a value to the pending queue stored at the given key.
+
+    Args:
+        key (str): The cache key of the queue.
+        value (Any): The value.
+        schedule_timeout (int): How long a scheduled consumer is waited for
+            before another one is asked for.
+
+    Returns:
+        bool: Whether a consumer must be scheduled, i.e. none is pending yet.
+    """
+    sequence_key = f"{key}:sequence"
+    cache.add(sequence_key, 0, None)
+    sequence = cache.incr(sequence_key)
+    cache.set(
+        get_pending_queue_entry_key(key, sequence),
+        value,
+        timeout=PENDING_QUEUE_TIMEOUT,
+    )
+    return cache.add(f"{key}:scheduled", True, timeout=schedule_timeout)
+
+
+def pop_pending(key: str) -> list[Any]:
+    """
+    Remove and return the values of the pending queue stored at the given key.
+    Values pushed from now on ask for another consumer to be scheduled.
+
+    Args:
+        key (str): The cache key of the queue.
+
+    Returns:
+        list[Any]: The values in push order, None for the ones that are
+            missing, either evicted or not set yet by their writer.
+    """
+    cache.delete(f"{key}:scheduled")
+    consumed_key = f"{key}:consumed"
+    consumed = cache.get(consumed_key, 0)
+    sequence = cache.get(f"{key}:sequence", 0)
+    if sequence == consumed:
+        return []
+    if sequence < consumed:
+        # The sequence was evicted, we can't tell how many values are missing
+        cache.set(consumed_key, sequence, None)
+        return [None]
+
+    keys = [
+        get_pending_queue_entry_key(key, i) for i in range(consumed + 1, sequence + 1)
+    ]
+    values = cache.get_many(keys)
+    cache.set(consumed_key, sequence, None)
+    cache.delete_many(keys)
+    return [values.get(key) for key in keys]
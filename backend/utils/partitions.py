@@ -0,0 +1,180 @@
+import re
+from datetime import date
+
+import pgtrigger
+from django.db import DEFAULT_DB_ALIAS, connections
+
+"""
+Tables range partitioned by month have a partition per month named after the
+month, e.g. rms_ratehistory_p202610 holds the rows from 2026-10-01 included to
+2026-11-01 excluded. Partitions are created ahead of time, and old ones are
+dropped or detached as a whole instead of deleting their rows. A table may
+also have a default partition, e.g. for the dates before its first month, it
+must not hold rows of the months created later.
+"""
+
+
+def add_months(value: date, months: int) -> date:
+    """
+    Get the first day of the month the given number of months after the month
+    of a date.
+    """
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_monthly_partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def get_monthly_partitions(table: str, using: str = None) -> dict[str, date]:
+    """
+    Get the monthly partitions of a table.
+
+    Returns:
+        dict[str, date]: The first day of the month of each partition keyed by
+            its name. Partitions not named after a month are left out.
+    """
+    pattern = re.compile(rf"{re.escape(table)}_p(\d{{4}})(\d{{2}})")
+    with connections[using or DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [table],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = pattern.fullmatch(name)
+        if match is not None:
+            partitions[name] = date(int(match[1]), int(match[2]), 1)
+    return partitions
+
+
+def create_monthly_partitions(
+    table: str, start: date, months: int, using: str = None
+) -> list[str]:
+    """
+    Create the missing monthly partitions of a table, from the month of start.
+
+    Args:
+        table (str): The partitioned table.
+        start (date): A date of the first month.
+        months (int): The number of months.
+        using (str): The database alias, the default database by default.
+
+    Returns:
+        list[str]: The names of the created partitions.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    quote_name = connection.ops.quote_name
+    existing = get_monthly_partitions(table, using)
+    created = []
+    with connection.cursor() as cursor:
+        for i in range(months):
+            month = add_months(start, i)
+            name = get_monthly_partition_name(table, month)
+            if name in existing:
+                continue
+            cursor.execute(
+                f"CREATE TABLE {quote_name(name)} PARTITION OF {quote_name(table)} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [month.isoformat(), add_months(month, 1).isoformat()],
+            )
+            created.append(name)
+    return created
+
+
+def drop_monthly_partitions(table: str, before: date, using: str = None) -> list[str]:
+    """
+    Drop the monthly partitions of a table whose rows are all before a date.
+
+    Args:
+        table (str): The partitioned table.
+        before (date): The partitions of the months ending by then are dropped.
+        using (str): The database alias, the default database by default.
+
+    Returns:
+        list[str]: The names of the dropped partitions.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    dropped = []
+    with connection.cursor() as cursor:
+        for name, month in sorted(get_monthly_partitions(table, using).items()):
+            if add_months(month, 1) <= before:
+                cursor.execute(f"DROP TABLE {connection.ops.quote_name(name)}")
+                dropped.append(name)
+    return dropped
+
+
+def detach_monthly_partitions(table: str, before: date, using: str = None) -> list[str]:
+    """
+    Detach the monthly partitions of a table whose rows are all before a date,
+    they are kept as standalone tables to be archived. Their foreign keys are
+    dropped, the archived rows don't hold back the referenced rows anymore.
+
+    Args:
+        table (str): The partitioned table.
+        before (date): The partitions of the months ending by then are detached.
+        using (str): The database alias, the default database by default.
+
+    Returns:
+        list[str]: The names of the detached partitions.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    quote_name = connection.ops.quote_name
+    detached = []
+    with connection.cursor() as cursor:
+        for name, month in sorted(get_monthly_partitions(table, using).items()):
+            if add_months(month, 1) > before:
+                continue
+            cursor.execute(
+                f"ALTER TABLE {quote_name(table)} DETACH PARTITION {quote_name(name)}"
+            )
+            cursor.execute(
+                "SELECT conname FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f' "
+                # Not the clones of a foreign key to a partitioned table
+                "AND conparentid = 0",
+                [quote_name(name)],
+            )
+            for (constraint,) in cursor.fetchall():
+                cursor.execute(
+                    f"ALTER TABLE {quote_name(name)} "
+                    f"DROP CONSTRAINT {quote_name(constraint)}"
+                )
+            detached.append(name)
+    return detached
+
+
+def install_triggers(using: str = None):
+    """
+    Install the registered triggers and prune the orphaned ones, like
+    pgtrigger.install, the outdated ones are reinstalled. But pgtrigger takes the clones of the triggers of a
+    partitioned table on its partitions for orphans and fails to drop them,
+    they belong to Postgres and are left alone.
+
+    Args:
+        using (str): The database alias, the default database by default.
+    """
+    database = using or DEFAULT_DB_ALIAS
+    installed = set()
+    for model, trigger in pgtrigger.get(database=database):
+        status = trigger.get_installation_status(model)[0]
+        if status == "OUTDATED":
+            # Otherwise only its function is replaced, not its declaration
+            trigger.uninstall(model)
+        if status != "INSTALLED":
+            trigger.install(model)
+        installed.add((model._meta.db_table, trigger.get_pgid(model)))
+
+    with connections[database].cursor() as cursor:
+        cursor.execute(
+            "SELECT tgrelid::regclass::text, tgname FROM pg_trigger "
+            "WHERE tgname LIKE 'pgtrigger_%%' AND tgparentid = 0"
+        )
+        for table, name in cursor.fetchall():
+            if (table, name) not in installed:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
@@ -0,0 +1,23 @@
+from django.core.cache import cache
+
+from ..cache import get_or_set_locked
+
+
+def test_get_or_set_locked(mocker):
+    key = "test:get_or_set_locked"
+    cache.delete(key)
+    default = mocker.Mock(return_value="value")
+    assert get_or_set_locked(key, default) == "value"
+    assert get_or_set_locked(key, default) == "value"
+    default.assert_called_once()
+
+    # Waits for the lock holder to set the value
+    cache.delete(key)
+    cache.add(f"{key}:lock", "other")
+    mocker.patch(
+        "backend.utils.cache.time.sleep",
+        side_effect=lambda _: cache.set(key, "other value"),
+    )
+    assert get_or_set_locked(key, default) == "other value"
+    default.assert_called_once()
+    cache.delete(f"{key}:lock")
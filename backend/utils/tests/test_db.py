@@ -0,0 +1,77 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend.pms.models import RatePlanRestrictions
+from backend.rms.models import RateHistory, RMSRatePlanRestrictions
+
+from ..db import bulk_update_from_values, copy_from_values, try_advisory_xact_lock
+
+
+def test_bulk_update_from_values(rate_plan_factory, django_assert_num_queries):
+    rate_plan = rate_plan_factory()
+    restrictions = list(
+        RatePlanRestrictions.objects.filter(rate_plan=rate_plan).select_related("rms")
+    )
+    assert len(restrictions) > 1
+    for i, restriction in enumerate(restrictions):
+        restriction.rate = i + 1
+        restriction.rms.base_rate = i + 2
+
+    assert bulk_update_from_values([], ["rate"]) == 0
+    with django_assert_num_queries(2):
+        assert bulk_update_from_values(restrictions, ["rate"]) == len(restrictions)
+        # The primary key is a foreign key, matched with the partition key
+        assert bulk_update_from_values(
+            [restriction.rms for restriction in restrictions],
+            ["base_rate"],
+            match_fields=["date"],
+        ) == len(restrictions)
+
+    for restriction in restrictions:
+        restriction.refresh_from_db()
+        assert restriction.rate == restriction.rms.base_rate - 1
+    assert RMSRatePlanRestrictions.objects.filter(
+        restriction__rate_plan=rate_plan, base_rate__gt=1
+    ).count() == len(restrictions)
+
+
+def test_copy_from_values(db, django_assert_num_queries):
+    now = timezone.now()
+    fields = [
+        "restriction_id",
+        "old_rate",
+        "new_rate",
+        "base_rate",
+        "cause",
+        "created_at",
+    ]
+    rows = [(i, i, i + 1, i + 2, RateHistory.CauseChoices.TIME, now) for i in range(3)]
+
+    assert copy_from_values(RateHistory, fields, []) == 0
+    with django_assert_num_queries(1):
+        assert copy_from_values(RateHistory, fields, rows) == 3
+    assert [
+        tuple(getattr(history, name) for name in fields)
+        for history in RateHistory.objects.order_by("restriction_id")
+    ] == rows
+
+
+def test_try_advisory_xact_lock(db):
+    namespace = 123
+    other_connection = connection.copy()
+    try:
+        with other_connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s, %s)", [namespace, 5])
+        with transaction.atomic():
+            # Keys beyond 32 bits are folded
+            assert not try_advisory_xact_lock(namespace, 2**32 + 5)
+            # Namespaces don't contend
+            assert try_advisory_xact_lock(namespace + 1, 5)
+        with other_connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s, %s)", [namespace, 5])
+        with transaction.atomic():
+            assert try_advisory_xact_lock(namespace, 5)
+            # Taken again by the same session
+            assert try_advisory_xact_lock(namespace, 5)
+    finally:
+        other_connection.close()
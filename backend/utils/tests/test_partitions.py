@@ -0,0 +1,127 @@
+from datetime import date
+
+import pgtrigger
+import pytest
+from django.db import DatabaseError, connection, transaction
+
+from backend.pms.models import RatePlanRestrictions
+from backend.rms.models import RateHistory, RMSRatePlanRestrictions
+
+from ..partitions import (
+    add_months,
+    create_monthly_partitions,
+    detach_monthly_partitions,
+    drop_monthly_partitions,
+    get_monthly_partitions,
+    install_triggers,
+)
+
+
+def test_add_months():
+    assert add_months(date(2023, 1, 31), 1) == date(2023, 2, 1)
+    assert add_months(date(2023, 11, 15), 2) == date(2024, 1, 1)
+    assert add_months(date(2023, 1, 1), -13) == date(2021, 12, 1)
+
+
+def test_monthly_partitions(db):
+    table = RateHistory._meta.db_table
+    assert create_monthly_partitions(table, date(2001, 11, 20), 3) == [
+        f"{table}_p200111",
+        f"{table}_p200112",
+        f"{table}_p200201",
+    ]
+    # Only the missing ones are created
+    assert create_monthly_partitions(table, date(2001, 12, 1), 3) == [
+        f"{table}_p200202",
+    ]
+    assert get_monthly_partitions(table)[f"{table}_p200112"] == date(2001, 12, 1)
+
+    RateHistory.objects.create(
+        restriction_id=1,
+        old_rate=1,
+        new_rate=2,
+        base_rate=2,
+        cause=RateHistory.CauseChoices.UNKNOWN,
+        created_at="2001-12-31T23:59:59Z",
+    )
+    # There is no default partition
+    with pytest.raises(DatabaseError), transaction.atomic():
+        RateHistory.objects.create(
+            restriction_id=1,
+            old_rate=1,
+            new_rate=2,
+            base_rate=2,
+            cause=RateHistory.CauseChoices.UNKNOWN,
+            created_at="2000-01-01T00:00:00Z",
+        )
+
+    assert drop_monthly_partitions(table, date(2002, 1, 15)) == [
+        f"{table}_p200111",
+        f"{table}_p200112",
+    ]
+    assert not RateHistory.objects.filter(restriction_id=1).exists()
+    assert f"{table}_p200201" in get_monthly_partitions(table)
+
+
+def test_detach_monthly_partitions(rate_plan_factory):
+    rate_plan = rate_plan_factory()
+    tables = [
+        RMSRatePlanRestrictions._meta.db_table,
+        RatePlanRestrictions._meta.db_table,
+    ]
+    for table in reversed(tables):
+        create_monthly_partitions(table, date(2001, 5, 1), 2)
+    restriction = RatePlanRestrictions.objects.create(
+        rate_plan=rate_plan, date=date(2001, 5, 31), rate=1
+    )
+    # Inserted in the partition of the RMS restrictions by the trigger
+    assert restriction.rms.date == restriction.date
+
+    with connection.cursor() as cursor:
+        # Like in a later transaction, the foreign keys are checked
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    # Referenced by the RMS restrictions, they must be detached first
+    for table in tables:
+        assert detach_monthly_partitions(table, date(2001, 6, 15)) == [
+            f"{table}_p200105"
+        ]
+    assert not RatePlanRestrictions.objects.filter(id=restriction.id).exists()
+    assert f"{tables[1]}_p200106" in get_monthly_partitions(tables[1])
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT id FROM {tables[1]}_p200105")
+        assert cursor.fetchall() == [(restriction.id,)]
+
+    # The archived restrictions don't reference the rate plan anymore
+    rate_plan.delete()
+
+
+def test_install_triggers(db):
+    model, trigger = pgtrigger.get(
+        "pms.RatePlanRestrictions:rms_rateplan_restrictions_insert"
+    )[0]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DROP TRIGGER {trigger.get_pgid(model)} ON {model._meta.db_table}"
+        )
+    assert trigger.get_installation_status(model)[0] == "UNINSTALLED"
+
+    # The clones of the trigger on the partitions are not pruned
+    install_triggers()
+    assert trigger.get_installation_status(model)[0] == "INSTALLED"
+
+    # Reinstalled once outdated
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"COMMENT ON TRIGGER {trigger.get_pgid(model)} "
+            f"ON {model._meta.db_table} IS 'outdated'"
+        )
+    assert trigger.get_installation_status(model)[0] == "OUTDATED"
+    install_triggers()
+    assert trigger.get_installation_status(model)[0] == "INSTALLED"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM pg_trigger WHERE tgname = %s AND tgparentid != 0",
+            [trigger.get_pgid(model)],
+        )
+        assert cursor.fetchone()[0] > 1
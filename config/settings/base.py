@@ -5,6 +5,7 @@ import os
 from pathlib import Path
 
 import environ
+from celery.schedules import crontab
 
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
 # backend/
@@ -105,6 +106,9 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#migration-modules
 MIGRATION_MODULES = {"sites": "backend.contrib.sites.migrations"}
+# The triggers are installed by backend.rms once migrated instead, pgtrigger
+# can't prune the triggers of partitioned tables, see install_triggers
+PGTRIGGER_INSTALL_ON_MIGRATE = False
 
 # AUTHENTICATION
 # ------------------------------------------------------------------------------
@@ -300,10 +304,39 @@ CELERY_TASK_TIME_LIMIT = 5 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 60
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-scheduler
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-schedule
+CELERY_BEAT_SCHEDULE = {
+    "rms-sweep-time-based-triggers": {
+        "task": "backend.rms.tasks.sweep_time_based_triggers",
+        "schedule": crontab(minute="*/15"),
+    },
+    "rms-roll-lead-days": {
+        "task": "backend.rms.tasks.roll_lead_days",
+        "schedule": crontab(minute="*/15"),
+    },
+    "rms-extend-inventory-windows": {
+        "task": "backend.rms.tasks.extend_inventory_windows",
+        "schedule": crontab(minute=5),
+    },
+    "rms-maintain-restriction-partitions": {
+        "task": "backend.rms.tasks.maintain_restriction_partitions",
+        "schedule": crontab(minute=10, hour=0),
+    },
+    "rms-maintain-rate-history-partitions": {
+        "task": "backend.rms.tasks.maintain_rate_history_partitions",
+        "schedule": crontab(minute=0, hour=0),
+    },
+}
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-send-task-events
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
 CELERY_TASK_SEND_SENT_EVENT = True
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-routes
+# Room assignments are solved by dedicated workers keeping the JVM loaded, see
+# compose/production/django/celery/room_assignment
+CELERY_TASK_ROUTES = {
+    "backend.pms.tasks.assign_pending_hotel_rooms": {"queue": "room_assignment"},
+}
 # django-allauth
 # ------------------------------------------------------------------------------
 ACCOUNT_ALLOW_REGISTRATION = env.bool("DJANGO_ACCOUNT_ALLOW_REGISTRATION", True)
@@ -358,3 +391,77 @@ FRONTEND_BASE_URL = env("DJANGO_FRONTEND_BASE_URL", default="http://127.0.0.1:51
 
 # django-cors-headers - https://github.com/adamchainz/django-cors-headers#setup
 CORS_ALLOWED_ORIGINS = [FRONTEND_BASE_URL]
+
+# Rate plan restrictions
+# ------------------------------------------------------------------------------
+# Months of restriction partitions created ahead of the current one, enough
+# for the longest inventory window of 700 days
+RATE_PLAN_RESTRICTIONS_PARTITIONS_AHEAD = env.int(
+    "RATE_PLAN_RESTRICTIONS_PARTITIONS_AHEAD", default=25
+)
+# Months of past restrictions kept before the current one, older partitions
+# are detached to be archived
+RATE_PLAN_RESTRICTIONS_RETENTION_MONTHS = env.int(
+    "RATE_PLAN_RESTRICTIONS_RETENTION_MONTHS", default=3
+)
+
+# Channel managers
+# ------------------------------------------------------------------------------
+# Seconds the availability pushes of a hotel are coalesced for, e.g. during a
+# burst of bookings, before pushing its availability at once
+CM_AVAILABILITY_PUSH_DELAY = env.int("CM_AVAILABILITY_PUSH_DELAY", default=2)
+
+# Room assignment
+# ------------------------------------------------------------------------------
+# Whether the worker processes start the JVM and build the solver factory at
+# start up, set by the room assignment workers so that no task waits for it
+PMS_ROOM_ASSIGNMENT_WARM_UP = env.bool("PMS_ROOM_ASSIGNMENT_WARM_UP", default=False)
+# Seconds to wait before retrying the room assignment of a hotel whose rooms
+# are already being assigned
+PMS_ROOM_ASSIGNMENT_LOCK_RETRY_DELAY = env.int(
+    "PMS_ROOM_ASSIGNMENT_LOCK_RETRY_DELAY", default=1
+)
+
+# Dynamic pricing
+# ------------------------------------------------------------------------------
+# Number of dynamic pricing adapters kept in memory by each process
+RMS_ADAPTER_LOCAL_CACHE_SIZE = env.int("RMS_ADAPTER_LOCAL_CACHE_SIZE", default=256)
+# Seconds an in memory adapter is used without checking its generation in the
+# shared cache, invalidations are pushed to the processes in the meantime
+RMS_ADAPTER_LOCAL_CACHE_TTL = env.int("RMS_ADAPTER_LOCAL_CACHE_TTL", default=30)
+# Seconds to wait before recalculating the rates dirtied by a rule change, the
+# changes made in the meantime are recalculated together
+RMS_DIRTY_RATES_DELAY = env.int("RMS_DIRTY_RATES_DELAY", default=5)
+# Seconds occupancy based triggers of a hotel are coalesced for, e.g. during a
+# burst of bookings, before recalculating their rates at once
+RMS_OCCUPANCY_TRIGGER_DELAY = env.int("RMS_OCCUPANCY_TRIGGER_DELAY", default=2)
+# Seconds to wait before retrying occupancy based triggers whose
+# recalculation failed, e.g. while the channel manager is down
+RMS_OCCUPANCY_TRIGGER_RETRY_DELAY = env.int(
+    "RMS_OCCUPANCY_TRIGGER_RETRY_DELAY", default=60
+)
+# Number of hotels recalculated by each task fanned out by the time based
+# trigger sweep
+RMS_TIME_BASED_TRIGGER_BATCH_SIZE = env.int(
+    "RMS_TIME_BASED_TRIGGER_BATCH_SIZE", default=50
+)
+# Number of hotels recalculated by each task fanned out by a fleet wide
+# recalculation, e.g. once the lead days of every date shifted
+RMS_FLEET_RECALCULATION_CHUNK_SIZE = env.int(
+    "RMS_FLEET_RECALCULATION_CHUNK_SIZE", default=10
+)
+# Seconds to wait before retrying a recalculation of a hotel whose rates are
+# already being recalculated
+RMS_HOTEL_LOCK_RETRY_DELAY = env.int("RMS_HOTEL_LOCK_RETRY_DELAY", default=5)
+# Share of the calculated rates whose factors are recorded, see RateTrace. The
+# rates are not traced at all when 0
+RMS_RATE_TRACE_SAMPLE_RATE = env.float("RMS_RATE_TRACE_SAMPLE_RATE", default=0.0)
+# Months of rate history partitions created ahead of the current one
+RMS_RATE_HISTORY_PARTITIONS_AHEAD = env.int(
+    "RMS_RATE_HISTORY_PARTITIONS_AHEAD", default=2
+)
+# Months of rate history kept before the current one, older partitions are
+# dropped
+RMS_RATE_HISTORY_RETENTION_MONTHS = env.int(
+    "RMS_RATE_HISTORY_RETENTION_MONTHS", default=12
+)